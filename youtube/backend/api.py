@@ -5,20 +5,36 @@ Backend API for MediathekManagement-Tool
 Provides REST API for video/audio downloads from YouTube
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, HttpUrl
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 import uvicorn
 import os
 import sys
 import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import logging
 import uuid
 import time
+import hmac
+import re
+from urllib.parse import quote
 
-from downloader import VideoDownloader, AudioDownloader, DownloadStatus
+from downloader import DownloadStatus, AUDIO_CODECS, parse_audio_targets, clean_url, check_ffmpeg
+from tool_registry import tool_registry
+from format_planner import FormatLimits, CODEC_ALIASES, plan_video_formats
+from task_store import TaskStore
+from worker import EmbeddedWorkers
+from settings import settings
+from url_canonicalizer import dedupe_urls, extract_video_id, parse_timestamp, url_time_range
+from staging import remove_task_dir
+from bulk_import import BulkImport, MultipartFileReader, import_registry, detect_kind
+from file_delivery import RangeFileResponse, zip_stream, content_disposition
 
 app = FastAPI(title="MediathekManagement API", version="1.0.0")
 
@@ -31,11 +47,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for download tasks (in production, use a database)
-download_tasks: Dict[str, DownloadStatus] = {}
+# Shared task store (SQLite, WAL mode): every API worker sees every task
+task_store = TaskStore()
+
+# Dev/single-process mode runs the downloads in threads of this process;
+# production mode sets MEDIATHEK_EMBEDDED_WORKERS=0 and runs worker.py processes
+embedded_workers: Optional[EmbeddedWorkers] = None
+
+# Dedicated executor for blocking probes/extractions (yt-dlp, ffmpeg) so they
+# never run on the event loop and cannot starve /health or status polling
+probe_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="probe")
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call in the probe executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(probe_executor, partial(func, *args, **kwargs))
+
+@app.on_event("startup")
+async def warm_tool_checks():
+    """Probe tools once in the background so later checks are served from cache"""
+    probe_executor.submit(tool_registry.probe_all)
+
+@app.on_event("startup")
+async def start_embedded_workers():
+    global embedded_workers
+    if settings.embedded_workers > 0:
+        embedded_workers = EmbeddedWorkers(task_store, settings.embedded_workers)
+        embedded_workers.start()
+
+@app.on_event("shutdown")
+def stop_embedded_workers():
+    if embedded_workers:
+        embedded_workers.stop()
+
+@app.on_event("shutdown")
+def shutdown_probe_executor():
+    probe_executor.shutdown(wait=False, cancel_futures=True)
 
 # Helper function to create timestamped download folder (for web app only)
-def create_timestamped_folder(file_count: int) -> str:
+def create_timestamped_folder(file_count: Optional[int]) -> str:
     """Create a timestamped folder in user's Downloads directory"""
     from datetime import datetime
     
@@ -44,9 +94,9 @@ def create_timestamped_folder(file_count: int) -> str:
     if not temp_downloads_path.exists():
         temp_downloads_path.mkdir(parents=True, exist_ok=True)
     
-    # Create folder name: YYYYMMDD_HHMMSS_filecount
+    # Create folder name: YYYYMMDD_HHMMSS_filecount (YYYYMMDD_HHMMSS_import if the count is unknown)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    folder_name = f"{timestamp}_{file_count}"
+    folder_name = f"{timestamp}_{file_count if file_count is not None else 'import'}"
     
     # Create the subfolder
     output_path = temp_downloads_path / folder_name
@@ -82,16 +132,37 @@ def resolve_output_path(path: str) -> str:
     return expanded_path
 
 # Request/Response models
-class DownloadRequest(BaseModel):
+class FormatLimitFields(BaseModel):
+    """Quality and size caps for video streams (video/combined tasks and /api/formats)"""
+    max_height: Optional[int] = None  # e.g. 720
+    max_fps: Optional[float] = None
+    max_bitrate: Optional[float] = None  # kbit/s, video + audio
+    max_filesize_mb: Optional[float] = None  # per video, video + audio
+    prefer_codec: Optional[str] = None  # avc1/h264, hevc/h265, vp9, av01/av1
+
+class TimeRange(BaseModel):
+    start: Optional[Union[float, str]] = None  # seconds, "1:30" or "1m30s"; default: start of the video
+    end: Optional[Union[float, str]] = None  # default: end of the video
+
+class DownloadRequest(FormatLimitFields):
     urls: List[HttpUrl]
     format: str  # mp4, mkv for video; mp3, wav for audio
     output_path: str
     use_timestamped_folder: Optional[bool] = False  # True for web app, False for desktop app
+    format_ids: Optional[Dict[str, str]] = None  # video ID -> format ID from /api/formats (video only)
+    audio_targets: Optional[List[str]] = None  # audio/combined: several outputs of one download, e.g. ["mp3:320k", "opus:128k", "flac"]
+    sections: Optional[Dict[str, TimeRange]] = None  # video ID or URL -> excerpt downloaded instead of the whole video
+    use_url_timestamps: Optional[bool] = False  # t=/start=/end= of the URLs as excerpt (explicit sections win)
+    precise_cuts: Optional[bool] = False  # exact cut points (re-encodes around them) instead of keyframe cuts
+
+class CombinedDownloadRequest(DownloadRequest):
+    audio_format: str = "mp3"  # audio file produced from the same download (format is the video container)
 
 class DownloadResponse(BaseModel):
     task_id: str
     message: str
     output_folder: Optional[str] = None  # Return the actual folder path
+    duplicates_removed: int = 0  # same video submitted more than once (any URL form)
 
 class StatusResponse(BaseModel):
     task_id: str
@@ -103,9 +174,38 @@ class StatusResponse(BaseModel):
     current_file_progress: float
     current_file_message: str
     failed_urls: List[str]
+    format_plan: Optional[dict] = None
+    shared_urls: List[str] = []  # files received from a concurrent task downloading the same video
+    cached_urls: List[str] = []  # files linked from the media store (no download)
+    saved_bytes: int = 0  # expected download volume avoided by the caps
 
-class FormatCheckRequest(BaseModel):
+class FormatCheckRequest(FormatLimitFields):
     url: HttpUrl
+    format: Optional[str] = "mp4"  # container the recommended plan is computed for
+
+class FormatInfo(BaseModel):
+    format_id: str
+    ext: Optional[str] = None
+    vcodec: Optional[str] = None
+    acodec: Optional[str] = None
+    resolution: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    tbr: Optional[float] = None
+    vbr: Optional[float] = None
+    abr: Optional[float] = None
+    protocol: Optional[str] = None
+    format_note: Optional[str] = None
+    estimated_size: Optional[int] = None
+
+class FormatCheckResponse(BaseModel):
+    video_id: str
+    title: str
+    duration: Optional[float] = None
+    cached: bool
+    formats: List[FormatInfo]
+    plan: Optional[dict] = None
 
 @app.get("/")
 async def root():
@@ -116,106 +216,198 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
-@app.post("/api/download/video", response_model=DownloadResponse)
-async def download_video(request: DownloadRequest, background_tasks: BackgroundTasks):
-    """
-    Start a video download task
-    """
-    task_id = str(uuid.uuid4())
-    
-    # Validate format
-    if request.format not in ["mp4", "mkv"]:
-        raise HTTPException(status_code=400, detail="Invalid video format. Use 'mp4' or 'mkv'")
-    
-    # Convert HttpUrl objects to strings
-    urls = [str(url) for url in request.urls]
-    
-    # Determine output path based on request type
-    if request.use_timestamped_folder:
+VIDEO_FORMATS = ["mp4", "mkv"]
+AUDIO_FORMATS = ["mp3", "wav"]
+
+def format_limits(request: FormatLimitFields) -> FormatLimits:
+    """Caps of a request (400 on invalid values)"""
+    for name in ("max_height", "max_fps", "max_bitrate", "max_filesize_mb"):
+        value = getattr(request, name)
+        if value is not None and value <= 0:
+            raise HTTPException(status_code=400, detail=f"{name} muss größer als 0 sein")
+    codec = request.prefer_codec.lower() if request.prefer_codec else None
+    if codec is not None and codec not in CODEC_ALIASES:
+        raise HTTPException(status_code=400, detail=f"Unbekannter Codec. Erlaubt: {', '.join(CODEC_ALIASES)}")
+    return FormatLimits(
+        max_height=request.max_height,
+        max_fps=request.max_fps,
+        max_bitrate=request.max_bitrate,
+        max_filesize=int(request.max_filesize_mb * 1024 * 1024) if request.max_filesize_mb else None,
+        prefer_codec=codec,
+    )
+
+def _section_range(key: str, start, end) -> tuple:
+    """(start, end) in seconds of one excerpt"""
+    start_seconds = parse_timestamp(start) if start is not None else 0.0
+    end_seconds = parse_timestamp(end) if end is not None else None
+    if start_seconds is None or (end is not None and end_seconds is None):
+        raise HTTPException(status_code=400, detail=f"Ungültige Zeitangabe für {key}")
+    if end_seconds is not None and end_seconds <= start_seconds:
+        raise HTTPException(status_code=400, detail=f"Das Ende muss nach dem Start liegen ({key})")
+    return start_seconds, end_seconds
+
+async def excerpt_options(request: DownloadRequest, raw_urls: List[str]) -> dict:
+    """Task options for excerpt downloads (empty if whole videos are requested)"""
+    sections = {}
+    if request.use_url_timestamps:
+        for url in raw_urls:  # before canonicalization, which drops t=
+            start, end = url_time_range(url)
+            key = extract_video_id(url) or clean_url(url)
+            if (start is not None or end is not None) and key not in sections:
+                sections[key] = _section_range(url, start, end)
+    for key, time_range in (request.sections or {}).items():
+        sections[extract_video_id(key) or clean_url(key)] = _section_range(key, time_range.start, time_range.end)
+    if not sections:
+        return {}
+    if not await run_blocking(check_ffmpeg):
+        raise HTTPException(status_code=400, detail="Ausschnitte benötigen ffmpeg")
+    return {"sections": sections, "precise_cuts": bool(request.precise_cuts)}
+
+def missing_audio_encoders(targets) -> Optional[List[str]]:
+    """Encoders the targets need that ffmpeg lacks (None: no ffmpeg at all)"""
+    if not tool_registry.is_available("ffmpeg"):
+        return None
+    encoders = {AUDIO_CODECS[target.format][0] for target in targets}
+    return sorted(encoder for encoder in encoders if not tool_registry.has_encoder(encoder))
+
+async def validate_audio_targets(specs: List[str]) -> List[str]:
+    """Normalized audio target specs of a request; ffmpeg and every needed encoder must
+    be available, otherwise each URL would only fail in the worker"""
+    try:
+        targets = parse_audio_targets(specs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    missing = await run_blocking(missing_audio_encoders, targets)
+    if missing is None:
+        raise HTTPException(status_code=400, detail="Audio-Konvertierung benötigt ffmpeg")
+    if missing:
+        raise HTTPException(status_code=400, detail=f"ffmpeg fehlen die Encoder: {', '.join(missing)}")
+    return [target.spec for target in targets]
+
+def determine_output_path(use_timestamped_folder: bool, output_path: str, file_count: Optional[int], label: str) -> str:
+    """Output folder for a task: timestamped folder (web app) or the given path (desktop app)"""
+    if use_timestamped_folder:
         # Web app: create timestamped folder in Downloads
         try:
-            output_path = create_timestamped_folder(len(urls))
-            print(f"[VIDEO DOWNLOAD - WEB] Created folder: {output_path}")  # Debug logging
+            path = create_timestamped_folder(file_count)
+            logging.debug("[%s - WEB] Created folder: %s", label, path)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Fehler beim Erstellen des Download-Ordners: {str(e)}")
     else:
         # Desktop app: use provided path
         try:
-            output_path = resolve_output_path(request.output_path)
-            print(f"[VIDEO DOWNLOAD - DESKTOP] Resolved path: {output_path}")  # Debug logging
+            path = resolve_output_path(output_path)
+            logging.debug("[%s - DESKTOP] Resolved path: %s", label, path)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid output path: {str(e)}")
-    
-    print(f"[VIDEO DOWNLOAD] URLs: {urls}")  # Debug logging
-    print(f"[VIDEO DOWNLOAD] Format: {request.format}")  # Debug logging
-    
-    # Create download status
+    return path
+
+def queue_task(kind: str, format: str, output_path: str, urls: List[str], options: Optional[dict] = None) -> str:
+    """Create a queued task in the task store; a download worker picks it up"""
+    task_id = str(uuid.uuid4())
     status = DownloadStatus(
         task_id=task_id,
         total_files=len(urls),
         status="queued"
     )
-    download_tasks[task_id] = status
+    task_store.create_task(kind, format, output_path, urls, status, options=options)
+    logging.info("[%s DOWNLOAD] Task %s: %d URL(s), format %s", kind.upper(), task_id, len(urls), format)
+    return task_id
+
+@app.post("/api/download/video", response_model=DownloadResponse)
+async def download_video(request: DownloadRequest):
+    """
+    Start a video download task
+    """
+    # Validate format
+    if request.format not in VIDEO_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid video format. Use 'mp4' or 'mkv'")
+    limits = format_limits(request)
+    raw_urls = [str(url) for url in request.urls]
+    excerpts = await excerpt_options(request, raw_urls)
+    
+    # One canonical URL per video
+    urls, duplicates = dedupe_urls(raw_urls)
     
-    # Create downloader and start in background
-    downloader = VideoDownloader(urls, request.format, output_path, status)
-    background_tasks.add_task(downloader.download_all)
+    output_path = determine_output_path(
+        request.use_timestamped_folder, request.output_path, len(urls), "VIDEO DOWNLOAD"
+    )
+    task_id = queue_task(
+        "video", request.format, output_path, urls,
+        options={"format_ids": request.format_ids or {}, "limits": limits.to_dict(), **excerpts}
+    )
     
     return DownloadResponse(
         task_id=task_id,
-        message=f"Video download task started with {len(urls)} URLs",
-        output_folder=output_path
+        message=f"Video download task started with {len(urls)} URLs"
+                + (f" ({duplicates} duplicates removed)" if duplicates else ""),
+        output_folder=output_path,
+        duplicates_removed=duplicates
     )
 
 @app.post("/api/download/audio", response_model=DownloadResponse)
-async def download_audio(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def download_audio(request: DownloadRequest):
     """
     Start an audio download task
     """
-    task_id = str(uuid.uuid4())
-    
-    # Validate format
-    if request.format not in ["mp3", "wav"]:
+    # Validate format (several targets: one download, converted to all of them in one pass)
+    format, options = request.format, None
+    if request.audio_targets:
+        targets = await validate_audio_targets(request.audio_targets)
+        format, options = targets[0].split(":")[0], {"audio_targets": targets}
+    elif request.format not in AUDIO_FORMATS:
         raise HTTPException(status_code=400, detail="Invalid audio format. Use 'mp3' or 'wav'")
+    raw_urls = [str(url) for url in request.urls]
+    excerpts = await excerpt_options(request, raw_urls)
+    if excerpts:
+        options = {**(options or {}), **excerpts}
     
-    # Convert HttpUrl objects to strings
-    urls = [str(url) for url in request.urls]
+    # One canonical URL per video
+    urls, duplicates = dedupe_urls(raw_urls)
     
-    # Determine output path based on request type
-    if request.use_timestamped_folder:
-        # Web app: create timestamped folder in Downloads
-        try:
-            output_path = create_timestamped_folder(len(urls))
-            print(f"[AUDIO DOWNLOAD - WEB] Created folder: {output_path}")  # Debug logging
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Fehler beim Erstellen des Download-Ordners: {str(e)}")
-    else:
-        # Desktop app: use provided path
-        try:
-            output_path = resolve_output_path(request.output_path)
-            print(f"[AUDIO DOWNLOAD - DESKTOP] Resolved path: {output_path}")  # Debug logging
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid output path: {str(e)}")
-    
-    print(f"[AUDIO DOWNLOAD] URLs: {urls}")  # Debug logging
-    print(f"[AUDIO DOWNLOAD] Format: {request.format}")  # Debug logging
+    output_path = determine_output_path(
+        request.use_timestamped_folder, request.output_path, len(urls), "AUDIO DOWNLOAD"
+    )
+    task_id = queue_task("audio", format, output_path, urls, options=options)
     
-    # Create download status
-    status = DownloadStatus(
+    return DownloadResponse(
         task_id=task_id,
-        total_files=len(urls),
-        status="queued"
+        message=f"Audio download task started with {len(urls)} URLs"
+                + (f" ({duplicates} duplicates removed)" if duplicates else ""),
+        output_folder=output_path,
+        duplicates_removed=duplicates
     )
-    download_tasks[task_id] = status
+
+@app.post("/api/download/combined", response_model=DownloadResponse)
+async def download_combined(request: CombinedDownloadRequest):
+    """
+    Start a video + audio task: each URL is downloaded once, the audio file is converted locally
+    """
+    if request.format not in VIDEO_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid video format. Use 'mp4' or 'mkv'")
+    targets = await validate_audio_targets(request.audio_targets or [request.audio_format])
+    limits = format_limits(request)
+    raw_urls = [str(url) for url in request.urls]
+    excerpts = await excerpt_options(request, raw_urls)
     
-    # Create downloader and start in background
-    downloader = AudioDownloader(urls, request.format, output_path, status)
-    background_tasks.add_task(downloader.download_all)
+    # One canonical URL per video
+    urls, duplicates = dedupe_urls(raw_urls)
+    
+    output_path = determine_output_path(
+        request.use_timestamped_folder, request.output_path, len(urls), "COMBINED DOWNLOAD"
+    )
+    task_id = queue_task(
+        "combined", request.format, output_path, urls,
+        options={"format_ids": request.format_ids or {}, "audio_targets": targets,
+                 "limits": limits.to_dict(), **excerpts}
+    )
     
     return DownloadResponse(
         task_id=task_id,
-        message=f"Audio download task started with {len(urls)} URLs",
-        output_folder=output_path
+        message=f"Video + audio task started with {len(urls)} URLs"
+                + (f" ({duplicates} duplicates removed)" if duplicates else ""),
+        output_folder=output_path,
+        duplicates_removed=duplicates
     )
 
 @app.get("/api/status/{task_id}", response_model=StatusResponse)
@@ -223,11 +415,10 @@ async def get_status(task_id: str):
     """
     Get the status of a download task
     """
-    if task_id not in download_tasks:
+    status = task_store.load_status(task_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    status = download_tasks[task_id]
-    
     return StatusResponse(
         task_id=task_id,
         status=status.status,
@@ -237,40 +428,393 @@ async def get_status(task_id: str):
         message=status.message,
         current_file_progress=status.current_file_progress,
         current_file_message=status.current_file_message,
-        failed_urls=status.failed_urls
+        failed_urls=status.failed_urls,
+        format_plan=status.format_plan,
+        shared_urls=status.shared_urls,
+        cached_urls=status.cached_urls,
+        saved_bytes=status.saved_bytes
     )
 
-@app.post("/api/formats")
-async def check_formats(request: FormatCheckRequest):
+class TaskControlResponse(BaseModel):
+    task_id: str
+    status: str  # new status, or cancelling/pausing while the worker stops the running download
+    message: str
+
+# Results of request_control that mean the action was accepted
+CONTROL_RESULTS = {
+    "cancel": ("cancelled", "cancelling"),
+    "pause": ("paused", "pausing"),
+    "resume": ("queued",),
+}
+
+async def control_task(task_id: str, action: str) -> TaskControlResponse:
+    """Apply cancel/pause/resume to a task"""
+    status = await run_blocking(task_store.request_control, task_id, action)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if status not in CONTROL_RESULTS[action]:
+        raise HTTPException(status_code=409, detail=f"Aktion '{action}' ist im Status '{status}' nicht möglich")
+    if status == "cancelled":
+        # Queued or paused: no worker owns the task, drop its kept .part files here
+        await run_blocking(remove_task_dir, task_id)
+    logging.info("[TASK CONTROL] Task %s: %s -> %s", task_id, action, status)
+    return TaskControlResponse(task_id=task_id, status=status, message=f"Task {status}")
+
+@app.post("/api/tasks/{task_id}/cancel", response_model=TaskControlResponse)
+async def cancel_task(task_id: str):
+    """
+    Cancel a queued, running or paused task (partial downloads are removed)
+    """
+    return await control_task(task_id, "cancel")
+
+@app.post("/api/tasks/{task_id}/pause", response_model=TaskControlResponse)
+async def pause_task(task_id: str):
     """
-    Check available formats for a YouTube URL
+    Pause a task: the running download stops, its worker slot is freed and .part files are kept
     """
-    from downloader import check_available_formats
+    return await control_task(task_id, "pause")
+
+@app.post("/api/tasks/{task_id}/resume", response_model=TaskControlResponse)
+async def resume_task(task_id: str):
+    """
+    Queue a paused task again; it continues with the interrupted file
+    """
+    return await control_task(task_id, "resume")
+
+def _task_files(task_id: str) -> List[str]:
+    """Existing output files of a task (only files the task itself produced are served)"""
+    status = task_store.load_status(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return [path for path in status.files if os.path.isfile(path)]
+
+def _task_file_sizes(task_id: str) -> List[tuple]:
+    """(path, size) of the existing output files of a task"""
+    sizes = []
+    for path in _task_files(task_id):
+        try:
+            sizes.append((path, os.path.getsize(path)))
+        except OSError:
+            continue  # removed in the meantime
+    return sizes
+
+@app.get("/api/tasks/{task_id}/files")
+async def list_task_files(task_id: str):
+    """
+    Files of a task with their download URLs
+    """
+    files = await run_blocking(_task_file_sizes, task_id)
+    return {
+        "task_id": task_id,
+        "files": [
+            {
+                "name": os.path.basename(path),
+                "size": size,
+                "url": f"/api/tasks/{task_id}/files/{quote(os.path.basename(path))}"
+            }
+            for path, size in files
+        ],
+        "zip_url": f"/api/tasks/{task_id}/zip"
+    }
+
+@app.get("/api/tasks/{task_id}/files/{filename}")
+async def get_task_file(task_id: str, filename: str, range_header: Optional[str] = Header(None, alias="Range")):
+    """
+    Download one file of a task (supports Range requests, e.g. resumed downloads and seeking)
+    """
+    files = await run_blocking(_task_files, task_id)
+    for path in files:
+        if os.path.basename(path) == filename:
+            return RangeFileResponse(path, range_header)
+    raise HTTPException(status_code=404, detail="Datei nicht gefunden")
+
+@app.get("/api/tasks/{task_id}/zip")
+async def get_task_zip(task_id: str):
+    """
+    All files of a task as one ZIP, streamed while it is built (no temporary archive)
+    """
+    files = await run_blocking(_task_files, task_id)
+    if not files:
+        raise HTTPException(status_code=404, detail="Keine Dateien vorhanden")
+    name = os.path.basename(os.path.dirname(files[0])) or task_id
+    return StreamingResponse(
+        zip_stream(files),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(f"{name}.zip")}
+    )
+
+class RequeueFailedRequest(BaseModel):
+    download_type: str  # video, audio, combined - a requeue creates one task of this type
+    ids: Optional[List[int]] = None  # specific ledger entries; otherwise all matching the filters
+    task_id: Optional[str] = None
+    category: Optional[str] = None
+    since: Optional[float] = None  # Unix timestamp
+    format: Optional[str] = None  # defaults to mp4 / mp3
+    audio_format: Optional[str] = None  # combined only, defaults to mp3
+    audio_targets: Optional[List[str]] = None  # audio/combined: several outputs per download
+    output_path: str = "Downloads"
+    use_timestamped_folder: Optional[bool] = False
+
+@app.get("/api/failed")
+async def list_failed(task_id: Optional[str] = None, category: Optional[str] = None,
+                      download_type: Optional[str] = None, since: Optional[float] = None,
+                      until: Optional[float] = None, limit: int = 100, offset: int = 0):
+    """
+    Query the failed-download ledger (newest first)
+    """
+    from failed_ledger import failed_ledger
+    
+    entries = await run_blocking(
+        failed_ledger.query, limit=min(limit, 1000), offset=offset, task_id=task_id,
+        category=category, download_type=download_type, since=since, until=until
+    )
+    return {
+        "entries": entries,
+        "categories": await run_blocking(failed_ledger.categories)
+    }
+
+@app.post("/api/failed/requeue", response_model=DownloadResponse)
+async def requeue_failed(request: RequeueFailedRequest):
+    """
+    Re-enqueue selected (or all matching) failed URLs as one new task
+    """
+    from failed_ledger import failed_ledger
     
+    if request.download_type == "video":
+        format = request.format or VIDEO_FORMATS[0]
+        allowed = VIDEO_FORMATS
+    elif request.download_type == "audio":
+        format = request.format or AUDIO_FORMATS[0]
+        allowed = AUDIO_FORMATS
+    elif request.download_type == "combined":
+        format = request.format or VIDEO_FORMATS[0]
+        allowed = VIDEO_FORMATS
+    else:
+        raise HTTPException(status_code=400, detail="Invalid download_type. Use 'video', 'audio' or 'combined'")
+    options = None
+    if request.download_type == "combined":
+        options = {"audio_targets": await validate_audio_targets(
+            request.audio_targets or [request.audio_format or AUDIO_FORMATS[0]]
+        )}
+    elif request.download_type == "audio" and request.audio_targets:
+        options = {"audio_targets": await validate_audio_targets(request.audio_targets)}
+        format = options["audio_targets"][0].split(":")[0]  # the targets replace the format
+        allowed = [format]
+    if format not in allowed:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of {', '.join(allowed)}")
+    
+    urls = await run_blocking(
+        failed_ledger.urls, ids=request.ids, task_id=request.task_id, category=request.category,
+        download_type=request.download_type, since=request.since
+    )
+    urls, duplicates = dedupe_urls(urls)
+    if not urls:
+        raise HTTPException(status_code=404, detail="No failed downloads match")
+    
+    output_path = determine_output_path(
+        request.use_timestamped_folder, request.output_path, len(urls), "REQUEUE"
+    )
+    task_id = queue_task(request.download_type, format, output_path, urls, options=options)
+    
+    return DownloadResponse(
+        task_id=task_id,
+        message=f"Requeued {len(urls)} failed URLs",
+        output_folder=output_path,
+        duplicates_removed=duplicates
+    )
+
+class ImportResponse(BaseModel):
+    import_id: str
+    download_type: str
+    format: str
+    output_path: str
+    status: str  # importing, complete, error
+    bytes_read: int
+    lines_read: int
+    skipped_lines: int  # lines without a URL (CSV header, invalid JSON, ...)
+    duplicates: int
+    urls_queued: int
+    task_ids: List[str]  # one download task per chunk
+    message: str
+
+IMPORT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+async def _import_body(request: Request):
+    """Input format, then the pieces of the uploaded list as they arrive: the `file`
+    field of a multipart upload (parsed incrementally) or the raw body"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        try:
+            reader = MultipartFileReader(content_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Ungültiger Upload: {e}")
+        kind_sent = False
+        try:
+            async for data in request.stream():
+                pieces = reader.feed(data) if data else []
+                if reader.found and not kind_sent:
+                    yield detect_kind(reader.content_type, reader.filename)
+                    kind_sent = True
+                for piece in pieces:
+                    yield piece
+            pieces = reader.close()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Ungültiger Upload: {e}")
+        if not kind_sent:
+            raise HTTPException(status_code=400, detail="Feld 'file' fehlt")
+        for piece in pieces:
+            yield piece
+    else:
+        yield detect_kind(content_type)
+        async for data in request.stream():
+            if data:
+                yield data
+
+@app.post("/api/import/{download_type}", response_model=ImportResponse)
+async def bulk_import(download_type: str, request: Request, format: Optional[str] = None,
+                      output_path: str = "Downloads", use_timestamped_folder: bool = False,
+                      chunk_size: int = 500, import_id: Optional[str] = None):
+    """
+    Import a large URL list (text, CSV or NDJSON; upload or streamed body) and queue it in chunks
+    """
+    if download_type == "video":
+        format = format or VIDEO_FORMATS[0]
+        allowed = VIDEO_FORMATS
+    elif download_type == "audio":
+        format = format or AUDIO_FORMATS[0]
+        allowed = AUDIO_FORMATS
+    else:
+        raise HTTPException(status_code=400, detail="Invalid download_type. Use 'video' or 'audio'")
+    if format not in allowed:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of {', '.join(allowed)}")
+    if not 1 <= chunk_size <= 5000:
+        raise HTTPException(status_code=400, detail="chunk_size muss zwischen 1 und 5000 liegen")
+    
+    # A client-chosen ID lets the client poll the import while it is still uploading
+    import_id = import_id or str(uuid.uuid4())
+    if not IMPORT_ID_RE.match(import_id):
+        raise HTTPException(status_code=400, detail="Ungültige import_id")
+    if await run_blocking(import_registry.exists, import_id):
+        raise HTTPException(status_code=409, detail="import_id wird bereits verwendet")
+    
+    body = _import_body(request)
+    kind = await body.__anext__()
+    # The number of files is unknown up front; all chunks share one folder
+    path = determine_output_path(use_timestamped_folder, output_path, None, "IMPORT")
+    state = BulkImport(import_id, download_type, format, path, kind, chunk_size)
+    await run_blocking(import_registry.save, state)
+    
+    async def queue_chunks(chunks: List[List[str]]):
+        for urls in chunks:
+            task_id = await run_blocking(queue_task, download_type, format, path, urls)
+            state.queued(task_id, urls)
+        if chunks:
+            await run_blocking(import_registry.save, state)
+    
+    last_saved = time.monotonic()
     try:
-        formats = check_available_formats(str(request.url))
-        return {"formats": formats}
+        async for data in body:
+            await queue_chunks(state.feed(data))
+            if time.monotonic() - last_saved > 1:
+                await run_blocking(import_registry.save, state)
+                last_saved = time.monotonic()
+        await queue_chunks(state.finish())
+        state.status = "complete"
+        state.message = f"Imported {state.urls_queued} URLs in {len(state.task_ids)} task(s)"
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error checking formats: {str(e)}")
+        # Chunks queued so far keep downloading
+        logging.error(f"Import {import_id} aborted: {e}")
+        state.status = "error"
+        state.message = f"Import abgebrochen nach {state.urls_queued} URLs: {e}"
+    await run_blocking(import_registry.save, state)
+    logging.info("[IMPORT] %s: %s", import_id, state.message)
+    return ImportResponse(**await run_blocking(import_registry.get, import_id))
+
+@app.get("/api/import/{import_id}", response_model=ImportResponse)
+async def get_import(import_id: str):
+    """
+    Progress of a bulk import (download progress is reported per task via /api/status)
+    """
+    result = await run_blocking(import_registry.get, import_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return ImportResponse(**result)
+
+@app.post("/api/formats", response_model=FormatCheckResponse)
+async def check_formats(request: FormatCheckRequest):
+    """
+    Check available formats for a YouTube URL (cached per video ID)
+    """
+    from format_cache import format_cache
+    
+    if request.format not in ["mp4", "mkv"]:
+        raise HTTPException(status_code=400, detail="Invalid video format. Use 'mp4' or 'mkv'")
+    limits = format_limits(request)
+    
+    url = str(request.url)
+    info = await run_blocking(format_cache.get, url)  # may load the info JSON from disk
+    cached = info is not None
+    if not cached:
+        try:
+            info = await run_blocking(format_cache.fetch, url)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error checking formats: {str(e)}")
+    
+    # Same plan the downloader would use for this video
+    ffmpeg_available = await run_blocking(check_ffmpeg)
+    plan = plan_video_formats(info.formats, request.format, ffmpeg_available, limits)
+    
+    return FormatCheckResponse(
+        video_id=info.video_id,
+        title=info.title,
+        duration=info.duration,
+        cached=cached,
+        formats=[FormatInfo(**row) for row in info.formats if row.get("format_id")],
+        plan=plan.to_dict() if plan else None
+    )
 
 @app.get("/api/tools/check")
 async def check_tools():
     """
-    Check if required tools (yt-dlp, ffmpeg) are available
+    Check if required tools (yt-dlp, ffmpeg, ffprobe) are available
     """
-    from downloader import check_ytdlp, check_ffmpeg
-    
+    # Served from the registry; only re-probes if PATH or a binary changed
+    tools = await run_blocking(tool_registry.snapshot)
     return {
-        "yt_dlp": check_ytdlp(),
-        "ffmpeg": check_ffmpeg()
+        "yt_dlp": tools["yt_dlp"]["available"],
+        "ffmpeg": tools["ffmpeg"]["available"],
+        "tools": tools
     }
 
+@app.get("/api/debug/profile")
+async def debug_profile(seconds: float = 10.0, interval: float = 0.01, memory: bool = False,
+                        format: str = "json", x_debug_token: Optional[str] = Header(None)):
+    """
+    Sample all threads of this API process and of the download worker processes
+    for a limited time (requires MEDIATHEK_DEBUG_TOKEN)
+    """
+    from profiler import profile_all, ProfilerBusy
+    
+    if not settings.debug_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_debug_token or not hmac.compare_digest(x_debug_token, settings.debug_token):
+        raise HTTPException(status_code=403, detail="Ungültiges Debug-Token")
+    
+    seconds = min(max(seconds, 0.1), 60.0)
+    interval = min(max(interval, 0.001), 1.0)
+    try:
+        result = await run_blocking(profile_all, seconds, interval, memory)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="Es läuft bereits ein Profiling")
+    
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"] + "\n")
+    return result
+
 class SearchRequest(BaseModel):
     query: str
     max_results: Optional[int] = 10
 
-from fastapi.responses import StreamingResponse
-import asyncio
 import json
 
 # Store active search processes
@@ -302,7 +846,7 @@ async def search_youtube(request: SearchRequest):
             active_searches[search_id] = process
             
             try:
-                stdout, stderr = process.communicate(timeout=60)
+                stdout, stderr = await run_blocking(process.communicate, timeout=60)
                 
                 if process.returncode != 0:
                     yield f"data: {{\"error\": \"Suche fehlgeschlagen: {stderr}\"}}\n\n"
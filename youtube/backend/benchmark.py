@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline Benchmark
+Runs the real downloaders (and optionally the API) against generated media
+fixtures on a local HTTP server via yt-dlp's generic extractor and reports
+files/s, MB/s, per-file overhead and peak memory per batch size and
+concurrency level. Results are stored as JSON for comparison between runs.
+
+Usage: python benchmark.py [--batch-sizes 1 5 20] [--concurrency 1 2 4]
+                           [--size-mb 5] [--api] [--compare PREVIOUS.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from typing import Dict, List, Optional
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+from settings import settings, backend_dir
+from tool_registry import tool_registry
+from media_fixtures import FixtureServer, generate_fixtures, fixture_size
+
+
+def _peak_rss_mb(who: int) -> Optional[float]:
+    """Peak resident set size of this process or its (waited-for) children"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _output_bytes(folder: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(folder):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+    return total
+
+
+def isolated_env(workdir: str, concurrency: int) -> Dict[str, str]:
+    """Backend settings that keep a scenario away from real data and caches"""
+    env = dict(os.environ)
+    env.update({
+        "MEDIATHEK_DATA_DIR": os.path.join(workdir, "data"),
+        "MEDIATHEK_SCRATCH_DIR": os.path.join(workdir, "scratch"),
+        "MEDIATHEK_LOG_FILE": os.path.join(workdir, "benchmark.log"),
+        "MEDIATHEK_MEDIA_QUOTA_MB": "0",
+        "MEDIATHEK_MIN_FREE_MB": "0",
+        "MEDIATHEK_EMBEDDED_WORKERS": str(concurrency),
+        "MEDIATHEK_OFFLINE": "1",
+    })
+    return env
+
+
+# ---------------------------------------------------------------------------
+# Scenario runners (executed in a fresh process per scenario)
+# ---------------------------------------------------------------------------
+
+def _run_downloaders(spec: Dict) -> Dict:
+    """Split the batch over `concurrency` downloader threads, like the embedded workers"""
+    from downloader import VideoDownloader, AudioDownloader, DownloadStatus
+
+    downloader_cls = VideoDownloader if spec["downloader"] == "video" else AudioDownloader
+    chunks = [spec["urls"][n::spec["concurrency"]] for n in range(spec["concurrency"])]
+    chunks = [chunk for chunk in chunks if chunk]
+    statuses = []
+    threads = []
+    for n, chunk in enumerate(chunks):
+        status = DownloadStatus(task_id=f"bench-{n}", total_files=len(chunk))
+        output = os.path.join(spec["output"], str(n))
+        os.makedirs(output, exist_ok=True)
+        downloader = downloader_cls(chunk, spec["format"], output, status)
+        threads.append(threading.Thread(target=downloader.download_all, name=f"bench-{n}"))
+        statuses.append(status)
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "failed": sum(len(s.failed_urls) for s in statuses)}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request_json(url: str, payload: Optional[Dict] = None) -> Dict:
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def start_api(env: Optional[Dict[str, str]] = None, workers: int = 1) -> tuple:
+    """Start the API on a free port without reload; returns (process, base URL) once healthy"""
+    port = free_port()
+    api_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while True:
+        try:
+            request_json(f"{api_url}/health")
+            return server, api_url
+        except OSError:
+            if time.time() > deadline or server.poll() is not None:
+                server.kill()
+                raise RuntimeError("API did not start")
+            time.sleep(0.2)
+
+
+def _run_api(spec: Dict) -> Dict:
+    """Submit the batch as `concurrency` tasks to a freshly started API and poll until done"""
+    server, api_url = start_api()
+    try:
+        endpoint = "video" if spec["downloader"] == "video" else "audio"
+        chunks = [spec["urls"][n::spec["concurrency"]] for n in range(spec["concurrency"])]
+        start = time.perf_counter()
+        task_ids = []
+        for n, chunk in enumerate(c for c in chunks if c):
+            output = os.path.join(spec["output"], str(n))
+            os.makedirs(output, exist_ok=True)
+            response = request_json(f"{api_url}/api/download/{endpoint}", {
+                "urls": chunk, "format": spec["format"], "output_path": output,
+                "use_timestamped_folder": False,
+            })
+            task_ids.append(response["task_id"])
+
+        failed = 0
+        pending = set(task_ids)
+        while pending:
+            time.sleep(0.2)
+            for task_id in list(pending):
+                status = request_json(f"{api_url}/api/status/{task_id}")
+                if status["status"] in ("complete", "error"):
+                    failed += len(status["failed_urls"])
+                    pending.discard(task_id)
+        seconds = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {"seconds": seconds, "failed": failed}
+
+
+def run_scenario(spec: Dict) -> Dict:
+    """Entry point of the scenario process; settings come from the isolated environment"""
+    runner = _run_api if spec["mode"] == "api" else _run_downloaders
+    result = runner(spec)
+    result["bytes"] = _output_bytes(spec["output"])
+    result["peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    result["child_peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Orchestration
+# ---------------------------------------------------------------------------
+
+def measure_baseline(server: FixtureServer, relative_path: str, repeats: int = 3) -> float:
+    """Raw HTTP throughput (bytes/s) of the fixture server, best of `repeats`"""
+    best = 0.0
+    for n in range(repeats):
+        start = time.perf_counter()
+        with urllib.request.urlopen(server.url(relative_path, n)) as response:
+            size = len(response.read())
+        best = max(best, size / (time.perf_counter() - start))
+    return best
+
+
+def _spawn_scenario(spec: Dict, workdir: str) -> Dict:
+    """Run one scenario in a fresh interpreter (clean singletons and memory peaks)"""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--scenario", json.dumps(spec)],
+        cwd=backend_dir, env=isolated_env(workdir, spec["concurrency"]),
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-1000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _scenarios(fixtures: Dict[str, str], ffmpeg: bool, api: bool) -> List[Dict]:
+    scenarios = [{"mode": "downloader", "downloader": "video", "format": "mp4", "fixture": kind}
+                 for kind in fixtures]
+    if ffmpeg:
+        # Audio extraction needs ffmpeg
+        scenarios.append({"mode": "downloader", "downloader": "audio", "format": "mp3",
+                          "fixture": "progressive"})
+    if api:
+        scenarios.append({"mode": "api", "downloader": "video", "format": "mp4", "fixture": "progressive"})
+    return scenarios
+
+
+def run_benchmarks(batch_sizes: List[int], concurrency_levels: List[int], size_mb: float,
+                   api: bool, kinds: Optional[List[str]] = None) -> Dict:
+    ffmpeg = tool_registry.get("ffmpeg")
+    root = tempfile.mkdtemp(prefix="mediathek-bench-")
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "yt_dlp": tool_registry.get("yt_dlp").version,
+            "ffmpeg": ffmpeg.version,
+        },
+        "size_mb": size_mb,
+        "results": [],
+    }
+    try:
+        fixture_dir = os.path.join(root, "fixtures")
+        fixtures = generate_fixtures(fixture_dir, size_mb, ffmpeg.path if ffmpeg.available else None)
+        if kinds:
+            fixtures = {kind: path for kind, path in fixtures.items() if kind in kinds}
+
+        with FixtureServer(fixture_dir) as server:
+            baseline = measure_baseline(server, fixtures.get("progressive", next(iter(fixtures.values()))))
+            report["baseline_mb_per_s"] = round(baseline / 1024 / 1024, 2)
+            print(f"Fixture server: {report['baseline_mb_per_s']} MB/s raw HTTP")
+
+            for scenario in _scenarios(fixtures, ffmpeg.available, api):
+                file_bytes = fixture_size(fixture_dir, fixtures[scenario["fixture"]])
+                for batch in batch_sizes:
+                    for concurrency in concurrency_levels:
+                        if concurrency > batch:
+                            continue
+                        workdir = tempfile.mkdtemp(dir=root)
+                        spec = dict(scenario, concurrency=concurrency,
+                                    urls=[server.url(fixtures[scenario["fixture"]], n) for n in range(batch)],
+                                    output=os.path.join(workdir, "output"))
+                        name = f"{scenario['mode']}/{scenario['downloader']}/{scenario['fixture']}"
+                        try:
+                            measured = _spawn_scenario(spec, workdir)
+                        except RuntimeError as e:
+                            print(f"{name} batch={batch} c={concurrency}: failed ({e})")
+                            continue
+                        finally:
+                            shutil.rmtree(workdir, ignore_errors=True)
+
+                        seconds = measured["seconds"]
+                        files = batch - measured["failed"]
+                        result = {
+                            "mode": scenario["mode"],
+                            "downloader": scenario["downloader"],
+                            "fixture": scenario["fixture"],
+                            "batch": batch,
+                            "concurrency": concurrency,
+                            "files": files,
+                            "failed": measured["failed"],
+                            "seconds": round(seconds, 3),
+                            "files_per_s": round(files / seconds, 3) if seconds else None,
+                            "mb_per_s": round(measured["bytes"] / 1024 / 1024 / seconds, 2) if seconds else None,
+                            # Time per file beyond the raw transfer time of its bytes
+                            "overhead_per_file_s": round(
+                                seconds * concurrency / batch - file_bytes / baseline, 3
+                            ) if baseline else None,
+                            "peak_rss_mb": measured["peak_rss_mb"],
+                            "child_peak_rss_mb": measured["child_peak_rss_mb"],
+                        }
+                        report["results"].append(result)
+                        print(f"{name} batch={batch} c={concurrency}: {result['files_per_s']} files/s,"
+                              f" {result['mb_per_s']} MB/s, overhead {result['overhead_per_file_s']} s/file,"
+                              f" failed {result['failed']}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return report
+
+
+def _result_key(result: Dict) -> tuple:
+    return (result["mode"], result["downloader"], result["fixture"], result["batch"], result["concurrency"])
+
+
+def compare(previous: Dict, current: Dict):
+    """Print the change of throughput and overhead per scenario"""
+    old = {_result_key(r): r for r in previous.get("results", [])}
+    print(f"\nComparison with run from {previous.get('created_at')}:")
+    for result in current["results"]:
+        before = old.get(_result_key(result))
+        if not before or not before.get("files_per_s") or not result.get("files_per_s"):
+            continue
+        change = (result["files_per_s"] / before["files_per_s"] - 1) * 100
+        print(f"  {'/'.join(str(k) for k in _result_key(result))}: "
+              f"{before['files_per_s']} → {result['files_per_s']} files/s ({change:+.1f}%), "
+              f"overhead {before['overhead_per_file_s']} → {result['overhead_per_file_s']} s/file")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="MediathekManagement offline benchmark")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--size-mb", type=float, default=5, help="approximate size of each fixture")
+    parser.add_argument("--kinds", nargs="+", choices=["progressive", "hls", "dash"],
+                        help="fixture kinds to run (default: all available)")
+    parser.add_argument("--api", action="store_true", help="also benchmark through the HTTP API")
+    parser.add_argument("--output", help="result file (default: data/benchmarks/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous result file to compare with")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)  # internal: run one scenario
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+        return
+
+    if not tool_registry.is_available("yt_dlp"):
+        print("yt-dlp ist nicht installiert.")
+        sys.exit(1)
+
+    report = run_benchmarks(args.batch_sizes, args.concurrency, args.size_mb, args.api, args.kinds)
+    output = args.output or os.path.join(
+        settings.data_dir, "benchmarks", f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk URL Import
+Incremental parsing of uploaded URL lists (text, CSV, NDJSON): URLs are
+canonicalized and deduplicated as they arrive and queued in chunks, with the
+import's own progress kept in the task database
+"""
+
+import re
+import csv
+import json
+import time
+import codecs
+from typing import Dict, List, Optional
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from db import SQLiteDatabase
+from settings import settings
+from url_canonicalizer import canonical_url
+
+
+IMPORT_KINDS = ("text", "csv", "ndjson")
+
+URL_RE = re.compile(r"^https?://\S+$", re.IGNORECASE)
+
+
+def detect_kind(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """Input format from the file name or content type (plain text by default)"""
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    return "text"
+
+
+class UrlLineParser:
+    """Bytes in, URLs out; an incomplete last line is kept until the next chunk"""
+
+    def __init__(self, kind: str):
+        if kind not in IMPORT_KINDS:
+            raise ValueError(f"Unknown import format: {kind}")
+        self.kind = kind
+        self.lines = 0
+        self.skipped = 0  # lines without a URL (CSV header, invalid JSON, ...)
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._rest = ""
+
+    def feed(self, data: bytes) -> List[str]:
+        lines = (self._rest + self._decoder.decode(data)).split("\n")
+        self._rest = lines.pop()
+        return self._parse(lines)
+
+    def close(self) -> List[str]:
+        text = self._rest + self._decoder.decode(b"", final=True)
+        self._rest = ""
+        return self._parse([text])
+
+    def _parse(self, lines: List[str]) -> List[str]:
+        urls = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            self.lines += 1
+            url = self._extract(line)
+            if url:
+                urls.append(url)
+            else:
+                self.skipped += 1
+        return urls
+
+    def _extract(self, line: str) -> Optional[str]:
+        if self.kind == "ndjson":
+            try:
+                value = json.loads(line)
+            except ValueError:
+                return None
+            if isinstance(value, dict):
+                value = value.get("url")
+            candidates = [value] if isinstance(value, str) else []
+        elif self.kind == "csv":
+            # First cell holding a URL, so exports with extra columns work as they are
+            candidates = next(csv.reader([line]), [])
+        else:
+            candidates = [line]
+        for candidate in candidates:
+            candidate = candidate.strip()
+            if URL_RE.match(candidate):
+                return candidate
+        return None
+
+
+class MultipartFileReader:
+    """Incremental multipart/form-data parser that passes through the bytes of one file field
+    (the upload is never spooled to memory or a temporary file)"""
+
+    def __init__(self, content_type: str, field: str = "file"):
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise ValueError("multipart boundary missing")
+        self.field = field
+        self.found = False
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self._headers: Dict[str, str] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._active = False
+        self._data: List[bytes] = []
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Parse a piece of the request body; returns the file bytes it contained"""
+        self._parser.write(data)
+        data, self._data = self._data, []
+        return data
+
+    def close(self) -> List[bytes]:
+        """End of the request body"""
+        self._parser.finalize()
+        data, self._data = self._data, []
+        return data
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        name = self._header_field.decode("latin-1").lower()
+        self._headers[name] = self._header_value.decode("latin-1")
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get("content-disposition", ""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        # Only the first file field is read; other form fields are skipped
+        self._active = name == self.field and not self.found
+        if self._active:
+            self.found = True
+            self.filename = options.get(b"filename", b"").decode("utf-8", errors="replace") or None
+            self.content_type = self._headers.get("content-type")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._active:
+            self._data.append(data[start:end])
+
+    def _on_part_end(self):
+        self._active = False
+
+
+class BulkImport:
+    """One running import: deduplicates across the whole upload and cuts it into task-sized chunks"""
+
+    def __init__(self, import_id: str, download_type: str, format: str, output_path: str,
+                 kind: str, chunk_size: int = 500):
+        self.import_id = import_id
+        self.download_type = download_type
+        self.format = format
+        self.output_path = output_path
+        self.parser = UrlLineParser(kind)
+        self.chunk_size = chunk_size
+        self.status = "importing"  # importing, complete, error
+        self.message = ""
+        self.bytes_read = 0
+        self.urls_queued = 0
+        self.duplicates = 0
+        self.task_ids: List[str] = []
+        self._seen = set()
+        self._pending: List[str] = []
+
+    def feed(self, data: bytes) -> List[List[str]]:
+        """Parse a piece of the upload; returns the chunks that are ready to be queued"""
+        self.bytes_read += len(data)
+        return self._add(self.parser.feed(data), final=False)
+
+    def finish(self) -> List[List[str]]:
+        """End of upload; returns the remaining (partial) chunk"""
+        return self._add(self.parser.close(), final=True)
+
+    def queued(self, task_id: str, urls: List[str]):
+        self.task_ids.append(task_id)
+        self.urls_queued += len(urls)
+
+    def _add(self, urls: List[str], final: bool) -> List[List[str]]:
+        for url in urls:
+            canonical = canonical_url(url)
+            if canonical in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(canonical)
+            self._pending.append(canonical)
+        chunks = []
+        while len(self._pending) >= self.chunk_size or (final and self._pending):
+            chunks.append(self._pending[:self.chunk_size])
+            del self._pending[:self.chunk_size]
+        return chunks
+
+
+class ImportRegistry:
+    """Progress of bulk imports, readable by every API worker"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db = SQLiteDatabase(db_path or settings.task_db)
+        self.db.conn().executescript("""
+            CREATE TABLE IF NOT EXISTS imports (
+                import_id     TEXT PRIMARY KEY,
+                download_type TEXT NOT NULL,
+                format        TEXT NOT NULL,
+                output_path   TEXT NOT NULL,
+                status        TEXT NOT NULL,
+                bytes_read    INTEGER NOT NULL DEFAULT 0,
+                lines_read    INTEGER NOT NULL DEFAULT 0,
+                skipped_lines INTEGER NOT NULL DEFAULT 0,
+                duplicates    INTEGER NOT NULL DEFAULT 0,
+                urls_queued   INTEGER NOT NULL DEFAULT 0,
+                task_ids      TEXT NOT NULL DEFAULT '[]',
+                message       TEXT NOT NULL DEFAULT '',
+                created_at    REAL NOT NULL,
+                updated_at    REAL NOT NULL
+            );
+        """)
+
+    def exists(self, import_id: str) -> bool:
+        return self.db.conn().execute(
+            "SELECT 1 FROM imports WHERE import_id = ?", (import_id,)
+        ).fetchone() is not None
+
+    def save(self, state: BulkImport):
+        """Insert or update the progress of an import"""
+        now = time.time()
+        self.db.conn().execute(
+            "INSERT INTO imports (import_id, download_type, format, output_path, status, bytes_read,"
+            " lines_read, skipped_lines, duplicates, urls_queued, task_ids, message, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (import_id) DO UPDATE SET status = excluded.status,"
+            " bytes_read = excluded.bytes_read, lines_read = excluded.lines_read,"
+            " skipped_lines = excluded.skipped_lines, duplicates = excluded.duplicates,"
+            " urls_queued = excluded.urls_queued, task_ids = excluded.task_ids,"
+            " message = excluded.message, updated_at = excluded.updated_at",
+            (state.import_id, state.download_type, state.format, state.output_path, state.status,
+             state.bytes_read, state.parser.lines, state.parser.skipped, state.duplicates,
+             state.urls_queued, json.dumps(state.task_ids), state.message, now, now)
+        )
+
+    def get(self, import_id: str) -> Optional[Dict]:
+        row = self.db.conn().execute(
+            "SELECT import_id, download_type, format, output_path, status, bytes_read, lines_read,"
+            " skipped_lines, duplicates, urls_queued, task_ids, message, created_at, updated_at"
+            " FROM imports WHERE import_id = ?", (import_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("import_id", "download_type", "format", "output_path", "status", "bytes_read",
+                "lines_read", "skipped_lines", "duplicates", "urls_queued", "task_ids", "message",
+                "created_at", "updated_at")
+        result = dict(zip(keys, row))
+        result["task_ids"] = json.loads(result["task_ids"])
+        return result
+
+
+# Module-level singleton
+import_registry = ImportRegistry()
@@ -7,12 +7,33 @@ Checks and installs all required dependencies for the MediathekManagement-Tool
 
 import os
 import sys
+import json
+import argparse
 import subprocess
 import shutil
 import logging
+from importlib import metadata
 from pathlib import Path
 from typing import Tuple, List, Dict
 
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.version import InvalidVersion
+
+
+def parse_requirement(line: str) -> Tuple[str, SpecifierSet]:
+    """Split a requirement line into (package name, specifier set)"""
+    requirement = Requirement(line.split("#")[0].strip())  # drop comments
+    return requirement.name, requirement.specifier
+
+
+def version_satisfies(installed: str, specifier: SpecifierSet) -> bool:
+    """Check an installed version against requirement specifiers (PEP 440, pre-releases allowed)"""
+    try:
+        return specifier.contains(installed, prereleases=True)
+    except InvalidVersion:
+        return False
+
 
 class DependencyChecker:
     """Comprehensive dependency checker and installer"""
@@ -48,21 +69,16 @@ class DependencyChecker:
         """Check if ffmpeg is installed"""
         self.logger.info("🔍 Checking ffmpeg...")
         
-        if shutil.which("ffmpeg"):
-            try:
-                result = subprocess.run(
-                    ["ffmpeg", "-version"],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                if result.returncode == 0:
-                    version_line = result.stdout.split('\n')[0]
-                    self.logger.info(f"✓ ffmpeg found: {version_line}")
-                    return True
-            except Exception as e:
-                self.logger.warning(f"⚠ ffmpeg found but error checking version: {e}")
-                return True
+        from tool_registry import tool_registry
+        ffmpeg = tool_registry.get("ffmpeg")
+        if ffmpeg.available:
+            self.logger.info(f"✓ ffmpeg found: {ffmpeg.version} ({ffmpeg.path})")
+            ffprobe = tool_registry.get("ffprobe")
+            if not ffprobe.available:
+                self.logger.warning("⚠ ffprobe not found (usually shipped with ffmpeg)")
+            return True
+        if ffmpeg.path:
+            self.logger.warning(f"⚠ ffmpeg found at {ffmpeg.path} but it does not run")
         
         self.logger.warning("✗ ffmpeg not found")
         self.missing_dependencies.append("ffmpeg")
@@ -138,6 +154,50 @@ class DependencyChecker:
             self.logger.error(f"✗ Failed to upgrade pip: {e}")
             return False
     
+    @staticmethod
+    def _read_requirements(requirements_file: str) -> List[str]:
+        with open(requirements_file, 'r', encoding='utf-8') as f:
+            return [
+                line.strip() for line in f 
+                if line.strip() and not line.strip().startswith(('#', '-'))
+            ]
+    
+    def resolve_requirements(self, requirements_files: List[str]) -> Dict[str, Dict]:
+        """Resolve installed versions in-process and compare them with the specifiers"""
+        report = {}
+        for requirements_file in requirements_files:
+            if not os.path.exists(requirements_file):
+                continue
+            for req in self._read_requirements(requirements_file):
+                try:
+                    name, specs = parse_requirement(req)
+                except InvalidRequirement as e:
+                    self.logger.warning(f"⚠ Ignoring invalid requirement '{req}': {e}")
+                    continue
+                key = name.lower().replace("_", "-")
+                try:
+                    installed = metadata.version(name)
+                except metadata.PackageNotFoundError:
+                    installed = None
+                
+                if installed is None:
+                    state = "missing"
+                elif version_satisfies(installed, specs):
+                    state = "ok"
+                else:
+                    state = "outdated"
+                
+                # The same package may appear in several files: keep the worst result
+                if key in report and report[key]["status"] != "ok" and state == "ok":
+                    continue
+                report[key] = {
+                    "requirement": req,
+                    "installed": installed,
+                    "status": state,
+                    "source": str(requirements_file),
+                }
+        return report
+    
     def check_python_packages(self, requirements_file: str) -> bool:
         """Check if all required Python packages are installed"""
         self.logger.info(f"🔍 Checking Python packages from {requirements_file}...")
@@ -146,102 +206,78 @@ class DependencyChecker:
             self.logger.warning(f"⚠ Requirements file not found: {requirements_file}")
             return True
         
-        # Read requirements
-        with open(requirements_file, 'r', encoding='utf-8') as f:
-            requirements = [
-                line.strip() for line in f 
-                if line.strip() and not line.strip().startswith('#')
-            ]
+        report = self.resolve_requirements([requirements_file])
+        unsatisfied = [entry["requirement"] for entry in report.values() if entry["status"] != "ok"]
         
-        # Check each package
-        missing = []
-        for req in requirements:
-            package_name = req.split('>=')[0].split('==')[0].split('[')[0].strip()
-            if not self._is_package_installed(package_name):
-                missing.append(req)
-        
-        if missing:
-            self.logger.warning(f"✗ Missing packages: {', '.join(missing)}")
+        if unsatisfied:
+            self.logger.warning(f"✗ Missing/outdated packages: {', '.join(unsatisfied)}")
             return False
         else:
             self.logger.info(f"✓ All packages from {Path(requirements_file).name} are installed")
             return True
     
-    def _is_package_installed(self, package_name: str) -> bool:
-        """Check if a specific package is installed"""
-        try:
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "show", package_name],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            return result.returncode == 0
-        except Exception:
-            return False
-    
-    def install_python_packages(self, requirements_file: str) -> bool:
-        """Install Python packages from requirements file"""
-        self.logger.info(f"📦 Installing packages from {requirements_file}...")
+    def install_packages(self, requirements: List[str], upgrade: bool = False) -> bool:
+        """Install the given requirements with a single pip call"""
+        if not requirements:
+            return True
+        
+        self.logger.info(f"📦 Installing {', '.join(requirements)}...")
+        cmd = [sys.executable, "-m", "pip", "install"]
+        if upgrade:
+            cmd.append("--upgrade")
         
         try:
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "install", "-r", requirements_file],
-                timeout=300
-            )
+            result = subprocess.run(cmd + requirements, timeout=600)
             if result.returncode == 0:
-                self.logger.info(f"✓ Successfully installed packages from {Path(requirements_file).name}")
+                self.logger.info(f"✓ Successfully installed {len(requirements)} package(s)")
                 return True
             else:
-                self.logger.error(f"✗ Failed to install packages from {Path(requirements_file).name}")
+                self.logger.error("✗ Failed to install packages")
                 return False
         except Exception as e:
             self.logger.error(f"✗ Error installing packages: {e}")
             return False
     
+    def install_python_packages(self, requirements_file: str) -> bool:
+        """Install missing or outdated packages from a requirements file"""
+        report = self.resolve_requirements([requirements_file])
+        return self.install_packages(
+            [entry["requirement"] for entry in report.values() if entry["status"] != "ok"]
+        )
+    
     def update_python_packages(self, requirements_file: str) -> bool:
-        """Update all Python packages to latest versions"""
+        """Update all Python packages to latest versions (single pip call)"""
         self.logger.info(f"⬆️  Updating packages from {requirements_file}...")
         
         if not os.path.exists(requirements_file):
             return True
         
-        # Read requirements
-        with open(requirements_file, 'r', encoding='utf-8') as f:
-            requirements = [
-                line.strip() for line in f 
-                if line.strip() and not line.strip().startswith('#')
-            ]
-        
-        updated = []
-        for req in requirements:
-            package_name = req.split('>=')[0].split('==')[0].split('[')[0].strip()
-            
-            try:
-                result = subprocess.run(
-                    [sys.executable, "-m", "pip", "install", "--upgrade", package_name],
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
-                
-                if "Successfully installed" in result.stdout:
-                    updated.append(package_name)
-                    self.logger.info(f"  ✓ Updated {package_name}")
-                else:
-                    self.logger.info(f"  ✓ {package_name} already up-to-date")
-                    
-            except Exception as e:
-                self.logger.warning(f"  ⚠ Failed to update {package_name}: {e}")
-        
-        if updated:
-            self.logger.info(f"✓ Updated {len(updated)} package(s): {', '.join(updated)}")
-        else:
-            self.logger.info("✓ All packages are up-to-date")
-        
-        return True
+        return self.install_packages(self._read_requirements(requirements_file), upgrade=True)
+    
+    def requirements_files(self) -> List[str]:
+        project_root = Path(__file__).parent.parent
+        return [
+            str(project_root / "requirements.txt"),
+            str(project_root / "backend" / "requirements.txt")
+        ]
+    
+    def check_only(self) -> Dict:
+        """Machine-readable report without installing anything"""
+        from tool_registry import tool_registry
+        
+        packages = self.resolve_requirements(self.requirements_files())
+        ffmpeg = tool_registry.get("ffmpeg")
+        return {
+            "python": ".".join(str(v) for v in sys.version_info[:3]),
+            "python_ok": sys.version_info >= (3, 8),
+            "ffmpeg": {"available": ffmpeg.available, "version": ffmpeg.version},
+            "packages": packages,
+            "missing": [name for name, entry in packages.items() if entry["status"] == "missing"],
+            "outdated": [name for name, entry in packages.items() if entry["status"] == "outdated"],
+            "ok": sys.version_info >= (3, 8) and all(entry["status"] == "ok" for entry in packages.values()),
+        }
     
-    def check_all_dependencies(self) -> bool:
+    def check_all_dependencies(self, upgrade: bool = False) -> bool:
         """Run all dependency checks"""
         self.logger.info("\n" + "="*60)
         self.logger.info("🚀 MEDIATHEKMANAGEMENT-TOOL DEPENDENCY CHECK")
@@ -264,9 +300,10 @@ class DependencyChecker:
         
         print()
         
-        # Upgrade pip
-        self.upgrade_pip()
-        print()
+        # Upgrade pip (only on request; it costs a network round trip every start)
+        if upgrade:
+            self.upgrade_pip()
+            print()
         
         # Check ffmpeg
         if not self.check_ffmpeg():
@@ -276,26 +313,21 @@ class DependencyChecker:
         
         print()
         
-        # Check and install Python packages
-        project_root = Path(__file__).parent.parent
-        requirements_files = [
-            project_root / "requirements.txt",
-            project_root / "backend" / "requirements.txt"
-        ]
-        
-        for req_file in requirements_files:
-            if req_file.exists():
-                if not self.check_python_packages(str(req_file)):
-                    self.logger.info(f"📦 Installing missing packages from {req_file.name}...")
-                    if not self.install_python_packages(str(req_file)):
-                        all_ok = False
-                print()
+        # Check Python packages in-process, then install only what is missing/outdated
+        self.logger.info("🔍 Checking Python packages...")
+        report = self.resolve_requirements(self.requirements_files())
+        unsatisfied = [entry["requirement"] for entry in report.values() if entry["status"] != "ok"]
+        if unsatisfied:
+            self.logger.warning(f"✗ Missing/outdated packages: {', '.join(unsatisfied)}")
+            if not self.install_packages(unsatisfied):
+                all_ok = False
+        else:
+            self.logger.info(f"✓ All {len(report)} packages are installed")
         
         # Update packages
-        self.logger.info("🔄 Checking for package updates...")
-        for req_file in requirements_files:
-            if req_file.exists():
-                self.update_python_packages(str(req_file))
+        if upgrade:
+            self.logger.info("🔄 Checking for package updates...")
+            self.install_packages([entry["requirement"] for entry in report.values()], upgrade=True)
         
         print()
         
@@ -311,15 +343,27 @@ class DependencyChecker:
         
         return all_ok
     
-    def run(self) -> bool:
+    def run(self, upgrade: bool = False) -> bool:
         """Main entry point"""
-        return self.check_all_dependencies()
+        return self.check_all_dependencies(upgrade=upgrade)
 
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="MediathekManagement-Tool dependency checker")
+    parser.add_argument("--check-only", action="store_true",
+                        help="print a JSON report and exit (1 if something is missing/outdated)")
+    parser.add_argument("--upgrade", action="store_true",
+                        help="also upgrade pip and all packages to their latest versions")
+    args = parser.parse_args()
+    
+    if args.check_only:
+        report = DependencyChecker().check_only()
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["ok"] else 1)
+    
     checker = DependencyChecker()
-    success = checker.run()
+    success = checker.run(upgrade=args.upgrade)
     
     if not success:
         print("\nPress Enter to continue anyway or Ctrl+C to abort...")
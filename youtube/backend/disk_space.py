@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disk Space Admission
+Reserves the estimated size of each download on the output and scratch volumes
+(shared across worker processes), so a batch waits for space instead of
+filling the disk halfway through
+"""
+
+import os
+import time
+import shutil
+import logging
+from typing import Dict, Iterable, Optional
+
+from db import SQLiteDatabase
+from settings import settings
+
+
+# Seconds before a task that is waiting for disk space is claimed again
+SPACE_RETRY_DELAY = 30.0
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def _existing_parent(path: str) -> str:
+    """Nearest existing directory (output folders may not exist yet)"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class InsufficientSpace(Exception):
+    """The volume is too small for the download even when nothing else is reserved"""
+
+
+class SpaceReservations:
+    """Per-volume reservations of estimated download sizes"""
+
+    def __init__(self, db_path: Optional[str] = None, min_free_mb: Optional[int] = None):
+        self.db = SQLiteDatabase(db_path or settings.task_db)
+        self.min_free = (settings.min_free_mb if min_free_mb is None else min_free_mb) * 1024 * 1024
+        self.db.conn().executescript("""
+            CREATE TABLE IF NOT EXISTS space_reservations (
+                task_id    TEXT NOT NULL,
+                device     INTEGER NOT NULL,
+                bytes      INTEGER NOT NULL,
+                written    INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_reservations_device ON space_reservations (device);
+            CREATE INDEX IF NOT EXISTS idx_reservations_task ON space_reservations (task_id);
+        """)
+        columns = [row[1] for row in self.db.conn().execute("PRAGMA table_info(space_reservations)")]
+        if "written" not in columns:  # databases created before reservations shrank
+            self.db.conn().execute("ALTER TABLE space_reservations ADD COLUMN written INTEGER NOT NULL DEFAULT 0")
+
+    def try_reserve(self, task_id: str, needs: Dict[str, int]) -> Optional[str]:
+        """Reserve bytes per path (paths on one volume are summed); returns None or the shortfall"""
+        volumes: Dict[int, list] = {}  # device -> [path, bytes]
+        for path, size in needs.items():
+            path = _existing_parent(path)
+            volume = volumes.setdefault(os.stat(path).st_dev, [path, 0])
+            volume[1] += max(0, int(size))
+
+        with self.db.transaction() as conn:
+            for device, (path, size) in volumes.items():
+                usage = shutil.disk_usage(path)
+                if size + self.min_free > usage.total:
+                    raise InsufficientSpace(
+                        f"Nicht genug Speicherplatz auf {path}: benötigt {format_bytes(size)},"
+                        f" Laufwerk hat {format_bytes(usage.total)}"
+                    )
+                # Bytes already on disk are part of usage.free and no longer count as reserved
+                reserved = conn.execute(
+                    "SELECT COALESCE(SUM(MAX(bytes - written, 0)), 0) FROM space_reservations WHERE device = ?",
+                    (device,)
+                ).fetchone()[0]
+                available = usage.free - reserved - self.min_free
+                if size > available:
+                    return (f"Warte auf freien Speicherplatz auf {path}: benötigt {format_bytes(size)},"
+                            f" verfügbar {format_bytes(max(0, available))}")
+            now = time.time()
+            conn.executemany(
+                "INSERT INTO space_reservations (task_id, device, bytes, created_at) VALUES (?, ?, ?, ?)",
+                [(task_id, device, size, now) for device, (_, size) in volumes.items()]
+            )
+        return None
+
+    def record_written(self, task_id: str, path: str, written: int):
+        """Shrink the task's reservation on the volume of `path` by the bytes it has written there"""
+        device = os.stat(_existing_parent(path)).st_dev
+        self.db.conn().execute(
+            "UPDATE space_reservations SET written = ? WHERE task_id = ? AND device = ?",
+            (max(0, int(written)), task_id, device)
+        )
+
+    def release(self, task_id: str):
+        """Drop the task's reservations (the finished file now occupies real space)"""
+        self.db.conn().execute("DELETE FROM space_reservations WHERE task_id = ?", (task_id,))
+
+    def release_stale(self, active_task_ids: Iterable[str]) -> int:
+        """Drop reservations of tasks that are no longer queued or running"""
+        active = list(active_task_ids)
+        cur = self.db.conn().execute(
+            f"DELETE FROM space_reservations WHERE task_id NOT IN ({','.join('?' * len(active))})",
+            active
+        )
+        if cur.rowcount:
+            logging.info(f"Released {cur.rowcount} stale disk space reservation(s)")
+        return cur.rowcount
+
+
+# Module-level singleton
+space_reservations = SpaceReservations()
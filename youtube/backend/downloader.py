@@ -9,29 +9,29 @@ import os
 import sys
 import subprocess
 import tempfile
-import time
-import csv
 import re
+import signal
 import logging
+import threading
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 
 # Import browser cookie manager
 from browser_manager import BrowserCookieManager
+from format_planner import FormatPlan, FormatLimits, plan_video_formats, plan_selected_format, container_selector
+from format_cache import format_cache
+from tool_registry import tool_registry
+from log_setup import configure_logging, set_log_context
+from failed_ledger import failed_ledger
+from url_canonicalizer import canonical_url, extract_video_id
+from inflight import inflight_registry
+from media_store import media_store, media_key, link_or_copy
+from staging import work_dir, publish, remove_work_dir, remove_task_dir, scratch_root
+from disk_space import space_reservations, InsufficientSpace
 
-# Configure logging
-project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-log_file = os.path.join(project_dir, "backend", "logging", "downloader.log")
-os.makedirs(os.path.dirname(log_file), exist_ok=True)
-
-logging.basicConfig(
-    filename=log_file,
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    force=True
-)
+# Configure logging (queue-based, rotating, JSON lines)
+configure_logging()
 
 # Create module-level singleton for browser cookie manager
 # This ensures browser detection only happens once
@@ -45,152 +45,541 @@ class DownloadStatus:
     current_file: int = 0
     progress: float = 0.0
     current_file_progress: float = 0.0
-    status: str = "pending"  # pending, downloading, complete, error
+    status: str = "pending"  # pending, downloading, paused, cancelled, complete, error
     message: str = ""
     current_file_message: str = ""
     failed_urls: List[str] = field(default_factory=list)
+    format_plan: Optional[Dict] = None
+    shared_urls: List[str] = field(default_factory=list)  # received from a concurrent task
+    cached_urls: List[str] = field(default_factory=list)  # linked from the media store
+    resume_index: int = 0  # first URL not finished when the task was paused
+    files: List[str] = field(default_factory=list)  # output files of this task (served by /api/tasks/{id}/files)
+    saved_bytes: int = 0  # expected download volume avoided by the quality/size caps
 
-def check_ytdlp() -> bool:
-    """Check if yt-dlp is available"""
-    try:
-        result = subprocess.run(
-            [sys.executable, "-m", "yt_dlp", "--version"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        return result.returncode == 0
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return False
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.avi')
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.opus', '.ogg', '.flac')
 
-def check_ffmpeg() -> bool:
-    """Check if ffmpeg is available"""
-    try:
-        result = subprocess.run(
-            ["ffmpeg", "-version"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        return result.returncode == 0
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return False
+# Audio formats ffmpeg produces locally: encoder, default quality arguments and the
+# size per second of playback at that quality (upper bound, for the disk space check)
+AUDIO_CODECS = {
+    "mp3": ("libmp3lame", ["-q:a", "0"], 320000 // 8),  # same quality as yt-dlp's --audio-quality 0
+    "m4a": ("aac", ["-b:a", "256k"], 256000 // 8),
+    "opus": ("libopus", ["-b:a", "160k"], 160000 // 8),
+    "flac": ("flac", [], 44100 * 2 * 2),
+    "wav": ("pcm_s16le", [], 44100 * 2 * 2),
+}
+LOSSLESS_AUDIO = ("flac", "wav")
+COVER_ART_AUDIO = ("mp3", "m4a", "flac")  # formats that take the thumbnail as an attached picture
+THUMBNAIL_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+AUDIO_TARGET_RE = re.compile(r"^([a-z0-9]+)(?::(\d+)k?)?$")
 
-def check_available_formats(url: str) -> str:
-    """Check available formats for a URL"""
-    try:
-        result = subprocess.run(
-            [sys.executable, "-m", "yt_dlp", "--list-formats", url],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        if result.returncode == 0:
-            return result.stdout
+@dataclass(frozen=True)
+class AudioTarget:
+    """One output of a local audio conversion, written as "format" or "format:bitrate" (mp3:192k)"""
+    format: str
+    bitrate: Optional[int] = None  # kbit/s, None: default quality of the encoder
+    
+    @property
+    def spec(self) -> str:
+        return f"{self.format}:{self.bitrate}k" if self.bitrate else self.format
+    
+    def encoder_args(self) -> List[str]:
+        encoder, quality, _ = AUDIO_CODECS[self.format]
+        if self.bitrate:
+            quality = ["-b:a", f"{self.bitrate}k"]
+        return ["-c:a", encoder] + quality
+    
+    def bytes_per_second(self) -> int:
+        return self.bitrate * 1000 // 8 if self.bitrate else AUDIO_CODECS[self.format][2]
+
+def parse_audio_targets(specs: List[str]) -> List[AudioTarget]:
+    """Targets from their spec strings, duplicates removed (ValueError with a user message)"""
+    targets = []
+    for spec in specs:
+        match = AUDIO_TARGET_RE.match(str(spec).strip().lower())
+        if not match or match.group(1) not in AUDIO_CODECS:
+            raise ValueError(f"Unbekanntes Audioziel '{spec}'. Formate: {', '.join(AUDIO_CODECS)}")
+        format, bitrate = match.group(1), match.group(2)
+        bitrate = int(bitrate) if bitrate else None
+        if bitrate is not None and format in LOSSLESS_AUDIO:
+            raise ValueError(f"'{spec}': {format} ist verlustfrei und hat keine Bitrate")
+        if bitrate is not None and not 32 <= bitrate <= (320 if format == "mp3" else 512):
+            raise ValueError(f"'{spec}': Bitrate außerhalb des erlaubten Bereichs")
+        target = AudioTarget(format, bitrate)
+        if target not in targets:
+            targets.append(target)
+    if not targets:
+        raise ValueError("Mindestens ein Audioziel angeben")
+    return targets
+
+def audio_target_paths(base: str, targets: List[AudioTarget]) -> List[tuple]:
+    """(target, path) per target; the bitrate goes into the name where a format occurs more than once"""
+    formats = [target.format for target in targets]
+    paths = []
+    for target in targets:
+        if formats.count(target.format) > 1 and target.bitrate:
+            paths.append((target, f"{base} [{target.bitrate}k].{target.format}"))
         else:
-            raise Exception(result.stderr)
-    except subprocess.TimeoutExpired:
-        raise Exception("Timeout while checking formats")
-    except Exception as e:
-        raise Exception(f"Error checking formats: {str(e)}")
+            paths.append((target, f"{base}.{target.format}"))
+    return paths
+
+def check_ytdlp() -> bool:
+    """Check if yt-dlp is available (cached in the tool registry)"""
+    return tool_registry.is_available("yt_dlp")
+
+def check_ffmpeg() -> bool:
+    """Check if ffmpeg is available (cached in the tool registry)"""
+    return tool_registry.is_available("ffmpeg")
 
 def clean_url(url: str) -> str:
-    """Remove timeskip parameters from YouTube URL"""
+    """Canonicalize YouTube video URLs (drops t=, list=, index=, si=, ...)"""
+    canonical = canonical_url(url)
+    if canonical != url:
+        return canonical
+    # Not a recognized video URL: only remove timeskip parameters
     return re.sub(r'[&?]t=\d+[smh]?', '', url)
 
-class FailedDownloadLogger:
-    """Log failed downloads to CSV"""
-    
-    def __init__(self):
-        self.csv_file = os.path.join(
-            project_dir, "backend", "logging", "failed_downloads.csv"
-        )
-        self._ensure_csv_exists()
-    
-    def _ensure_csv_exists(self):
-        """Create CSV file with headers if it doesn't exist"""
-        os.makedirs(os.path.dirname(self.csv_file), exist_ok=True)
-        
-        if not os.path.exists(self.csv_file):
-            with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['URL', 'Type', 'Timestamp', 'Error'])
-            logging.info("Created failed downloads CSV file")
-    
-    def add_session_separator(self):
-        """Add a session separator to the CSV"""
-        try:
-            with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['---', '---', '---', '---'])
-            logging.info("Added session separator to CSV")
-        except Exception as e:
-            logging.error(f"Error adding session separator: {e}")
-    
-    def log_failed_download(self, url: str, download_type: str, error: str = ""):
-        """Log a failed download"""
-        try:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([url, download_type, timestamp, error[:500]])
-            logging.info(f"Logged failed {download_type} download: {url}")
-        except Exception as e:
-            logging.error(f"Error writing to CSV: {e}")
+def _time_text(seconds: float) -> str:
+    """1m05s, 1h02m05s, 12m30.5s (file-name safe, no colons)"""
+    minutes, sec = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    sec_text = f"{int(sec):02d}" if sec == int(sec) else f"{sec:04.1f}"
+    return f"{hours}h{minutes:02d}m{sec_text}s" if hours else f"{minutes}m{sec_text}s"
+
+def section_label(start: float, end: Optional[float]) -> str:
+    """File name part of an excerpt, e.g. 1m30s-2m00s"""
+    return f"{_time_text(start)}-{_time_text(end) if end is not None else 'end'}"
+
+def section_spec(start: float, end: Optional[float]) -> str:
+    """yt-dlp --download-sections value (open end: until the end of the video)"""
+    return f"*{start:g}-{end:g}" if end is not None else f"*{start:g}-inf"
+
+def start_process(cmd: List[str], cwd: str) -> subprocess.Popen:
+    """Start yt-dlp in its own process group, so its ffmpeg children can be stopped with it"""
+    if os.name == "nt":
+        group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group = {"start_new_session": True}
+    return subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        universal_newlines=True,
+        cwd=cwd,
+        **group
+    )
+
+def terminate_process_tree(process: subprocess.Popen, timeout: float = 10.0):
+    """Interrupt a process group like Ctrl+C (yt-dlp keeps its .part files), kill it if it hangs"""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(process.pid, signal.SIGINT)
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logging.warning(f"Process {process.pid} did not stop, killing it")
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, OSError):
+        pass  # already gone
 
 class BaseDownloader:
     """Base class for video and audio downloaders"""
     
-    def __init__(self, urls: List[str], format_type: str, output_path: str, status: DownloadStatus):
+    kind = ""  # video, audio
+    output_extensions = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS  # files moved into the output folder
+    transcode_timeout = 1800  # seconds per local ffmpeg conversion
+    
+    def __init__(self, urls: List[str], format_type: str, output_path: str, status: DownloadStatus,
+                 sections: Optional[Dict[str, Tuple[float, Optional[float]]]] = None, precise_cuts: bool = False):
         self.urls = [clean_url(url) for url in urls]
         self.format_type = format_type
         self.output_path = output_path
+        self.work_dir = output_path  # scratch directory of the current URL
         self.status = status
-        self.failed_logger = FailedDownloadLogger()
         self.cache_dir = os.path.join(tempfile.gettempdir(), "yt-dlp-cache")
         os.makedirs(self.cache_dir, exist_ok=True)
+        self.stop_event = threading.Event()
+        self.stop_action: Optional[str] = None  # cancel, pause, wait (not enough disk space yet)
+        self._process: Optional[subprocess.Popen] = None
+        self._reserved_dir: Optional[str] = None  # scratch directory of the current reservation
+        self.sections = sections or {}  # video ID (or URL) -> (start, end) excerpt in seconds
+        self.precise_cuts = precise_cuts  # re-encode at the cut points instead of cutting at keyframes
+    
+    def request_stop(self, action: str):
+        """Cancel or pause from another thread: the running yt-dlp is interrupted at once"""
+        if self.stop_event.is_set():
+            return
+        logging.info(f"Task {self.status.task_id}: {action} requested")
+        self.stop_action = action
+        self.stop_event.set()
+        process = self._process
+        if process is not None:
+            terminate_process_tree(process)
+    
+    def _run_process(self, cmd: List[str]) -> subprocess.Popen:
+        """Start yt-dlp in the scratch directory (stoppable via request_stop)"""
+        self._process = start_process(cmd, self.work_dir)
+        if self.stop_event.is_set():  # stop requested while starting
+            terminate_process_tree(self._process)
+        return self._process
         
     def download_all(self):
         """Download all URLs with retry logic"""
-        self.failed_logger.add_session_separator()
+        set_log_context(task_id=self.status.task_id)
         self.status.status = "downloading"
         max_retries = 10
+        stopped = False
         
         for idx, url in enumerate(self.urls):
+            if idx < self.status.resume_index:
+                continue  # finished before the task was paused
+            if self.stop_event.is_set():
+                self.status.resume_index = idx
+                stopped = True
+                break
             self.status.current_file = idx + 1
             self.status.progress = (idx / len(self.urls)) * 100
             self.status.message = f"Downloading {idx + 1} of {len(self.urls)}..."
             self.status.current_file_progress = 0.0
             self.status.current_file_message = ""
+            set_log_context(url=url)
+            
+            # Already in the media store: no download at all
+            store_key = self._store_key(url)
+            if store_key and self._materialize_from_store(url, store_key):
+                self.status.progress = ((idx + 1) / len(self.urls)) * 100
+                continue
+            self._prepare(url)
+            
+            # Another task may already be downloading the same file
+            key = self._inflight_key(url)
+            if key and self._receive_shared(url, key):
+                self.status.progress = ((idx + 1) / len(self.urls)) * 100
+                continue
             
+            # yt-dlp works in a local scratch directory; finished files are moved out atomically
+            self.work_dir = work_dir(self.status.task_id, idx)
+            new_files = []
             success = False
-            for attempt in range(1, max_retries + 1):
+            try:
+                shortfall = self._reserve_space(url)
+                if shortfall and not self.stop_event.is_set():
+                    # Hand the worker slot to other tasks; the task is queued again (see _finish_stopped)
+                    self.stop_action = "wait"
+                    self.status.current_file_message = shortfall
+                    self.stop_event.set()
+                for attempt in range(1, max_retries + 1):
+                    if self.stop_event.is_set():
+                        stopped = True
+                        break
+                    try:
+                        self._download_single(url, idx, attempt, max_retries)
+                        if not self.stop_event.is_set():
+                            self._postprocess(url)
+                        if self.stop_event.is_set():
+                            # Interrupted output may look finished (e.g. a half-merged file)
+                            stopped = True
+                            break
+                        new_files = publish(self.work_dir, self.output_path, self.output_extensions)
+                        self.status.files.extend(new_files)
+                        self.status.saved_bytes += self._saved_bytes(url)
+                        success = True
+                        break
+                    except Exception as e:
+                        if self.stop_event.is_set():
+                            logging.info(f"Download of {url} stopped ({self.stop_action})")
+                            stopped = True
+                            break
+                        if attempt < max_retries:
+                            logging.warning(f"Attempt {attempt} failed: {str(e)}")
+                            self.stop_event.wait(2)
+                        else:
+                            logging.error(f"All attempts failed for {url}: {str(e)}")
+                            self.status.failed_urls.append(url)
+                            failed_ledger.append(
+                                self.status.task_id,
+                                url,
+                                self.kind,
+                                self.format_type,
+                                str(e)
+                            )
+            except InsufficientSpace as e:
+                logging.error(f"{url} skipped: {e}")
+                self.status.failed_urls.append(url)
+                failed_ledger.append(self.status.task_id, url, self.kind, self.format_type, str(e))
+            finally:
+                self._process = None
+                self._reserved_dir = None
+                space_reservations.release(self.status.task_id)
+                if not (stopped and self.stop_action in ("pause", "wait")):
+                    remove_work_dir(self.work_dir)  # a paused URL keeps its .part files
+                if key and success and url not in self.status.failed_urls:
+                    inflight_registry.complete(key, self.status.task_id, new_files)
+                elif key:
+                    inflight_registry.release(key, self.status.task_id)
+            
+            if store_key and new_files and url not in self.status.failed_urls:
                 try:
-                    logging.info(f"Attempt {attempt}/{max_retries} for {url}")
-                    self._download_single(url, idx, attempt, max_retries)
-                    success = True
-                    break
-                except Exception as e:
-                    if attempt < max_retries:
-                        logging.warning(f"Attempt {attempt} failed: {str(e)}")
-                        time.sleep(2)
-                    else:
-                        logging.error(f"All attempts failed for {url}: {str(e)}")
-                        self.status.failed_urls.append(url)
-                        self.failed_logger.log_failed_download(
-                            url, 
-                            self.__class__.__name__, 
-                            str(e)
-                        )
+                    media_store.ingest(store_key, new_files)
+                except OSError as e:
+                    logging.warning(f"Could not add {url} to the media store: {e}")
             
+            if stopped:
+                self.status.resume_index = idx
+                break
             if success:
                 self.status.progress = ((idx + 1) / len(self.urls)) * 100
         
+        failed_ledger.flush()
+        if stopped:
+            self._finish_stopped()
+            return
         self.status.status = "complete"
         self.status.progress = 100
         self.status.message = f"Completed! Failed: {len(self.status.failed_urls)}"
+        if self.status.shared_urls:
+            self.status.message += f", shared: {len(self.status.shared_urls)}"
+        if self.status.cached_urls:
+            self.status.message += f", from cache: {len(self.status.cached_urls)}"
+        if self.status.saved_bytes:
+            self.status.message += f", saved by caps: {self.status.saved_bytes / (1024 * 1024):.0f} MB"
+        set_log_context(url=None)
         logging.info(f"Download batch complete. Failed: {len(self.status.failed_urls)}")
     
+    def _finish_stopped(self):
+        """Final status of a paused or cancelled task"""
+        done = self.status.resume_index
+        if self.stop_action == "wait":
+            # The worker requeues the task; current_file_message keeps the shortfall
+            self.status.status = "waiting"
+            self.status.message = f"Waiting for disk space after {done} of {len(self.urls)} files"
+            set_log_context(url=None)
+            logging.info(f"Download batch waiting for disk space after {done} of {len(self.urls)} files")
+            return
+        if self.stop_action == "pause":
+            self.status.status = "paused"
+            self.status.message = f"Paused after {done} of {len(self.urls)} files"
+        else:
+            self.status.status = "cancelled"
+            self.status.message = f"Cancelled after {done} of {len(self.urls)} files"
+            remove_task_dir(self.status.task_id)
+        self.status.current_file_message = ""
+        set_log_context(url=None)
+        logging.info(f"Download batch {self.status.status} after {done} of {len(self.urls)} files")
+    
+    def _prepare(self, url: str):
+        """Per-URL preparation before the first attempt (optional override)"""
+        pass
+    
+    def _postprocess(self, url: str):
+        """Work on the finished download in the scratch directory before it is published (optional override)"""
+        pass
+    
+    def _saved_bytes(self, url: str) -> int:
+        """Download volume avoided for a published URL (optional override)"""
+        return 0
+    
+    def _transcode_audio(self, url: str, source: str, base: str, targets: List[AudioTarget],
+                         thumbnail: Optional[str] = None) -> bool:
+        """Encode all targets in one ffmpeg run: the source is decoded once and feeds every encoder.
+        The thumbnail (if any) is embedded as cover art where the format supports it.
+        On failure no output is kept and the URL is recorded as failed (not retried)."""
+        outputs = audio_target_paths(base, targets)
+        specs = ", ".join(target.spec for target in targets)
+        self.status.current_file_message = f"Converting audio to {specs}..."
+        
+        ffmpeg = tool_registry.get("ffmpeg")
+        if not ffmpeg.available:
+            error = "Audio-Konvertierung nicht möglich: ffmpeg nicht gefunden"
+        else:
+            cmd = [ffmpeg.path, "-y", "-v", "error", "-nostdin", "-i", source]
+            if thumbnail:
+                cmd += ["-i", thumbnail]
+            for target, path in outputs:
+                cmd += ["-map", "0:a:0", "-map_metadata", "0"] + target.encoder_args()
+                if thumbnail and target.format in COVER_ART_AUDIO:
+                    cmd += ["-map", "1:v:0", "-c:v", "copy", "-disposition:v:0", "attached_pic"]
+                cmd.append(path)
+            logging.debug("Command: %s (cwd: %s)", cmd, self.work_dir)
+            process = self._run_process(cmd)
+            try:
+                output, _ = process.communicate(timeout=self.transcode_timeout)
+            except subprocess.TimeoutExpired:
+                logging.warning(f"ffmpeg conversion of {url} timed out after {self.transcode_timeout} s")
+                terminate_process_tree(process)
+                process.communicate()
+                output = f"Zeitlimit von {self.transcode_timeout // 60} Minuten überschritten"
+            if process.returncode == 0 and all(os.path.exists(path) for _, path in outputs):
+                logging.info(f"✓ Audio converted locally in one pass: {specs}")
+                return True
+            error = f"Audio-Konvertierung fehlgeschlagen: {(output or '').strip()[-500:]}"
+        
+        for _, path in outputs:
+            if os.path.exists(path):
+                os.remove(path)  # never publish a partial file
+        if not self.stop_event.is_set():
+            logging.error(f"✗ {url}: {error}")
+            self.status.failed_urls.append(url)
+            failed_ledger.append(self.status.task_id, url, self.kind, specs, error)
+        return False
+    
+    def _estimate_sizes(self) -> Optional[tuple]:
+        """(output bytes, scratch bytes) of the current URL, None if unknown (optional override)"""
+        return None
+    
+    def _section(self, url: str) -> Optional[Tuple[float, Optional[float]]]:
+        """Requested excerpt of a URL (None: whole video)"""
+        section = self.sections.get(extract_video_id(url) or url)
+        return tuple(section) if section else None
+    
+    def _section_args(self, url: str) -> List[str]:
+        """yt-dlp arguments that fetch only the excerpt; the cut is stream-copied at
+        keyframes unless precise cuts are requested (which re-encodes around the cut points)"""
+        section = self._section(url)
+        if not section:
+            return []
+        args = ["--download-sections", section_spec(*section)]
+        if self.precise_cuts:
+            args.append("--force-keyframes-at-cuts")
+        return args
+    
+    def _title_template(self, url: str) -> str:
+        """Output name template without extension; excerpts carry their time range"""
+        section = self._section(url)
+        return f"%(title)s [{section_label(*section)}]" if section else "%(title)s"
+    
+    def _section_key(self, url: str) -> str:
+        """Key suffix separating excerpts from whole downloads (store and in-flight keys)"""
+        section = self._section(url)
+        if not section:
+            return ""
+        return f"@{section_spec(*section)}" + ("!" if self.precise_cuts else "")
+    
+    def _section_fraction(self, url: str) -> float:
+        """Share of the video covered by the excerpt (1.0 if unknown)"""
+        section = self._section(url)
+        info = getattr(self, "info", None)
+        if not section or not info or not info.duration:
+            return 1.0
+        start, end = section
+        length = min(end if end is not None else info.duration, info.duration) - start
+        return min(1.0, max(0.0, length / info.duration))
+    
+    def _reserve_space(self, url: str) -> Optional[str]:
+        """Reserve the estimated size on the output and scratch volumes; returns the shortfall if it does not fit yet"""
+        output_bytes, scratch_bytes = self._estimate_sizes() or (0, 0)
+        fraction = self._section_fraction(url)
+        output_bytes, scratch_bytes = int(output_bytes * fraction), int(scratch_bytes * fraction)
+        needs = {self.output_path: output_bytes, scratch_root(): scratch_bytes}
+        shortfall = space_reservations.try_reserve(self.status.task_id, needs)
+        if shortfall:
+            logging.warning(f"{url} held: {shortfall}")
+        else:
+            self._reserved_dir = self.work_dir
+        return shortfall
+    
+    def record_written(self):
+        """Report the bytes written to the scratch directory so far; they stop counting as reserved"""
+        path = self._reserved_dir
+        if not path:
+            return
+        written = 0
+        try:
+            for entry in os.scandir(path):
+                if entry.is_file():
+                    written += entry.stat().st_size
+        except OSError:
+            return  # removed in the meantime
+        space_reservations.record_written(self.status.task_id, path, written)
+    
+    def _inflight_format(self) -> str:
+        """Format part of the in-flight key (override if the format is planned per URL)"""
+        return self.kind
+    
+    def _store_variant(self, video_id: str) -> str:
+        """Variant part of the media store key (override for explicit format choices)"""
+        return "best"
+    
+    def _store_key(self, url: str) -> Optional[str]:
+        """Media store key of a URL (None: store disabled or not a video URL)"""
+        video_id = extract_video_id(url)
+        if not video_id or not media_store.enabled:
+            return None
+        return media_key(video_id, self.kind, self.format_type, self._store_variant(video_id) + self._section_key(url))
+    
+    def _materialize_from_store(self, url: str, store_key: str) -> bool:
+        """Link a stored copy into the output folder"""
+        try:
+            files = media_store.materialize(store_key, self.output_path)
+        except OSError as e:
+            logging.warning(f"Media store lookup failed for {url}: {e}")
+            return False
+        if files is None:
+            return False
+        self.status.files.extend(files)
+        self.status.cached_urls.append(url)
+        self.status.current_file_progress = 100.0
+        self.status.current_file_message = "From media store"
+        logging.info(f"✓ Linked {len(files)} file(s) from the media store")
+        return True
+    
+    def _inflight_key(self, url: str) -> Optional[str]:
+        """Key identifying identical downloads across tasks (None: not coalesced)"""
+        video_id = extract_video_id(url)
+        if not video_id:
+            return None
+        return inflight_registry.make_key(video_id, self._inflight_format() + self._section_key(url), self.format_type)
+    
+    def _receive_shared(self, url: str, key: str) -> bool:
+        """Claim the download or wait for the task already running it and take over its files.
+        Returns False if this task has to download the URL itself."""
+        def on_progress(percent: float):
+            self.status.current_file_progress = percent
+            self.status.current_file_message = f"Shared download: {percent:.1f}% (task {owner_task[:8]})"
+        
+        while True:
+            owner_task = inflight_registry.claim(
+                key, self.status.task_id, lambda: self.status.current_file_progress
+            )
+            if owner_task is None:
+                return False
+            logging.info(f"{url} is already being downloaded by task {owner_task}, waiting")
+            files = inflight_registry.wait(key, owner_task, on_progress, stop_event=self.stop_event)
+            if files is not None:
+                break
+            if self.stop_event.is_set():
+                return False
+            # The other download failed or stalled: claim it (or wait for the next owner)
+        
+        try:
+            for path in files:
+                self.status.files.append(self._deliver_shared_file(path))
+        except OSError as e:
+            logging.warning(f"Could not take over shared files for {url}: {e}")
+            return False
+        
+        self.status.shared_urls.append(url)
+        self.status.current_file_progress = 100.0
+        self.status.current_file_message = f"Shared with task {owner_task[:8]}"
+        logging.info(f"✓ Received {len(files)} shared file(s) from task {owner_task}")
+        return True
+    
+    def _deliver_shared_file(self, path: str) -> str:
+        """Hardlink (or copy, across file systems) a finished file into the output folder"""
+        os.makedirs(self.output_path, exist_ok=True)
+        dest = os.path.join(self.output_path, os.path.basename(path))
+        if not os.path.exists(dest):  # else: same output folder or already present
+            link_or_copy(path, dest)
+        return dest
+    
     def _download_single(self, url: str, idx: int, attempt: int, max_retries: int):
         """Override in subclass"""
         raise NotImplementedError
@@ -198,19 +587,89 @@ class BaseDownloader:
 class VideoDownloader(BaseDownloader):
     """Download videos from YouTube"""
     
-    def _get_format_string(self) -> str:
-        """Get format string based on whether ffmpeg is available"""
-        if check_ffmpeg():
-            # With ffmpeg: explicitly select video+audio streams and merge
-            # Never fallback to audio-only formats
-            return "bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/bestvideo[ext=mp4]+bestaudio"
+    kind = "video"
+    output_extensions = VIDEO_EXTENSIONS
+    
+    def __init__(self, urls: List[str], format_type: str, output_path: str, status: DownloadStatus,
+                 format_ids: Optional[Dict[str, str]] = None, limits: Optional[FormatLimits] = None,
+                 sections: Optional[Dict[str, Tuple[float, Optional[float]]]] = None, precise_cuts: bool = False):
+        super().__init__(urls, format_type, output_path, status, sections, precise_cuts)
+        self.format_ids = format_ids or {}  # video ID -> format ID chosen via /api/formats
+        self.limits = limits or FormatLimits()  # caps on resolution, fps, bitrate, size (ignored for chosen IDs)
+        self.plan: Optional[FormatPlan] = None
+        self.info = None
+        self.info_json_path: Optional[str] = None
+    
+    def _prepare(self, url: str):
+        """Plan a stream-copy merge for this URL (extraction is cached per video ID)"""
+        self.plan = None
+        self.info = None
+        self.info_json_path = None
+        self.status.format_plan = None
+        
+        try:
+            info = format_cache.fetch(url, _cookie_manager.get_download_args(1)["extra"])
+        except Exception as e:
+            logging.warning(f"Format planning skipped for {url}: {e}")
+            return
+        self.info = info
+        
+        chosen = self.format_ids.get(info.video_id)
+        if chosen:
+            self.plan = plan_selected_format(info.formats, chosen, self.format_type, check_ffmpeg())
         else:
-            # Without ffmpeg: get best pre-merged format with video codec
-            return "best[vcodec!=none][ext=mp4]/best[vcodec!=none]"
+            self.plan = plan_video_formats(info.formats, self.format_type, check_ffmpeg(), self.limits)
+        if self.plan is None:
+            logging.info(f"No format plan for {url}, using codec-aware selector")
+            return
+        
+        # The first attempt loads the cached info instead of extracting again
+        self.info_json_path = info.info_json_path
+        
+        self.status.format_plan = self.plan.to_dict()
+        self.status.current_file_message = self.plan.describe()
+        if self.plan.stream_copy:
+            logging.info(f"Format plan for {url}: {self.plan.describe()}")
+        else:
+            logging.warning(f"Format plan for {url} needs transcoding: {self.plan.describe()}")
+    
+    def _estimate_sizes(self) -> Optional[tuple]:
+        """Planned streams; the scratch directory holds them plus the merged file"""
+        if not self.plan or not self.info:
+            return None
+        format_ids = self.plan.format_id.split("+")
+        sizes = [row.get("estimated_size") for row in self.info.formats if row["format_id"] in format_ids]
+        if not sizes or None in sizes:
+            return None
+        return sum(sizes), 2 * sum(sizes)
+    
+    def _store_variant(self, video_id: str) -> str:
+        """Explicitly chosen formats and capped downloads are stored separately"""
+        if video_id in self.format_ids:
+            return self.format_ids[video_id]
+        return f"best[{self.limits.key()}]" if self.limits.active else "best"
+    
+    def _inflight_format(self) -> str:
+        """Downloads are shared only if the same streams were planned"""
+        if self.plan:
+            return f"video:{self.plan.format_id}"
+        return f"video[{self.limits.key()}]" if self.limits.active else "video"
+    
+    def _saved_bytes(self, url: str) -> int:
+        """Volume the caps saved for this download, scaled to the excerpt"""
+        if not self.plan or not self.plan.saved_bytes:
+            return 0
+        return int(self.plan.saved_bytes * self._section_fraction(url))
+    
+    def _get_format_string(self) -> str:
+        """Get format string from the plan, falling back to codec-aware selectors"""
+        if self.plan:
+            return self.plan.selector
+        return container_selector(self.format_type, check_ffmpeg())
     
     def _download_single(self, url: str, idx: int, attempt: int, max_retries: int):
         """Download a single video with adaptive strategy"""
-        output_template = "%(title)s.%(ext)s"
+        output_template = f"{self._title_template(url)}.%(ext)s"
         format_str = self._get_format_string()
         
         # Use module-level cookie manager (already initialized with cached browser)
@@ -230,7 +689,7 @@ class VideoDownloader(BaseDownloader):
             "--convert-thumbnails", "jpg",
             "--embed-metadata",
             "--no-post-overwrites",
-        ]
+        ] + self._section_args(url)
         
         # Add strategy-specific arguments
         cmd.extend(strategy["cookies"])
@@ -243,28 +702,25 @@ class VideoDownloader(BaseDownloader):
         if check_ffmpeg():
             cmd += [
                 "--merge-output-format", self.format_type,
-                "--format-sort", "res,fps,br"
+                "--format-sort", self.limits.format_sort() if self.limits.active else "res,fps,br"
             ]
         else:
             if self.format_type == "mkv":
                 cmd += ["--remux-video", "mkv"]
+            if self.limits.active:
+                cmd += ["--format-sort", self.limits.format_sort()]
         
-        cmd.append(url)
+        # First attempt reuses the info extracted for planning (no second extraction)
+        if attempt == 1 and self.info_json_path and os.path.exists(self.info_json_path):
+            cmd += ["--load-info-json", self.info_json_path]
+        else:
+            cmd.append(url)
+        plan_note = f"{self.plan.format_id}, " if self.plan else ""
         
-        # Debug logging
-        logging.debug(f"Command: {' '.join(cmd)}")
-        logging.debug(f"Working directory: {self.output_path}")
-        logging.debug(f"Output template: {output_template}")
+        # Debug logging (lazy: only formatted when DEBUG is enabled)
+        logging.debug("Command: %s (cwd: %s)", cmd, self.work_dir)
         
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True,
-            cwd=self.output_path
-        )
+        process = self._run_process(cmd)
         
         error_output = []
         has_download_error = False
@@ -298,18 +754,18 @@ class VideoDownloader(BaseDownloader):
                                 percent_str = part.replace("%", "")
                                 percent = float(percent_str)
                                 self.status.current_file_progress = percent
-                                self.status.current_file_message = f"Download: {percent:.1f}% ({strategy['description']})"
+                                self.status.current_file_message = f"Download: {percent:.1f}% ({plan_note}{strategy['description']})"
                                 break
                     except:
                         pass
         
         process.wait(timeout=1800)
         
-        # Check if a video file was actually created
-        output_dir = self.output_path
+        # Check if a video file was actually created (in the scratch directory)
+        output_dir = self.work_dir
         if os.path.isdir(output_dir):
             video_files = [f for f in os.listdir(output_dir) 
-                          if f.lower().endswith(('.mp4', '.mkv', '.webm', '.avi'))]
+                          if f.lower().endswith(VIDEO_EXTENSIONS)]
             if video_files:
                 if has_post_processing_error:
                     logging.warning(f"✓ Video downloaded (post-processing errors ignored)")
@@ -334,10 +790,72 @@ class VideoDownloader(BaseDownloader):
 class AudioDownloader(BaseDownloader):
     """Download audio from YouTube"""
     
+    kind = "audio"
+    output_extensions = AUDIO_EXTENSIONS
+    source_suffix = ".source"  # original stream of a multi-target job, removed after the conversion
+    
+    def __init__(self, urls: List[str], format_type: str, output_path: str, status: DownloadStatus,
+                 targets: Optional[List[AudioTarget]] = None,
+                 sections: Optional[Dict[str, Tuple[float, Optional[float]]]] = None, precise_cuts: bool = False):
+        super().__init__(urls, format_type, output_path, status, sections, precise_cuts)
+        self.targets = targets or []  # several outputs from one download; empty: yt-dlp converts to format_type
+        self.info = None
+        self.info_json_path: Optional[str] = None
+    
+    def _prepare(self, url: str):
+        """Fetch the (cached) info for the size estimate; the first attempt reuses it"""
+        self.info = None
+        self.info_json_path = None
+        try:
+            self.info = format_cache.fetch(url, _cookie_manager.get_download_args(1)["extra"])
+        except Exception as e:
+            logging.warning(f"Size estimate skipped for {url}: {e}")
+            return
+        self.info_json_path = self.info.info_json_path
+    
+    def _estimate_sizes(self) -> Optional[tuple]:
+        """Converted file(s) from the duration; the scratch directory also holds the source stream"""
+        if not self.info or not self.info.duration:
+            return None
+        targets = self.targets or [AudioTarget(self.format_type.lower())]
+        output = int(self.info.duration * sum(target.bytes_per_second() for target in targets))
+        sources = [row["estimated_size"] for row in self.info.formats
+                   if row.get("vcodec") == "none" and row.get("estimated_size")]
+        return output, output + max(sources, default=0)
+    
+    def _store_variant(self, video_id: str) -> str:
+        return "+".join(target.spec for target in self.targets) if self.targets else "best"
+    
+    def _inflight_format(self) -> str:
+        return "audio:" + "+".join(target.spec for target in self.targets) if self.targets else "audio"
+    
+    def _source_files(self) -> List[str]:
+        """Finished source streams in the scratch directory (no .part or .temp files)"""
+        if not os.path.isdir(self.work_dir):
+            return []
+        return sorted(f for f in os.listdir(self.work_dir)
+                      if os.path.splitext(os.path.splitext(f)[0])[1] == self.source_suffix
+                      and not f.lower().endswith(THUMBNAIL_EXTENSIONS))
+    
+    def _postprocess(self, url: str):
+        """Multi-target job: convert the downloaded source to every target, then drop the source"""
+        if not self.targets:
+            return
+        for name in self._source_files()[:1]:
+            source = os.path.join(self.work_dir, name)
+            base = os.path.splitext(os.path.splitext(source)[0])[0]
+            thumbnail = f"{base}{self.source_suffix}.jpg"  # written next to the source, see --write-thumbnail
+            self._transcode_audio(url, source, base, self.targets,
+                                  thumbnail if os.path.exists(thumbnail) else None)
+            if not self.stop_event.is_set():  # a paused job keeps its source for the resume
+                os.remove(source)
+                if os.path.exists(thumbnail):
+                    os.remove(thumbnail)
+    
     def _download_single(self, url: str, idx: int, attempt: int, max_retries: int):
         """Download a single audio file with adaptive strategy"""
-        output_template = "%(title)s.%(ext)s"
-        output_dir = self.output_path
+        output_template = f"{self._title_template(url)}.%(ext)s"
+        output_dir = self.work_dir
         
         # Get files before download
         files_before = set(os.listdir(output_dir)) if os.path.isdir(output_dir) else set()
@@ -348,18 +866,20 @@ class AudioDownloader(BaseDownloader):
         logging.info(f"Attempt {attempt}/{max_retries} - Strategy: {strategy['description']}")
         
         # Build base command
+        if self.targets:
+            # Keep the original stream, all targets are encoded from it afterwards
+            conversion = ["-o", f"{self._title_template(url)}{self.source_suffix}.%(ext)s"]
+        else:
+            conversion = ["-x", "--audio-format", self.format_type, "--audio-quality", "0", "-o", output_template]
         cmd = [
             sys.executable, "-m", "yt_dlp",
             "-f", "bestaudio/best",
-            "-x",
-            "--audio-format", self.format_type,
-            "--audio-quality", "0",
-            "-o", output_template,
+        ] + conversion + [
             "--no-playlist",
             "--newline",
             "--cache-dir", self.cache_dir,
             "--add-metadata",
-        ]
+        ] + self._section_args(url)
         
         # Add strategy-specific arguments
         cmd.extend(strategy["cookies"])
@@ -368,32 +888,30 @@ class AudioDownloader(BaseDownloader):
         cmd.extend(strategy["po_token"])
         cmd.extend(strategy["extra"])
         
-        # Add metadata/thumbnail for non-WAV formats
-        if self.format_type.lower() != "wav":
+        # Add metadata/thumbnail for non-WAV formats; the thumbnail of a multi-target job is
+        # kept as a file and embedded into the targets that support cover art
+        if self.format_type.lower() != "wav" or self.targets:
+            if self.targets:
+                cmd += ["--write-thumbnail", "--convert-thumbnails", "jpg"]
+            else:
+                cmd.append("--embed-thumbnail")
             cmd += [
-                "--embed-thumbnail",
                 "--parse-metadata", "%(channel,uploader)s:%(meta_artist)s",
                 "--parse-metadata", "%(title)s:%(meta_title)s",
                 "--parse-metadata", "%(upload_date>%Y)s:%(meta_date)s",
                 "--replace-in-metadata", "artist", r"^@", "",
             ]
         
-        cmd.append(url)
+        # First attempt reuses the info extracted for the size estimate
+        if attempt == 1 and self.info_json_path and os.path.exists(self.info_json_path):
+            cmd += ["--load-info-json", self.info_json_path]
+        else:
+            cmd.append(url)
         
-        # Debug logging
-        logging.debug(f"Command: {' '.join(cmd)}")
-        logging.debug(f"Working directory: {self.output_path}")
-        logging.debug(f"Output template: {output_template}")
+        # Debug logging (lazy: only formatted when DEBUG is enabled)
+        logging.debug("Command: %s (cwd: %s)", cmd, self.work_dir)
         
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True,
-            cwd=self.output_path
-        )
+        process = self._run_process(cmd)
         
         error_output = []
         last_destination = None
@@ -437,6 +955,10 @@ class AudioDownloader(BaseDownloader):
         
         process.wait(timeout=1800)
         
+        if self.targets and self._source_files():
+            logging.info(f"✓ Audio source downloaded successfully with strategy: {strategy['description']}")
+            return
+        
         # Check if download was successful
         files_after = set(os.listdir(output_dir)) if os.path.isdir(output_dir) else set()
         new_files = files_after - files_before
@@ -473,7 +995,7 @@ class AudioDownloader(BaseDownloader):
                         pass
         
         # Success if new audio file created OR destination exists (ignore post-processing errors)
-        if new_audio_files or dest_ok:
+        if (new_audio_files or dest_ok) and not self.targets:
             if has_post_processing_error:
                 logging.warning(f"✓ Audio downloaded (post-processing errors ignored)")
             else:
@@ -491,3 +1013,43 @@ class AudioDownloader(BaseDownloader):
         
         raise Exception(f"Download failed: {err}")
 
+
+class CombinedDownloader(VideoDownloader):
+    """Video plus audio file(s) per URL from a single download: the audio targets are
+    transcoded locally from the audio stream of the downloaded video"""
+    
+    kind = "combined"
+    output_extensions = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS
+    
+    def __init__(self, urls: List[str], format_type: str, output_path: str, status: DownloadStatus,
+                 format_ids: Optional[Dict[str, str]] = None, audio_targets: Optional[List[AudioTarget]] = None,
+                 limits: Optional[FormatLimits] = None,
+                 sections: Optional[Dict[str, Tuple[float, Optional[float]]]] = None, precise_cuts: bool = False):
+        super().__init__(urls, format_type, output_path, status, format_ids, limits, sections, precise_cuts)
+        self.audio_targets = audio_targets or [AudioTarget("mp3")]
+    
+    def _audio_specs(self) -> str:
+        return "+".join(target.spec for target in self.audio_targets)
+    
+    def _estimate_sizes(self) -> Optional[tuple]:
+        """Video estimate plus the converted audio files"""
+        sizes = super()._estimate_sizes()
+        if sizes is None or not self.info.duration:
+            return sizes
+        audio = int(self.info.duration * sum(target.bytes_per_second() for target in self.audio_targets))
+        return sizes[0] + audio, sizes[1] + audio
+    
+    def _store_variant(self, video_id: str) -> str:
+        return f"{super()._store_variant(video_id)}+{self._audio_specs()}"
+    
+    def _inflight_format(self) -> str:
+        return f"{super()._inflight_format()}+{self._audio_specs()}"
+    
+    def _postprocess(self, url: str):
+        """Transcode the first audio stream of the merged video; a failed conversion
+        keeps the video and records the URL as failed for the audio part"""
+        videos = sorted(f for f in os.listdir(self.work_dir) if f.lower().endswith(VIDEO_EXTENSIONS))
+        if not videos:
+            return
+        source = os.path.join(self.work_dir, videos[0])
+        self._transcode_audio(url, source, os.path.splitext(source)[0], self.audio_targets)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Failed Download Ledger
+Indexed SQLite store of failed downloads (queryable by task, error category
+and time) with batched appends
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Dict, List, Optional
+
+from db import SQLiteDatabase
+from settings import settings
+
+
+# (category, substrings in the error output); first match wins
+ERROR_CATEGORIES = [
+    ("bot_protection", ("Sign in to confirm you're not a bot", "Keine Browser-Cookies")),
+    ("unavailable", ("Video unavailable", "Private video", "This video has been removed",
+                     "members-only", "This live event will begin")),
+    ("age_restricted", ("Sign in to confirm your age", "age-restricted")),
+    ("geo_blocked", ("not available in your country", "geo restriction", "geo-restricted")),
+    ("format", ("Requested format is not available", "no video file found")),
+    ("network", ("timed out", "Timeout", "Connection reset", "HTTP Error 5", "HTTP Error 429",
+                 "Unable to download", "getaddrinfo failed", "Network is unreachable")),
+    ("disk_space", ("Nicht genug Speicherplatz", "No space left on device")),
+    ("postprocessing", ("Postprocessing", "ffmpeg", "ffprobe")),
+]
+
+
+def categorize_error(error: str) -> str:
+    """Map raw yt-dlp error output to a coarse category"""
+    lowered = error.lower()
+    for category, needles in ERROR_CATEGORIES:
+        if any(needle.lower() in lowered for needle in needles):
+            return category
+    return "unknown"
+
+
+class FailedDownloadLedger:
+    """Ledger of failed downloads; appends are buffered and written in batches"""
+
+    def __init__(self, db_path: Optional[str] = None, batch_size: int = 50):
+        self.db = SQLiteDatabase(db_path or os.path.join(settings.data_dir, "failed_downloads.db"))
+        self.batch_size = batch_size
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self.db.conn().executescript("""
+            CREATE TABLE IF NOT EXISTS failed_downloads (
+                id             INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id        TEXT,
+                url            TEXT NOT NULL,
+                download_type  TEXT NOT NULL,
+                format         TEXT,
+                error_category TEXT NOT NULL,
+                error          TEXT,
+                created_at     REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_failed_task ON failed_downloads (task_id);
+            CREATE INDEX IF NOT EXISTS idx_failed_category ON failed_downloads (error_category, created_at);
+            CREATE INDEX IF NOT EXISTS idx_failed_created ON failed_downloads (created_at);
+        """)
+
+    def append(self, task_id: Optional[str], url: str, download_type: str,
+               format: Optional[str], error: str = ""):
+        """Buffer a failed download; flushed when the batch is full or the task ends"""
+        row = (task_id, url, download_type, format, categorize_error(error), error[:2000], time.time())
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows in one transaction"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        try:
+            with self.db.transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO failed_downloads (task_id, url, download_type, format,"
+                    " error_category, error, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            logging.info(f"Logged {len(rows)} failed download(s)")
+        except Exception as e:
+            logging.error(f"Error writing failed downloads: {e}")
+            with self._lock:
+                self._buffer[:0] = rows  # keep them for the next flush
+
+    def _where(self, ids: Optional[List[int]] = None, task_id: Optional[str] = None,
+               category: Optional[str] = None, download_type: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None) -> tuple:
+        clauses, params = [], []
+        if ids:
+            clauses.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if task_id:
+            clauses.append("task_id = ?")
+            params.append(task_id)
+        if category:
+            clauses.append("error_category = ?")
+            params.append(category)
+        if download_type:
+            clauses.append("download_type = ?")
+            params.append(download_type)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def query(self, limit: int = 100, offset: int = 0, **filters) -> List[Dict]:
+        """Failed downloads matching the filters, newest first"""
+        self.flush()
+        where, params = self._where(**filters)
+        rows = self.db.conn().execute(
+            "SELECT id, task_id, url, download_type, format, error_category, error, created_at"
+            f" FROM failed_downloads{where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        keys = ("id", "task_id", "url", "download_type", "format", "error_category", "error", "created_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def categories(self) -> Dict[str, int]:
+        """Number of failed downloads per error category"""
+        self.flush()
+        rows = self.db.conn().execute(
+            "SELECT error_category, COUNT(*) FROM failed_downloads GROUP BY error_category"
+        ).fetchall()
+        return dict(rows)
+
+    def urls(self, **filters) -> List[str]:
+        """Distinct URLs matching the filters, in failure order"""
+        self.flush()
+        where, params = self._where(**filters)
+        rows = self.db.conn().execute(
+            f"SELECT url, MIN(created_at) AS first FROM failed_downloads{where}"
+            " GROUP BY url ORDER BY first",
+            params
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+# Module-level singleton: one ledger (and one write buffer) per process
+failed_ledger = FailedDownloadLedger()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Delivery
+Serves finished downloads over HTTP: single files with Range support (zero-copy
+where the ASGI server offers it) and task folders as a ZIP stream that is built
+while it is sent, without a temporary archive
+"""
+
+import os
+import re
+import time
+import zipfile
+import mimetypes
+from typing import Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+
+CHUNK_SIZE = 1024 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """Range header outside the file"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(start, end inclusive) of a single-range header; None means the whole file.
+    Multi-range and malformed headers are ignored (whole file), as RFC 9110 allows."""
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(0) == "bytes=-":
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or (last and int(last) < start):
+            raise RangeNotSatisfiable()
+    else:
+        suffix = int(last)  # last N bytes
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        start, end = max(0, size - suffix), size - 1
+    return start, end
+
+
+def content_disposition(filename: str, attachment: bool = True) -> str:
+    """Header value with an ASCII fallback and the UTF-8 name (RFC 6266)"""
+    fallback = filename.encode("ascii", "replace").decode().replace('"', "_")
+    kind = "attachment" if attachment else "inline"
+    return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+class RangeFileResponse(Response):
+    """File response honouring a Range header. Uses the ASGI zerocopysend extension
+    (the server sends the file with sendfile) when available, else reads in 1 MiB chunks."""
+
+    def __init__(self, path: str, range_header: Optional[str] = None, filename: Optional[str] = None):
+        self.path = path
+        stat = os.stat(path)
+        size = stat.st_size
+        filename = filename or os.path.basename(path)
+        headers = {
+            "accept-ranges": "bytes",
+            "content-disposition": content_disposition(filename),
+            "last-modified": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(stat.st_mtime)),
+            "etag": f'"{stat.st_mtime_ns:x}-{size:x}"',
+        }
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            byte_range = None
+            status_code = 416
+            headers["content-range"] = f"bytes */{size}"
+            self.offset, self.count = 0, 0
+        else:
+            if byte_range is None:
+                status_code = 200
+                self.offset, self.count = 0, size
+            else:
+                status_code = 206
+                self.offset, self.count = byte_range[0], byte_range[1] - byte_range[0] + 1
+                headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+        headers["content-length"] = str(self.count)
+        super().__init__(
+            status_code=status_code, headers=headers,
+            media_type=mimetypes.guess_type(path)[0] or "application/octet-stream"
+        )
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        f = await run_in_threadpool(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": f,
+                            "offset": self.offset, "count": self.count, "more_body": False})
+                return
+            await run_in_threadpool(f.seek, self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break  # file shrank while sending
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await run_in_threadpool(f.close)
+
+
+class _ZipSink:
+    """Write-only buffer for zipfile; without tell() zipfile writes a streamable archive
+    (sizes in data descriptors after each file)"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> List[bytes]:
+        """Pending output as (at most) one piece"""
+        if not self.parts:
+            return []
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return [data]
+
+
+def zip_stream(files: Iterable[str]) -> Iterator[bytes]:
+    """ZIP archive of the files (stored, media is already compressed), produced piece by piece"""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        names = set()
+        for path in files:
+            name = os.path.basename(path)
+            base, ext = os.path.splitext(name)
+            n = 1
+            while name in names:  # same title from different folders
+                name = f"{base} ({n}){ext}"
+                n += 1
+            names.add(name)
+
+            stat = os.stat(path)
+            info = zipfile.ZipInfo(name, date_time=time.localtime(max(stat.st_mtime, 315619200))[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = stat.st_size  # lets zipfile pick ZIP64 for files near or over 4 GiB
+            with open(path, "rb") as src, archive.open(info, "w") as dest:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield from sink.take()
+            yield from sink.take()  # data descriptor
+    yield from sink.take()  # central directory
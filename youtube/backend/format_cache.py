@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Format Cache
+Extracts video info once and caches the parsed format table per video ID;
+the info JSONs are written atomically and expire with their stream URLs
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import threading
+import subprocess
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from url_canonicalizer import extract_video_id
+
+
+def extract_info(url: str, extra_args: Optional[List[str]] = None) -> Dict:
+    """Extract video metadata (including all formats) without downloading"""
+    cmd = [
+        sys.executable, "-m", "yt_dlp",
+        "--dump-single-json",
+        "--no-playlist",
+        "--no-warnings",
+    ]
+    cmd.extend(extra_args or [])
+    cmd.append(url)
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except subprocess.TimeoutExpired:
+        raise Exception("Timeout while extracting video info")
+
+    if result.returncode != 0:
+        raise Exception(f"Error extracting video info: {result.stderr.strip()[-500:]}")
+    return json.loads(result.stdout)
+
+
+def _estimate_size(fmt: Dict, duration: Optional[float]) -> Optional[int]:
+    """Exact size if known, otherwise bitrate (kbit/s) x duration"""
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    if fmt.get("tbr") and duration:
+        return int(fmt["tbr"] * 1000 / 8 * duration)
+    return None
+
+
+def build_format_table(info: Dict) -> List[Dict]:
+    """Parse yt-dlp formats into structured rows (skips storyboards)"""
+    duration = info.get("duration")
+    rows = []
+    for fmt in info.get("formats") or []:
+        if fmt.get("format_note") == "storyboard" or fmt.get("ext") == "mhtml":
+            continue
+
+        vcodec = fmt.get("vcodec")
+        acodec = fmt.get("acodec")
+        if fmt.get("width") and fmt.get("height"):
+            resolution = f"{fmt['width']}x{fmt['height']}"
+        else:
+            resolution = fmt.get("resolution") or ("audio only" if vcodec == "none" else None)
+
+        rows.append({
+            "format_id": fmt.get("format_id"),
+            "ext": fmt.get("ext"),
+            "vcodec": vcodec,
+            "acodec": acodec,
+            "width": fmt.get("width"),
+            "height": fmt.get("height"),
+            "resolution": resolution,
+            "fps": fmt.get("fps"),
+            "tbr": fmt.get("tbr"),
+            "vbr": fmt.get("vbr"),
+            "abr": fmt.get("abr"),
+            "asr": fmt.get("asr"),
+            "protocol": fmt.get("protocol"),
+            "format_note": fmt.get("format_note"),
+            "filesize": fmt.get("filesize"),
+            "filesize_approx": fmt.get("filesize_approx"),
+            "estimated_size": _estimate_size(fmt, duration),
+        })
+    return rows
+
+
+@dataclass
+class CachedInfo:
+    """Parsed info for one video, plus the raw info JSON on disk"""
+    video_id: str
+    title: str
+    duration: Optional[float]
+    formats: List[Dict]
+    info_json_path: str
+    fetched_at: float = field(default_factory=time.time)
+
+
+class FormatCache:
+    """Thread-safe cache of extracted format tables keyed by video ID.
+    The index is per process; the info JSON files in the shared temp directory
+    let other processes on the host (production worker processes) reuse an extraction."""
+
+    def __init__(self, ttl: int = 1800, max_entries: int = 500, sweep_interval: float = 60.0):
+        # Stream URLs inside the info JSON expire, so entries must not live too long
+        self.ttl = ttl
+        self.max_entries = max_entries  # bulk imports must not grow memory and /tmp without bound
+        self.sweep_interval = sweep_interval
+        self.info_dir = os.path.join(tempfile.gettempdir(), "yt-dlp-cache", "info")
+        self._entries: Dict[str, CachedInfo] = {}
+        self._aliases: Dict[str, str] = {}  # URL -> video ID
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def _info_json_path(self, video_id: str) -> str:
+        return os.path.join(self.info_dir, re.sub(r"[^A-Za-z0-9_-]", "_", video_id) + ".info.json")
+
+    def get(self, url_or_id: str) -> Optional[CachedInfo]:
+        """Return a fresh cached entry for a URL or video ID"""
+        with self._lock:
+            video_id = self._aliases.get(url_or_id) or extract_video_id(url_or_id) or url_or_id
+            entry = self._entries.get(video_id)
+            if entry is not None:
+                if time.time() - entry.fetched_at <= self.ttl and os.path.exists(entry.info_json_path):
+                    return entry
+                self._evict(video_id)
+        return self._load_from_disk(video_id)
+
+    def _load_from_disk(self, video_id: str) -> Optional[CachedInfo]:
+        """Fresh info JSON written by another process (or before a restart)"""
+        path = self._info_json_path(video_id)
+        try:
+            fetched_at = os.path.getmtime(path)
+            if time.time() - fetched_at > self.ttl:
+                return None
+            with open(path, encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        entry = self._entry(video_id, info, path, fetched_at)
+        with self._lock:
+            self._entries[video_id] = entry
+        return entry
+
+    @staticmethod
+    def _entry(video_id: str, info: Dict, path: str, fetched_at: float) -> CachedInfo:
+        return CachedInfo(
+            video_id=video_id,
+            title=info.get("title") or "",
+            duration=info.get("duration"),
+            formats=build_format_table(info),
+            info_json_path=path,
+            fetched_at=fetched_at,
+        )
+
+    def put(self, url: str, info: Dict) -> CachedInfo:
+        """Store extracted info and remember the URL as alias"""
+        video_id = info.get("id") or url
+        os.makedirs(self.info_dir, exist_ok=True)
+        info_json_path = self._info_json_path(video_id)
+        # Readers (yt-dlp --load-info-json, other processes) never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.info_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+            os.replace(tmp_path, info_json_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        entry = self._entry(video_id, info, info_json_path, time.time())
+        with self._lock:
+            self._entries[video_id] = entry
+            self._aliases[url] = video_id
+            self._sweep()
+        return entry
+
+    def _evict(self, video_id: str):
+        """Drop an entry, its aliases and its info JSON (caller holds the lock)"""
+        entry = self._entries.pop(video_id, None)
+        self._aliases = {url: vid for url, vid in self._aliases.items() if vid != video_id}
+        if entry is not None:
+            try:
+                os.remove(entry.info_json_path)
+            except OSError:
+                pass
+
+    def _sweep(self):
+        """Evict expired entries and the oldest ones above max_entries; periodically also
+        remove stale info files left by other processes (caller holds the lock)"""
+        now = time.time()
+        for video_id in [vid for vid, entry in self._entries.items() if now - entry.fetched_at > self.ttl]:
+            self._evict(video_id)
+        if len(self._entries) > self.max_entries:
+            by_age = sorted(self._entries, key=lambda vid: self._entries[vid].fetched_at)
+            for video_id in by_age[:len(self._entries) - self.max_entries]:
+                self._evict(video_id)
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        try:
+            names = os.listdir(self.info_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.info_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass  # removed concurrently
+
+    def fetch(self, url: str, extra_args: Optional[List[str]] = None) -> CachedInfo:
+        """Return cached info or extract it once"""
+        entry = self.get(url)
+        if entry is not None:
+            logging.debug(f"Format cache hit for {url} ({entry.video_id})")
+            return entry
+        return self.put(url, extract_info(url, extra_args))
+
+
+# Module-level singleton shared by the API and the downloaders
+format_cache = FormatCache()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Format Planner
+Selects video/audio streams whose codecs fit the target container,
+so that merging is a pure stream copy instead of a re-encode
+"""
+
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+
+# Codec prefixes (as reported by yt-dlp) that ffmpeg can stream-copy into MP4
+MP4_VIDEO_CODECS = ("avc1", "avc3", "h264", "hvc1", "hev1", "h265", "av01")
+MP4_AUDIO_CODECS = ("mp4a", "aac", "mp3", "ac-3", "ec-3")
+
+# Matroska accepts practically every codec yt-dlp delivers
+CONTAINER_CODECS = {
+    "mp4": (MP4_VIDEO_CODECS, MP4_AUDIO_CODECS),
+    "mkv": (None, None),
+}
+
+# Preferred video codec names -> codec prefixes as reported by yt-dlp, and the name used by --format-sort
+CODEC_ALIASES = {
+    "avc1": (("avc1", "avc3", "h264"), "h264"),
+    "h264": (("avc1", "avc3", "h264"), "h264"),
+    "hevc": (("hvc1", "hev1", "h265"), "h265"),
+    "h265": (("hvc1", "hev1", "h265"), "h265"),
+    "vp9": (("vp9", "vp09"), "vp9"),
+    "av01": (("av01",), "av01"),
+    "av1": (("av01",), "av01"),
+}
+
+# Codec-aware yt-dlp selectors used when no extracted format list is available
+CONTAINER_SELECTORS = {
+    "mp4": "bv[vcodec~='^(avc|h264|hvc1|hev1|h265|av01)']+ba[acodec~='^(mp4a|aac|mp3|ac-3|ec-3)']",
+    "mkv": "bv+ba",
+}
+
+
+@dataclass
+class FormatLimits:
+    """Caps on the planned streams (None: no cap). Streams over a cap are skipped; if
+    nothing fits, the smallest streams are planned and the plan reports limits_met=False"""
+    max_height: Optional[int] = None
+    max_fps: Optional[float] = None
+    max_bitrate: Optional[float] = None  # kbit/s, video + audio
+    max_filesize: Optional[int] = None  # bytes, video + audio
+    prefer_codec: Optional[str] = None  # key of CODEC_ALIASES, decides between streams of equal height
+
+    @property
+    def active(self) -> bool:
+        return bool(self.to_dict())
+
+    def to_dict(self) -> Dict:
+        return {key: value for key, value in asdict(self).items() if value is not None}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "FormatLimits":
+        return cls(**(data or {}))
+
+    def key(self) -> str:
+        """Stable text form, part of the media store variant"""
+        return ",".join(f"{key}={value}" for key, value in sorted(self.to_dict().items()))
+
+    def format_sort(self) -> str:
+        """yt-dlp --format-sort preferring streams within the caps (used without a plan)"""
+        fields = [
+            f"res:{self.max_height}" if self.max_height else "res",
+            f"fps:{self.max_fps:g}" if self.max_fps else "fps",
+            f"br:{self.max_bitrate:g}" if self.max_bitrate else "br",
+        ]
+        if self.max_filesize:
+            fields.append(f"size:{max(1, self.max_filesize // (1024 * 1024))}M")
+        if self.prefer_codec in CODEC_ALIASES:
+            fields.append(f"vcodec:{CODEC_ALIASES[self.prefer_codec][1]}")
+        return ",".join(fields)
+
+
+@dataclass
+class FormatPlan:
+    """Chosen streams for one video and the expected merge cost"""
+    container: str
+    format_id: str
+    selector: str
+    video: Optional[Dict] = None
+    audio: Optional[Dict] = None
+    stream_copy: bool = True
+    transcode: List[str] = field(default_factory=list)
+    estimated_size: Optional[int] = None  # video + audio in bytes (None: unknown)
+    saved_bytes: Optional[int] = None  # compared with the uncapped plan (None: no caps or sizes unknown)
+    limits_met: bool = True
+
+    def describe(self) -> str:
+        """Short human-readable plan description"""
+        codecs = []
+        if self.video:
+            codecs.append(_short_codec(self.video.get("vcodec")))
+        if self.audio:
+            codecs.append(_short_codec(self.audio.get("acodec")))
+        codecs = "+".join(codecs)
+        mode = "Stream-Copy" if self.stream_copy else "Transcode: " + ", ".join(self.transcode)
+        if self.saved_bytes:
+            mode += f", caps save {self.saved_bytes / (1024 * 1024):.0f} MB"
+        if not self.limits_met:
+            mode += ", caps not reachable"
+        return f"Format {self.format_id} ({codecs} → {self.container}, {mode})"
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["description"] = self.describe()
+        return data
+
+
+def _short_codec(codec: Optional[str]) -> str:
+    """Strip codec profile suffix (avc1.640028 -> avc1)"""
+    if not codec or codec == "none":
+        return "?"
+    return codec.split(".")[0]
+
+
+def _codec_fits(codec: Optional[str], allowed: Optional[tuple]) -> bool:
+    """Check if a codec can be stream-copied into the container"""
+    if allowed is None:
+        return True
+    return bool(codec) and codec.lower().startswith(allowed)
+
+
+def _has_video(fmt: Dict) -> bool:
+    return fmt.get("vcodec") not in (None, "none")
+
+
+def _has_audio(fmt: Dict) -> bool:
+    return fmt.get("acodec") not in (None, "none")
+
+
+def _video_rank(fmt: Dict) -> tuple:
+    return (fmt.get("height") or 0, fmt.get("fps") or 0, fmt.get("vbr") or fmt.get("tbr") or 0)
+
+
+def _audio_rank(fmt: Dict) -> tuple:
+    return (fmt.get("abr") or fmt.get("tbr") or 0, fmt.get("asr") or 0)
+
+
+def _stream_size(fmt: Dict) -> Optional[int]:
+    return fmt.get("estimated_size") or fmt.get("filesize") or fmt.get("filesize_approx")
+
+
+def _total_size(streams: List[Dict]) -> Optional[int]:
+    """Summed size of the streams (None if any size is unknown)"""
+    sizes = [_stream_size(fmt) for fmt in streams]
+    return None if None in sizes else sum(sizes)
+
+
+def _within_caps(streams: List[Dict], limits: FormatLimits) -> bool:
+    """Check streams to be merged against the caps; unknown values pass"""
+    for fmt in streams:
+        if limits.max_height and _has_video(fmt) and (fmt.get("height") or 0) > limits.max_height:
+            return False
+        if limits.max_fps and _has_video(fmt) and (fmt.get("fps") or 0) > limits.max_fps:
+            return False
+    bitrate = 0.0
+    for fmt in streams:
+        if _has_video(fmt) and not _has_audio(fmt):
+            bitrate += fmt.get("vbr") or fmt.get("tbr") or 0
+        elif _has_audio(fmt) and not _has_video(fmt):
+            bitrate += fmt.get("abr") or fmt.get("tbr") or 0
+        else:
+            bitrate += fmt.get("tbr") or 0
+    if limits.max_bitrate and bitrate > limits.max_bitrate:
+        return False
+    size = _total_size(streams)
+    if limits.max_filesize and size is not None and size > limits.max_filesize:
+        return False
+    return True
+
+
+def _pick_capped(videos: List[Dict], audios: Optional[List[Dict]], limits: FormatLimits) -> tuple:
+    """Best video (and audio) within the caps: (video, audio, limits_met).
+    Video quality goes first, the preferred codec decides between streams of equal height."""
+    prefixes = CODEC_ALIASES.get(limits.prefer_codec, ((), ""))[0]
+
+    def video_key(fmt: Dict) -> tuple:
+        preferred = bool(prefixes) and (fmt.get("vcodec") or "").lower().startswith(prefixes)
+        height, fps, bitrate = _video_rank(fmt)
+        return (height, preferred, fps, bitrate)
+
+    ranked_audio = sorted(audios, key=_audio_rank, reverse=True) if audios else [None]
+    for video in sorted(videos, key=video_key, reverse=True):
+        for audio in ranked_audio:
+            streams = [video] + ([audio] if audio else [])
+            if _within_caps(streams, limits):
+                return video, audio, True
+    # Nothing fits: the smallest streams come closest
+    smallest_audio = min(audios, key=_audio_rank) if audios else None
+    return min(videos, key=_video_rank), smallest_audio, False
+
+
+def _apply_estimate(plan: FormatPlan, chosen: List[Dict], uncapped: List[Dict],
+                    limits: Optional[FormatLimits]):
+    """Expected size of the plan and the bytes the caps save"""
+    plan.estimated_size = _total_size(chosen)
+    full_size = _total_size(uncapped)
+    if limits and limits.active and plan.estimated_size is not None and full_size is not None:
+        plan.saved_bytes = max(0, full_size - plan.estimated_size)
+
+
+def _stream_summary(fmt: Dict) -> Dict:
+    """Reduce a yt-dlp format dict to the fields relevant for a plan"""
+    keys = ("format_id", "ext", "vcodec", "acodec", "width", "height", "fps",
+            "tbr", "vbr", "abr", "filesize", "filesize_approx")
+    return {key: fmt.get(key) for key in keys if fmt.get(key) is not None}
+
+
+def container_selector(container: str, ffmpeg_available: bool = True) -> str:
+    """Codec-aware yt-dlp format selector for a container (no extraction needed)"""
+    if not ffmpeg_available:
+        # Without ffmpeg: get best pre-merged format with video codec
+        return "best[vcodec!=none][ext=mp4]/best[vcodec!=none]"
+    # Never fall back to audio-only formats
+    return f"{CONTAINER_SELECTORS.get(container, 'bv+ba')}/bestvideo+bestaudio"
+
+
+def _plan_premerged(formats: List[Dict], container: str, fallback: str,
+                    limits: Optional[FormatLimits] = None) -> Optional[FormatPlan]:
+    """Plan for a single format that already contains video and audio"""
+    video_codecs, audio_codecs = CONTAINER_CODECS.get(container, (None, None))
+    progressive = [f for f in formats if _has_video(f) and _has_audio(f)]
+    if not progressive:
+        # Generic extractor: codecs of direct links and manifests are often unknown
+        progressive = [f for f in formats if f.get("vcodec") is None and f.get("acodec") is None]
+    if not progressive:
+        return None
+    fitting = [f for f in progressive
+               if _codec_fits(f.get("vcodec"), video_codecs)
+               and _codec_fits(f.get("acodec"), audio_codecs)]
+    uncapped = max(fitting or progressive, key=_video_rank)
+    best, limits_met = uncapped, True
+    if limits and limits.active:
+        best, _, limits_met = _pick_capped(fitting or progressive, None, limits)
+    plan = FormatPlan(
+        container=container,
+        format_id=best["format_id"],
+        selector=f"{best['format_id']}/{fallback}",
+        video=_stream_summary(best),
+        limits_met=limits_met,
+    )
+    _apply_estimate(plan, [best], [uncapped], limits)
+    if not fitting:
+        plan.stream_copy = False
+        plan.transcode.append(f"remux {_short_codec(best.get('vcodec'))} → {container}")
+    return plan
+
+
+def plan_video_formats(formats: List[Dict], container: str, ffmpeg_available: bool = True,
+                       limits: Optional[FormatLimits] = None) -> Optional[FormatPlan]:
+    """Pick the best streams (within the caps) that merge into the container without re-encoding"""
+    video_codecs, audio_codecs = CONTAINER_CODECS.get(container, (None, None))
+    fallback = container_selector(container, ffmpeg_available)
+
+    if not ffmpeg_available:
+        # Only pre-merged formats can be used without ffmpeg
+        return _plan_premerged(formats, container, fallback, limits)
+
+    video_only = [f for f in formats if _has_video(f) and not _has_audio(f)]
+    audio_only = [f for f in formats if _has_audio(f) and not _has_video(f)]
+    if not video_only or not audio_only:
+        # No separate streams (e.g. direct media links): use the best pre-merged format
+        return _plan_premerged(formats, container, fallback, limits)
+
+    fitting_video = [f for f in video_only if _codec_fits(f.get("vcodec"), video_codecs)]
+    fitting_audio = [f for f in audio_only if _codec_fits(f.get("acodec"), audio_codecs)]
+
+    best_video = max(fitting_video or video_only, key=_video_rank)
+    best_audio = max(fitting_audio or audio_only, key=_audio_rank)
+    video, audio, limits_met = best_video, best_audio, True
+    if limits and limits.active:
+        video, audio, limits_met = _pick_capped(fitting_video or video_only, fitting_audio or audio_only, limits)
+
+    format_id = f"{video['format_id']}+{audio['format_id']}"
+    plan = FormatPlan(
+        container=container,
+        format_id=format_id,
+        selector=f"{format_id}/{fallback}",
+        video=_stream_summary(video),
+        audio=_stream_summary(audio),
+        limits_met=limits_met,
+    )
+    _apply_estimate(plan, [video, audio], [best_video, best_audio], limits)
+
+    # Report what ffmpeg will have to convert during the merge
+    if not fitting_video:
+        plan.stream_copy = False
+        plan.transcode.append(f"video {_short_codec(video.get('vcodec'))} → {container}")
+    if not fitting_audio:
+        plan.stream_copy = False
+        plan.transcode.append(f"audio {_short_codec(audio.get('acodec'))} → {container}")
+
+    return plan
+
+
+def plan_selected_format(formats: List[Dict], format_id: str, container: str,
+                         ffmpeg_available: bool = True) -> FormatPlan:
+    """Build a plan for a user-chosen format ID (e.g. "137+140") and check its merge cost"""
+    video_codecs, audio_codecs = CONTAINER_CODECS.get(container, (None, None))
+    by_id = {f.get("format_id"): f for f in formats}
+    plan = FormatPlan(
+        container=container,
+        format_id=format_id,
+        selector=f"{format_id}/{container_selector(container, ffmpeg_available)}",
+    )
+
+    chosen = [by_id.get(part) for part in format_id.split("+")]
+    if None not in chosen:
+        plan.estimated_size = _total_size(chosen)
+    for fmt in chosen:
+        if fmt is None:
+            continue
+        if _has_video(fmt):
+            plan.video = _stream_summary(fmt)
+            if not _codec_fits(fmt.get("vcodec"), video_codecs):
+                plan.stream_copy = False
+                plan.transcode.append(f"video {_short_codec(fmt.get('vcodec'))} → {container}")
+        if _has_audio(fmt):
+            plan.audio = _stream_summary(fmt)
+            if not _codec_fits(fmt.get("acodec"), audio_codecs):
+                plan.stream_copy = False
+                plan.transcode.append(f"audio {_short_codec(fmt.get('acodec'))} → {container}")
+    return plan
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-Flight Download Registry
+Single-flight coalescing across tasks and worker processes: the first task that
+requests a video/format/container downloads it, later requesters wait for that
+download and receive its files
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import logging
+from typing import Callable, Dict, List, Optional
+
+from db import SQLiteDatabase
+from settings import settings
+
+
+class InflightRegistry:
+    """Shared (SQLite) registry of running downloads keyed by video ID, format and container"""
+
+    def __init__(self, db_path: Optional[str] = None, lease: float = 30.0, linger: float = 120.0,
+                 heartbeat_interval: float = 2.0):
+        self.db = SQLiteDatabase(db_path or settings.task_db)
+        self.lease = lease  # entries whose owner stopped heartbeating are taken over
+        self.linger = linger  # finished entries still serve late followers for this long
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._owned: Dict[str, Callable[[], float]] = {}  # key -> progress getter
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+        self.db.conn().executescript("""
+            CREATE TABLE IF NOT EXISTS inflight (
+                key        TEXT PRIMARY KEY,
+                task_id    TEXT NOT NULL,
+                owner      TEXT NOT NULL,
+                state      TEXT NOT NULL,
+                progress   REAL NOT NULL DEFAULT 0,
+                files      TEXT NOT NULL DEFAULT '[]',
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    @staticmethod
+    def make_key(video_id: str, format: str, container: str) -> str:
+        return f"{video_id}|{format}|{container}"
+
+    def claim(self, key: str, task_id: str, progress: Callable[[], float]) -> Optional[str]:
+        """Become the downloader for key; returns None on success, else the owning task ID"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT task_id, state, files, updated_at FROM inflight WHERE key = ?", (key,)
+            ).fetchone()
+            # A requeued task may find its own stale entry from before the restart
+            if row is not None and row[0] != task_id \
+                    and not self._expired(row[1], json.loads(row[2]), row[3], now):
+                return row[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO inflight (key, task_id, owner, state, progress, files, updated_at)"
+                " VALUES (?, ?, ?, 'running', 0, '[]', ?)",
+                (key, task_id, self.owner, now)
+            )
+        with self._lock:
+            self._owned[key] = progress
+        self._ensure_heartbeat()
+        return None
+
+    def _expired(self, state: str, files: List[str], updated_at: float, now: float) -> bool:
+        if state == "running":
+            return now - updated_at > self.lease
+        # Finished: reusable while fresh and the files still exist
+        return now - updated_at > self.linger or not all(os.path.exists(f) for f in files)
+
+    def complete(self, key: str, task_id: str, files: List[str]):
+        """Publish the finished files to waiting tasks"""
+        if not files:
+            # Nothing to share (e.g. the file already existed): let followers download themselves
+            self.release(key, task_id)
+            return
+        with self._lock:
+            self._owned.pop(key, None)
+        self.db.conn().execute(
+            "UPDATE inflight SET state = 'done', progress = 100, files = ?, updated_at = ?"
+            " WHERE key = ? AND task_id = ?",
+            (json.dumps(files), time.time(), key, task_id)
+        )
+
+    def release(self, key: str, task_id: str):
+        """Give up ownership (download failed); a waiting task takes over"""
+        with self._lock:
+            self._owned.pop(key, None)
+        self.db.conn().execute(
+            "DELETE FROM inflight WHERE key = ? AND task_id = ? AND state = 'running'", (key, task_id)
+        )
+
+    def wait(self, key: str, owner_task: str, on_progress: Callable[[float], None],
+             poll_interval: float = 1.0, stop_event: Optional[threading.Event] = None) -> Optional[List[str]]:
+        """Wait for another task's download; returns its files, or None if it failed or vanished
+        (or stop_event was set)"""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            row = self.db.conn().execute(
+                "SELECT task_id, state, progress, files, updated_at FROM inflight WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[0] != owner_task:
+                return None
+            if row[1] == "done":
+                return json.loads(row[3])
+            if time.time() - row[4] > self.lease:
+                logging.warning(f"In-flight download of task {owner_task} stalled, taking over")
+                return None
+            on_progress(row[2])
+            stop_event.wait(poll_interval)
+        return None
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True,
+                                                   name="inflight-heartbeat")
+                self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        """Keep the lease of every download owned by this process alive and publish progress"""
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                owned = [(key, progress()) for key, progress in self._owned.items()]
+            if not owned:
+                continue
+            now = time.time()
+            try:
+                with self.db.transaction() as conn:
+                    conn.executemany(
+                        "UPDATE inflight SET progress = ?, updated_at = ?"
+                        " WHERE key = ? AND owner = ? AND state = 'running'",
+                        [(progress, now, key, self.owner) for key, progress in owned]
+                    )
+            except Exception as e:
+                logging.error(f"Error updating in-flight downloads: {e}")
+
+
+# Module-level singleton: one heartbeat thread per process
+inflight_registry = InflightRegistry()
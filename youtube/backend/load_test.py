@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API Load Generator
+Starts the API against a fake yt-dlp that emits realistic progress output at a
+configurable rate, simulates N clients that submit tasks, poll
+/api/status/{task_id} and search concurrently, and reports latency
+percentiles, error rates and server CPU/memory per scenario.
+
+Usage: python load_test.py [--clients 10 50 100] [--duration 30] [--progress-rate 10]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from typing import Dict, List, Optional
+
+from settings import settings, backend_dir
+from benchmark import isolated_env, request_json, start_api
+
+
+# Stand-in for `python -m yt_dlp`; the real downloader code parses its output
+FAKE_YT_DLP = r'''
+import os, sys, json, time
+
+args = sys.argv[1:]
+rate = float(os.environ.get("MEDIATHEK_FAKE_PROGRESS_RATE", "10"))
+seconds = float(os.environ.get("MEDIATHEK_FAKE_DOWNLOAD_SECONDS", "5"))
+file_bytes = int(os.environ.get("MEDIATHEK_FAKE_FILE_BYTES", "65536"))
+
+
+def option(name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+
+def video_id():
+    info_json = option("--load-info-json")
+    if info_json:
+        with open(info_json) as f:
+            return json.load(f)["id"]
+    return args[-1].split("v=")[-1][:11]
+
+
+if "--version" in args:
+    print("fake")
+elif "--dump-single-json" in args and args[-1].startswith("ytsearch"):
+    time.sleep(float(os.environ.get("MEDIATHEK_FAKE_SEARCH_SECONDS", "1")))
+    count = int(args[-1][len("ytsearch"):].split(":", 1)[0] or 1)
+    print(json.dumps({"entries": [
+        {"id": f"S{n:010d}", "title": f"Result {n}", "duration": 60 + n,
+         "thumbnails": [{"url": "http://127.0.0.1/thumb.jpg"}]}
+        for n in range(count)
+    ]}))
+elif "--dump-single-json" in args:
+    vid = video_id()
+    size = int(seconds * 5 * 1024 * 1024)
+    print(json.dumps({"id": vid, "title": f"Fake {vid}", "duration": 60, "formats": [
+        {"format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2",
+         "width": 640, "height": 360, "tbr": 500, "filesize": size // 4},
+        {"format_id": "137", "ext": "mp4", "vcodec": "avc1.640028", "acodec": "none",
+         "width": 1920, "height": 1080, "fps": 30, "tbr": 4000, "filesize": size},
+        {"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2",
+         "abr": 128, "asr": 44100, "tbr": 128, "filesize": size // 30},
+    ]}))
+else:
+    vid = video_id()
+    steps = max(1, int(seconds * rate))
+    for step in range(1, steps + 1):
+        time.sleep(1 / rate)
+        percent = step * 100 / steps
+        eta = int(seconds - step / rate)
+        print(f"[download] {percent:5.1f}% of   25.00MiB at    5.00MiB/s ETA 00:{eta:02d}", flush=True)
+    if "-x" in args:
+        name = f"Fake {vid}.{option('--audio-format', 'mp3')}"
+        print(f"[ExtractAudio] Destination: {name}", flush=True)
+    else:
+        name = f"Fake {vid}.{option('--merge-output-format', 'mp4')}"
+        print(f'[Merger] Merging formats into "{name}"', flush=True)
+    with open(name, "wb") as f:
+        f.write(os.urandom(file_bytes))
+'''
+
+
+def write_fake_ytdlp(directory: str) -> str:
+    """Create the fake yt_dlp package; returns the directory to put on PYTHONPATH"""
+    package = os.path.join(directory, "yt_dlp")
+    os.makedirs(package, exist_ok=True)
+    with open(os.path.join(package, "__init__.py"), "w") as f:
+        f.write("")
+    with open(os.path.join(package, "__main__.py"), "w") as f:
+        f.write(FAKE_YT_DLP)
+    return directory
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Linear-interpolated percentile"""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+class LatencyStats:
+    """Thread-safe latency and error collection per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, Dict]:
+        result = {}
+        for endpoint, values in self.latencies.items():
+            errors = self.errors.get(endpoint, 0)
+            result[endpoint] = {
+                "requests": len(values),
+                "errors": errors,
+                "error_rate": round(errors / len(values), 4),
+                "rps": round(len(values) / duration, 2),
+            }
+            for p in (50, 90, 99):
+                result[endpoint][f"p{p}_ms"] = round(percentile(values, p) * 1000, 1)
+            result[endpoint]["max_ms"] = round(max(values) * 1000, 1)
+        return result
+
+
+class ServerSampler(threading.Thread):
+    """Samples CPU and memory of the server process trees from /proc (Linux only)"""
+
+    def __init__(self, root_pids: List[int], interval: float = 0.5):
+        super().__init__(daemon=True, name="server-sampler")
+        self.root_pids = root_pids
+        self.interval = interval
+        self.cpu_percent: List[float] = []
+        self.rss_mb: List[float] = []
+        self._stop_event = threading.Event()
+        self.supported = os.path.isdir("/proc/self") and hasattr(os, "sysconf")
+
+    @staticmethod
+    def _read_stat(pid: int) -> Optional[tuple]:
+        """(ppid, cpu ticks incl. reaped children, rss pages)"""
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            return None
+        # Fields after the command name start at "state" (field 3)
+        return int(fields[1]), sum(int(v) for v in fields[11:15]), int(fields[21])
+
+    def _sample(self) -> tuple:
+        stats = {}
+        for name in os.listdir("/proc"):
+            if name.isdigit():
+                stat = self._read_stat(int(name))
+                if stat:
+                    stats[int(name)] = stat
+        tree = set(pid for pid in self.root_pids if pid in stats)
+        added = True
+        while added:
+            children = {pid for pid, stat in stats.items() if stat[0] in tree} - tree
+            added = bool(children)
+            tree |= children
+        return sum(stats[p][1] for p in tree), sum(stats[p][2] for p in tree)
+
+    def run(self):
+        if not self.supported:
+            return
+        ticks_per_s = os.sysconf("SC_CLK_TCK")
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        last_ticks, _ = self._sample()
+        last_time = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            ticks, pages = self._sample()
+            now = time.perf_counter()
+            # Ticks of processes that exited but were not reaped yet drop out: clamp at 0
+            self.cpu_percent.append(max(0.0, (ticks - last_ticks) / ticks_per_s / (now - last_time) * 100))
+            self.rss_mb.append(pages * page_size / 1024 / 1024)
+            last_ticks, last_time = ticks, now
+
+    def stop(self) -> Optional[Dict]:
+        self._stop_event.set()
+        self.join()
+        if not self.cpu_percent:
+            return None
+        return {
+            "cpu_percent_mean": round(sum(self.cpu_percent) / len(self.cpu_percent), 1),
+            "cpu_percent_max": round(max(self.cpu_percent), 1),
+            "rss_mb_mean": round(sum(self.rss_mb) / len(self.rss_mb), 1),
+            "rss_mb_peak": round(max(self.rss_mb), 1),
+        }
+
+
+class LoadClient(threading.Thread):
+    """Submits a task, polls its status until complete and searches now and then"""
+
+    def __init__(self, n: int, api_url: str, args: argparse.Namespace, output: str,
+                 stats: LatencyStats, stop_event: threading.Event):
+        super().__init__(daemon=True, name=f"client-{n}")
+        self.n = n
+        self.api_url = api_url
+        self.args = args
+        self.output = output
+        self.stats = stats
+        self.stop_event = stop_event
+        self.submitted = 0
+        self.completed = 0
+
+    def _timed(self, endpoint: str, func):
+        start = time.perf_counter()
+        try:
+            result = func()
+        except (OSError, ValueError):
+            self.stats.record(endpoint, time.perf_counter() - start, False)
+            return None
+        self.stats.record(endpoint, time.perf_counter() - start, True)
+        return result
+
+    def _search(self):
+        req = urllib.request.Request(
+            f"{self.api_url}/api/search/youtube",
+            data=json.dumps({"query": f"load test {self.n}", "max_results": 10}).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(req, timeout=60) as response:
+            return response.read()  # full event stream
+
+    def run(self):
+        rng = random.Random(self.n)
+        while not self.stop_event.is_set():
+            kind = "audio" if rng.random() < self.args.audio_ratio else "video"
+            urls = [f"https://www.youtube.com/watch?v=L{self.n:04d}{self.submitted * 10 + i:06d}"
+                    for i in range(self.args.urls_per_task)]
+            response = self._timed(f"POST /api/download/{kind}", lambda: request_json(
+                f"{self.api_url}/api/download/{kind}",
+                {"urls": urls, "format": "mp3" if kind == "audio" else "mp4",
+                 "output_path": self.output, "use_timestamped_folder": False}
+            ))
+            if response is None:
+                self.stop_event.wait(1)
+                continue
+            self.submitted += 1
+
+            while not self.stop_event.wait(self.args.poll_interval):
+                status = self._timed("GET /api/status", lambda: request_json(
+                    f"{self.api_url}/api/status/{response['task_id']}"
+                ))
+                if status and status["status"] in ("complete", "error"):
+                    self.completed += 1
+                    break
+                if rng.random() < self.args.search_ratio:
+                    self._timed("POST /api/search/youtube", self._search)
+
+
+def run_scenario(clients: int, args: argparse.Namespace, fake_dir: str, workdir: str) -> Dict:
+    """One server, `clients` concurrent clients for args.duration seconds"""
+    env = isolated_env(workdir, args.embedded_workers)
+    env["PYTHONPATH"] = os.pathsep.join([fake_dir, env.get("PYTHONPATH", "")]).rstrip(os.pathsep)
+    env.update({
+        "MEDIATHEK_FAKE_PROGRESS_RATE": str(args.progress_rate),
+        "MEDIATHEK_FAKE_DOWNLOAD_SECONDS": str(args.download_seconds),
+        "MEDIATHEK_FAKE_SEARCH_SECONDS": str(args.search_seconds),
+    })
+    worker = None
+    if args.api_workers > 1:
+        # Production layout: several API processes plus separate download workers
+        env["MEDIATHEK_EMBEDDED_WORKERS"] = "0"
+        worker = subprocess.Popen(
+            [sys.executable, "worker.py", "--processes", str(args.embedded_workers)],
+            cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    server, api_url = start_api(env, args.api_workers)
+
+    sampler = ServerSampler([p.pid for p in (server, worker) if p])
+    stats = LatencyStats()
+    stop_event = threading.Event()
+    output = os.path.join(workdir, "output")
+    os.makedirs(output, exist_ok=True)
+    load_clients = [LoadClient(n, api_url, args, output, stats, stop_event) for n in range(clients)]
+    try:
+        sampler.start()
+        start = time.perf_counter()
+        for client in load_clients:
+            client.start()
+        stop_event.wait(args.duration)
+        stop_event.set()
+        for client in load_clients:
+            client.join(timeout=60)
+        duration = time.perf_counter() - start
+        server_stats = sampler.stop()
+    finally:
+        for process in (server, worker):
+            if process:
+                process.terminate()
+                process.wait(timeout=30)
+
+    return {
+        "clients": clients,
+        "duration_s": round(duration, 1),
+        "tasks_submitted": sum(c.submitted for c in load_clients),
+        "tasks_completed": sum(c.completed for c in load_clients),
+        "endpoints": stats.summary(duration),
+        "server": server_stats,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="MediathekManagement API load generator")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 100],
+                        help="concurrent clients per scenario")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per scenario")
+    parser.add_argument("--urls-per-task", type=int, default=3)
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="status poll interval (frontend: 1s)")
+    parser.add_argument("--search-ratio", type=float, default=0.05, help="chance of a search per poll")
+    parser.add_argument("--audio-ratio", type=float, default=0.3, help="share of audio tasks")
+    parser.add_argument("--progress-rate", type=float, default=10, help="fake yt-dlp progress lines per second")
+    parser.add_argument("--download-seconds", type=float, default=5, help="fake download duration per URL")
+    parser.add_argument("--search-seconds", type=float, default=1, help="fake search duration")
+    parser.add_argument("--embedded-workers", type=int, default=settings.embedded_workers,
+                        help="download workers (threads, or processes with --api-workers > 1)")
+    parser.add_argument("--api-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--output", help="result file (default: data/loadtests/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="mediathek-load-")
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": vars(args), "scenarios": []}
+    try:
+        fake_dir = write_fake_ytdlp(os.path.join(root, "fake"))
+        for clients in args.clients:
+            workdir = tempfile.mkdtemp(dir=root)
+            result = run_scenario(clients, args, fake_dir, workdir)
+            shutil.rmtree(workdir, ignore_errors=True)
+            report["scenarios"].append(result)
+
+            print(f"\n{clients} clients: {result['tasks_submitted']} tasks submitted,"
+                  f" {result['tasks_completed']} completed")
+            for endpoint, summary in sorted(result["endpoints"].items()):
+                print(f"  {endpoint:28} {summary['requests']:6} req  p50 {summary['p50_ms']:8} ms"
+                      f"  p99 {summary['p99_ms']:8} ms  errors {summary['error_rate']:.2%}")
+            if result["server"]:
+                server = result["server"]
+                print(f"  server: CPU {server['cpu_percent_mean']}% (max {server['cpu_percent_max']}%),"
+                      f" RSS {server['rss_mb_mean']} MB (peak {server['rss_mb_peak']} MB)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        settings.data_dir, "loadtests", f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
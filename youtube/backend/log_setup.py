@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Logging Setup
+Non-blocking (queue-based) structured JSON logging with size and time rotation,
+task/URL context fields and optional per-task log files
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+import logging.handlers
+from collections import OrderedDict
+from typing import List, Optional
+
+from settings import settings, backend_dir
+
+
+log_dir = os.path.join(backend_dir, "logging")
+
+# Context of the download currently running in this thread
+current_task_id: contextvars.ContextVar = contextvars.ContextVar("task_id", default=None)
+current_url: contextvars.ContextVar = contextvars.ContextVar("url", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+def set_log_context(task_id: Optional[str] = None, url: Optional[str] = None):
+    """Attach task ID / URL to every log record emitted by this thread"""
+    if task_id is not None:
+        current_task_id.set(task_id)
+    current_url.set(url)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the task/URL context onto the record (runs in the emitting thread)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "task_id"):
+            record.task_id = current_task_id.get()
+        if not hasattr(record, "url"):
+            record.url = current_url.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "task_id", None):
+            entry["task_id"] = record.task_id
+        if getattr(record, "url", None):
+            entry["url"] = record.url
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotates at the configured interval or when the file exceeds max_bytes"""
+
+    def __init__(self, filename: str, max_bytes: int, when: str, backup_count: int):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if super().shouldRollover(record):
+            return 1
+        if self.max_bytes > 0 and self.stream is not None:
+            if self.stream.tell() >= self.max_bytes:
+                return 1
+        return 0
+
+    def rotation_filename(self, default_name: str) -> str:
+        # Size-based rollovers can happen several times within one time slot; the counter
+        # only grows (never reuses a freed number), so later backups sort after earlier ones
+        directory, base = os.path.split(default_name)
+        counters = [int(name[len(base) + 1:]) for name in os.listdir(directory or ".")
+                    if name.startswith(base + ".") and name[len(base) + 1:].isdigit()]
+        if not counters and not os.path.exists(default_name):
+            return default_name
+        return f"{default_name}.{max(counters, default=0) + 1:04d}"
+
+    def getFilesToDelete(self) -> List[str]:
+        """Backups beyond backupCount, oldest first. Sorted by age: the name order of
+        the base class would delete the newest backups of a slot with size rollovers."""
+        directory, base = os.path.split(self.baseFilename)
+        backups = []
+        for name in os.listdir(directory):
+            if name.startswith(base + ".") and self.extMatch.match(name[len(base) + 1:].split(".")[0]):
+                path = os.path.join(directory, name)
+                backups.append((os.stat(path).st_mtime_ns, path))
+        backups.sort()
+        return [path for _, path in backups[:max(0, len(backups) - self.backupCount)]]
+
+
+class TaskFileHandler(logging.Handler):
+    """Writes records that carry a task ID into logging/tasks/<task_id>.log"""
+
+    def __init__(self, directory: str, max_open: int = 16):
+        super().__init__()
+        self.directory = directory
+        self.max_open = max_open
+        self._files: "OrderedDict[str, object]" = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def emit(self, record: logging.LogRecord):
+        task_id = getattr(record, "task_id", None)
+        if not task_id:
+            return
+        try:
+            f = self._files.pop(task_id, None)
+            if f is None:
+                f = open(os.path.join(self.directory, f"{task_id}.log"), "a", encoding="utf-8")
+            self._files[task_id] = f  # most recently used last
+            while len(self._files) > self.max_open:
+                _, oldest = self._files.popitem(last=False)
+                oldest.close()
+            f.write(self.format(record) + "\n")
+            f.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+
+def configure_logging(log_name: Optional[str] = None):
+    """Route all logging through a queue to a background writer thread (idempotent)"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        os.makedirs(log_dir, exist_ok=True)
+        formatter = JsonFormatter()
+        log_name = (log_name or settings.log_file).replace("{pid}", str(os.getpid()))
+
+        file_handler = SizeAndTimeRotatingFileHandler(
+            os.path.join(log_dir, log_name),
+            max_bytes=settings.log_max_bytes,
+            when=settings.log_rotate_when,
+            backup_count=settings.log_backups,
+        )
+        file_handler.setFormatter(formatter)
+        handlers = [file_handler]
+
+        if settings.task_logs:
+            task_handler = TaskFileHandler(os.path.join(log_dir, "tasks"))
+            task_handler.setFormatter(formatter)
+            handlers.append(task_handler)
+
+        # Download threads only enqueue; file I/O happens in the listener thread
+        log_queue: queue.Queue = queue.Queue(-1)
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(settings.log_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def prune_process_logs(log_name: Optional[str] = None, keep: Optional[int] = None) -> int:
+    """Delete the log files of earlier processes if the log name is per process ("{pid}"),
+    keeping the newest `keep` (default: the configured backups). Call once at startup,
+    before the worker processes start: every restart creates new per-process files that
+    the rotation of the running processes never prunes."""
+    log_name = log_name or settings.log_file
+    if "{pid}" not in log_name or not os.path.isdir(log_dir):
+        return 0
+    keep = settings.log_backups if keep is None else keep
+    prefix, suffix = log_name.split("{pid}", 1)
+    pattern = re.compile(re.escape(prefix) + r"(\d+)" + re.escape(suffix) + r"(\..+)?$")
+    own = str(os.getpid())
+    files = []
+    for name in os.listdir(log_dir):
+        match = pattern.match(name)
+        if match and match.group(1) != own:
+            path = os.path.join(log_dir, name)
+            files.append((os.stat(path).st_mtime_ns, path))
+    files.sort(reverse=True)
+    removed = 0
+    for _, path in files[keep:]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError as e:
+            logging.warning(f"Could not delete old log file {path}: {e}")
+    return removed
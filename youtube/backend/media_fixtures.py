@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Media Fixtures
+Generated media files (progressive, HLS, DASH) and a local HTTP server that
+stands in for a media host, for offline benchmarks via yt-dlp's generic extractor
+"""
+
+import os
+import re
+import threading
+import subprocess
+import logging
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+FIXTURE_KINDS = ("progressive", "hls", "dash")
+
+# Distinct URLs for the same fixture: a "v<n>_" prefix of any path component is ignored
+ALIAS_RE = re.compile(r"(?<=/)v\d+_")
+
+
+def _ffmpeg_media(ffmpeg: str, target: str, seconds: int, bitrate_kbps: int, extra: List[str]):
+    """Encode a test pattern with tone (fast preset, fixed bitrate)"""
+    cmd = [
+        ffmpeg, "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-b:v", f"{bitrate_kbps}k",
+        "-c:a", "aac", "-b:a", "128k",
+    ] + extra + [target]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+
+
+def _synthetic_hls(directory: str, size_mb: float, segments: int = 10):
+    """HLS playlist over random MPEG-TS sized segments (downloadable without ffmpeg)"""
+    os.makedirs(directory, exist_ok=True)
+    segment_size = int(size_mb * 1024 * 1024 / segments)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for n in range(segments):
+        with open(os.path.join(directory, f"seg{n}.ts"), "wb") as f:
+            f.write(os.urandom(segment_size))
+        lines += ["#EXTINF:2.0,", f"seg{n}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    with open(os.path.join(directory, "index.m3u8"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def generate_fixtures(directory: str, size_mb: float = 5, ffmpeg: Optional[str] = None) -> Dict[str, str]:
+    """Create one fixture per kind; returns kind -> path relative to directory.
+    Without ffmpeg the progressive file and HLS segments are random bytes and DASH is skipped."""
+    os.makedirs(directory, exist_ok=True)
+    fixtures = {}
+    # Duration at ~2 Mbit/s gives roughly size_mb per file
+    bitrate_kbps = 2000
+    seconds = max(1, int(size_mb * 8 * 1024 / (bitrate_kbps + 128)))
+
+    progressive = os.path.join(directory, "progressive.mp4")
+    if ffmpeg:
+        _ffmpeg_media(ffmpeg, progressive, seconds, bitrate_kbps, ["-movflags", "+faststart"])
+    else:
+        with open(progressive, "wb") as f:
+            f.write(os.urandom(int(size_mb * 1024 * 1024)))
+    fixtures["progressive"] = "progressive.mp4"
+
+    hls_dir = os.path.join(directory, "hls")
+    if ffmpeg:
+        os.makedirs(hls_dir, exist_ok=True)
+        _ffmpeg_media(ffmpeg, os.path.join(hls_dir, "index.m3u8"), seconds, bitrate_kbps,
+                      ["-f", "hls", "-hls_time", "2", "-hls_playlist_type", "vod"])
+    else:
+        _synthetic_hls(hls_dir, size_mb)
+    fixtures["hls"] = "hls/index.m3u8"
+
+    if ffmpeg:
+        dash_dir = os.path.join(directory, "dash")
+        os.makedirs(dash_dir, exist_ok=True)
+        _ffmpeg_media(ffmpeg, os.path.join(dash_dir, "manifest.mpd"), seconds, bitrate_kbps,
+                      ["-map", "0:v", "-map", "1:a", "-f", "dash", "-seg_duration", "2"])
+        fixtures["dash"] = "dash/manifest.mpd"
+    else:
+        logging.warning("ffmpeg not found: DASH fixture skipped")
+    return fixtures
+
+
+def fixture_size(directory: str, relative_path: str) -> int:
+    """Bytes of a fixture including all files next to a manifest"""
+    path = os.path.join(directory, relative_path)
+    if os.path.dirname(relative_path):
+        folder = os.path.dirname(path)
+        return sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+    return os.path.getsize(path)
+
+
+class _FixtureHandler(SimpleHTTPRequestHandler):
+    """Static files with /v<n>_ aliases; request logging disabled"""
+
+    def translate_path(self, path: str) -> str:
+        return super().translate_path(ALIAS_RE.sub("", path))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Local HTTP server for the fixture directory (runs in a background thread)"""
+
+    def __init__(self, directory: str, host: str = "127.0.0.1", port: int = 0):
+        self.directory = directory
+        self.httpd = ThreadingHTTPServer((host, port), partial(_FixtureHandler, directory=directory))
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name="fixture-server")
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, relative_path: str, n: int = 0) -> str:
+        """Distinct URL per n (yt-dlp names the output after the file name)"""
+        # Folders are aliased too, so relative segment references of manifests stay distinct
+        path = "/".join(f"v{n}_{part}" for part in relative_path.split("/"))
+        return f"{self.base_url}/{path}"
+
+    def __enter__(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Media Store
+Content-addressed store of downloaded media keyed by video ID, type and format.
+Output folders receive hardlinks (copies across file systems) instead of new
+downloads; the store is kept below a disk quota by LRU eviction.
+
+Usage: python media_store.py stats | reconcile [FOLDER ...]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from db import SQLiteDatabase
+from settings import settings
+from tool_registry import tool_registry
+from url_canonicalizer import extract_video_id
+
+
+# File extension -> (download type, format) as used by the download endpoints
+EXTENSION_FORMATS = {
+    ".mp4": ("video", "mp4"),
+    ".mkv": ("video", "mkv"),
+    ".mp3": ("audio", "mp3"),
+    ".wav": ("audio", "wav"),
+}
+
+
+def media_key(video_id: str, kind: str, format: str, variant: str = "best") -> str:
+    """Store key; variant is the explicitly chosen format ID (or "best")"""
+    return f"{video_id}|{kind}|{format}|{variant}"
+
+
+def link_or_copy(src: str, dest: str):
+    """Hardlink src to dest, copying if both are on different file systems"""
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def _file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def probe_video_id(path: str) -> Optional[str]:
+    """Video ID from the embedded metadata (yt-dlp writes the URL into purl/comment)"""
+    ffprobe = tool_registry.get("ffprobe")
+    if not ffprobe.available:
+        return None
+    try:
+        result = subprocess.run(
+            [ffprobe.path, "-v", "quiet", "-print_format", "json", "-show_entries", "format_tags", path],
+            capture_output=True, text=True, timeout=30
+        )
+        tags = json.loads(result.stdout or "{}").get("format", {}).get("tags", {})
+    except (subprocess.TimeoutExpired, ValueError):
+        return None
+    for value in tags.values():
+        video_id = extract_video_id(str(value))
+        if video_id:
+            return video_id
+    return None
+
+
+class MediaStore:
+    """Media files shared by all output folders, with an LRU-evicted disk quota"""
+
+    def __init__(self, root: Optional[str] = None, quota_mb: Optional[int] = None,
+                 db_path: Optional[str] = None):
+        self.root = root or settings.media_store_dir
+        self.quota = (settings.media_quota_mb if quota_mb is None else quota_mb) * 1024 * 1024
+        self.db = SQLiteDatabase(db_path or os.path.join(settings.data_dir, "media_store.db"))
+        self.db.conn().executescript("""
+            CREATE TABLE IF NOT EXISTS media (
+                key        TEXT PRIMARY KEY,
+                video_id   TEXT NOT NULL,
+                files      TEXT NOT NULL,
+                size       INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used  REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_media_last_used ON media (last_used);
+        """)
+
+    @property
+    def enabled(self) -> bool:
+        return self.quota > 0
+
+    def _entry_dir(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def lookup(self, key: str) -> Optional[List[str]]:
+        """Stored files for key (marks the entry as recently used)"""
+        row = self.db.conn().execute("SELECT files FROM media WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        files = json.loads(row[0])
+        if not all(os.path.exists(f) for f in files):
+            self.evict(key)
+            return None
+        self.db.conn().execute("UPDATE media SET last_used = ? WHERE key = ?", (time.time(), key))
+        return files
+
+    def materialize(self, key: str, output_dir: str) -> Optional[List[str]]:
+        """Link the stored files into output_dir; None if key is not stored"""
+        files = self.lookup(key)
+        if files is None:
+            return None
+        os.makedirs(output_dir, exist_ok=True)
+        delivered = []
+        for path in files:
+            dest = os.path.join(output_dir, os.path.basename(path))
+            if not os.path.exists(dest):
+                link_or_copy(path, dest)
+            delivered.append(dest)
+        return delivered
+
+    def ingest(self, key: str, files: List[str]) -> List[str]:
+        """Add downloaded files to the store and enforce the quota"""
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        stored = []
+        for path in files:
+            dest = os.path.join(entry_dir, os.path.basename(path))
+            if os.path.exists(dest):
+                os.remove(dest)  # replaced by a newer download
+            link_or_copy(path, dest)
+            stored.append(dest)
+
+        now = time.time()
+        self.db.conn().execute(
+            "INSERT OR REPLACE INTO media (key, video_id, files, size, created_at, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, key.split("|", 1)[0], json.dumps(stored), sum(os.path.getsize(f) for f in stored), now, now)
+        )
+        self.enforce_quota()
+        return stored
+
+    def evict(self, key: str):
+        """Remove an entry (files linked into output folders stay intact)"""
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        self.db.conn().execute("DELETE FROM media WHERE key = ?", (key,))
+
+    def total_size(self) -> int:
+        return self.db.conn().execute("SELECT COALESCE(SUM(size), 0) FROM media").fetchone()[0]
+
+    def enforce_quota(self) -> int:
+        """Evict least recently used entries until the store fits the quota"""
+        evicted = 0
+        total = self.total_size()
+        while total > self.quota:
+            row = self.db.conn().execute(
+                "SELECT key, size FROM media ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self.evict(row[0])
+            total -= row[1]
+            evicted += 1
+        if evicted:
+            logging.info(f"Media store: evicted {evicted} entr{'y' if evicted == 1 else 'ies'} (quota)")
+        return evicted
+
+    def stats(self) -> Dict:
+        entries = self.db.conn().execute("SELECT COUNT(*) FROM media").fetchone()[0]
+        return {"root": self.root, "entries": entries, "size": self.total_size(), "quota": self.quota}
+
+    def reconcile(self, folders: List[str]) -> Dict[str, int]:
+        """Adopt media in existing output folders; identical copies become hardlinks"""
+        report = {"ingested": 0, "linked": 0, "saved_bytes": 0, "skipped": 0}
+        root = os.path.abspath(self.root)
+        for folder in folders:
+            for dirpath, _, filenames in os.walk(folder):
+                if os.path.abspath(dirpath).startswith(root):
+                    continue
+                for name in filenames:
+                    ext = os.path.splitext(name)[1].lower()
+                    if ext not in EXTENSION_FORMATS:
+                        continue
+                    path = os.path.join(dirpath, name)
+                    video_id = probe_video_id(path)
+                    if not video_id:
+                        report["skipped"] += 1
+                        continue
+                    key = media_key(video_id, *EXTENSION_FORMATS[ext])
+                    stored = self.lookup(key)
+                    if stored is None:
+                        self.ingest(key, [path])
+                        report["ingested"] += 1
+                    elif len(stored) == 1 and self._replace_with_link(path, stored[0]):
+                        report["linked"] += 1
+                        report["saved_bytes"] += os.path.getsize(path)
+        return report
+
+    @staticmethod
+    def _replace_with_link(path: str, stored: str) -> bool:
+        """Replace path by a hardlink to stored if both have identical content"""
+        if os.path.samefile(path, stored) or os.path.getsize(path) != os.path.getsize(stored):
+            return False
+        if _file_digest(path) != _file_digest(stored):
+            return False
+        tmp = path + ".mediastore-link"
+        try:
+            os.link(stored, tmp)
+        except OSError:
+            return False  # different file system: keep the copy
+        os.replace(tmp, path)
+        return True
+
+
+# Module-level singleton shared by the downloaders of this process
+media_store = MediaStore()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="MediathekManagement media store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show size and number of entries")
+    reconcile = sub.add_parser("reconcile", help="adopt media from existing output folders")
+    reconcile.add_argument("folders", nargs="*", default=[str(Path.home() / "Downloads")])
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        print(json.dumps(media_store.stats(), indent=2))
+    elif args.command == "reconcile":
+        if not tool_registry.is_available("ffprobe"):
+            print("ffprobe wird für den Abgleich benötigt, ist aber nicht installiert.")
+            sys.exit(1)
+        print(json.dumps(media_store.reconcile(args.folders), indent=2))
+
+
+if __name__ == "__main__":
+    main()
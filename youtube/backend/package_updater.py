@@ -2,46 +2,158 @@
 # -*- coding: utf-8 -*-
 """
 Package Update Manager
-Checks and updates required packages on startup
+Checks required packages for updates in the background (cached, parallel)
+and restarts the application once the download queue is idle
 """
 
 import os
 import sys
+import json
+import time
+import signal
 import subprocess
 import logging
+import importlib
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+from typing import Callable, Dict, Optional
+
+from packaging.version import InvalidVersion, Version
+
+from settings import settings
 
 
 class PackageUpdater:
     """Manage package updates"""
-    
+
+    PACKAGES = ["yt-dlp", "fastapi", "uvicorn", "pydantic"]
+    restart_requested = False
+
     @staticmethod
-    def check_and_update_packages() -> bool:
-        """Check and update all required packages"""
-        packages = ["yt-dlp", "fastapi", "uvicorn", "pydantic"]
-        
+    def _cache_file() -> str:
+        return os.path.join(settings.data_dir, "update_check.json")
+
+    @staticmethod
+    def load_last_check() -> Optional[Dict]:
+        """Result of the last update check (None if never checked)"""
+        try:
+            with open(PackageUpdater._cache_file(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _save_check(result: Dict):
+        os.makedirs(settings.data_dir, exist_ok=True)
+        with open(PackageUpdater._cache_file(), 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    @staticmethod
+    def _installed_version(package: str) -> Optional[str]:
+        try:
+            return metadata.version(package)
+        except metadata.PackageNotFoundError:
+            return None
+
+    @staticmethod
+    def _is_outdated(installed: Optional[str], latest: Optional[str]) -> bool:
+        """True if PyPI has a newer release than the installed one (PEP 440 ordering)"""
+        if not latest:
+            return False
+        if not installed:
+            return True
+        try:
+            return Version(installed) < Version(latest)
+        except InvalidVersion:
+            return installed != latest
+
+    @staticmethod
+    def _latest_version(package: str) -> Optional[str]:
+        """Latest release on PyPI (JSON API, no pip process)"""
+        try:
+            with urllib.request.urlopen(f"https://pypi.org/pypi/{package}/json", timeout=10) as response:
+                return json.load(response)["info"]["version"]
+        except Exception as e:
+            logging.debug(f"Could not query PyPI for {package}: {e}")
+            return None
+
+    @staticmethod
+    def update_check_due() -> bool:
+        """True if the cached check is missing or older than the configured interval"""
+        last = PackageUpdater.load_last_check()
+        if not last:
+            return True
+        return time.time() - last.get("checked_at", 0) > settings.update_check_interval * 3600
+
+    @staticmethod
+    def check_and_update_packages(force: bool = False) -> bool:
+        """Check all required packages in parallel and upgrade outdated ones in one pip call"""
+        if settings.offline:
+            logging.info("Offline mode: skipping package update check")
+            return False
+        if not force and not PackageUpdater.update_check_due():
+            last = PackageUpdater.load_last_check()
+            logging.info(f"Package update check skipped (last check: {time.ctime(last['checked_at'])})")
+            return False
+
         logging.info("Checking for package updates...")
-        updates_needed = False
-        
+        packages = PackageUpdater.PACKAGES
+        with ThreadPoolExecutor(max_workers=len(packages)) as executor:
+            latest = dict(zip(packages, executor.map(PackageUpdater._latest_version, packages)))
+
+        before = {package: PackageUpdater._installed_version(package) for package in packages}
+        outdated = []
         for package in packages:
+            installed = before[package]
+            if PackageUpdater._is_outdated(installed, latest[package]):
+                logging.info(f"⬆ {package} {installed} -> {latest[package]}")
+                outdated.append(package)
+            else:
+                logging.info(f"✓ {package} already up-to-date")
+
+        updated = []
+        if outdated:
             try:
                 result = subprocess.run(
-                    [sys.executable, "-m", "pip", "install", "--upgrade", package],
+                    [sys.executable, "-m", "pip", "install", "--upgrade", *outdated],
                     capture_output=True,
-                    timeout=60,
+                    timeout=300,
                     text=True
                 )
-                
-                if "Successfully installed" in result.stdout:
-                    logging.info(f"✓ Updated {package}")
-                    updates_needed = True
+                if result.returncode == 0:
+                    # pip also exits 0 when it kept the old version (e.g. pinned or no wheel)
+                    importlib.invalidate_caches()
+                    updated = [package for package in outdated
+                               if PackageUpdater._installed_version(package) != before[package]]
+                    if updated:
+                        logging.info(f"✓ Updated {', '.join(updated)}")
+                    unchanged = [package for package in outdated if package not in updated]
+                    if unchanged:
+                        logging.warning(f"pip left {', '.join(unchanged)} unchanged")
                 else:
-                    logging.info(f"✓ {package} already up-to-date")
-                    
+                    logging.error(f"Failed to update packages: {result.stderr.strip()[-500:]}")
             except Exception as e:
-                logging.error(f"Failed to update {package}: {e}")
-        
-        return updates_needed
-    
+                logging.error(f"Failed to update packages: {e}")
+
+        PackageUpdater._save_check({
+            "checked_at": time.time(),
+            "latest": latest,
+            "updated": updated,
+        })
+        return bool(updated)
+
+    @staticmethod
+    def restart_when_idle(is_idle: Callable[[], bool], poll_interval: float = 10):
+        """Wait until no downloads are queued or running, then stop the server for a restart"""
+        logging.info("Updates installed. Restart scheduled for when the download queue is idle")
+        while not is_idle():
+            time.sleep(poll_interval)
+        PackageUpdater.restart_requested = True
+        logging.info("Download queue idle, restarting...")
+        # Lets uvicorn shut down gracefully; start_server.py restarts afterwards
+        signal.raise_signal(signal.SIGINT)
+
     @staticmethod
     def restart_application():
         """Restart the application"""
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sampling Profiler
+Time-limited sampling of all threads of the running process (collapsed stacks
+for flamegraph tools) plus a snapshot of threads, subprocesses and memory.
+Nothing runs until a profile is requested. Download worker processes poll the
+task database for profile requests and answer with their own profile.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import uuid
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+from db import SQLiteDatabase
+from settings import settings
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+
+_profile_lock = threading.Lock()
+
+# Worker processes look for profile requests this often
+RESPONDER_POLL = 1.0
+# Workers that have not polled for this long are not waited for
+RESPONDER_TTL = 10.0
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float) -> tuple:
+    """Sample the stacks of all other threads; returns (collapsed stack counts, samples)"""
+    own_id = threading.get_ident()
+    stacks: Counter = Counter()
+    samples = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(labels))] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+
+def _child_processes() -> List[Dict]:
+    """Descendant processes (yt-dlp, ffmpeg, ...) from /proc; empty where unavailable"""
+    if not os.path.isdir("/proc/self"):
+        return []
+    parents = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                parents[int(name)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree = {os.getpid()}
+    children = []
+    added = True
+    while added:
+        new = [pid for pid, ppid in parents.items() if ppid in tree and pid not in tree]
+        tree.update(new)
+        children.extend(new)
+        added = bool(new)
+    result = []
+    for pid in children:
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace").strip()
+        except OSError:
+            continue
+        result.append({"pid": pid, "ppid": parents[pid], "cmdline": cmdline[:300]})
+    return result
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def process_snapshot() -> Dict:
+    """Threads, subprocesses and memory of this process"""
+    threads = [{"name": t.name, "ident": t.ident, "daemon": t.daemon} for t in threading.enumerate()]
+    memory = {"rss_mb": _rss_mb(), "gc_counts": gc.get_count()}
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory["peak_rss_mb"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return {
+        "pid": os.getpid(),
+        "thread_count": len(threads),
+        "threads": threads,
+        "subprocesses": _child_processes(),
+        "memory": memory,
+    }
+
+
+def profile(seconds: float = 10.0, interval: float = 0.01, trace_memory: bool = False) -> Dict:
+    """Profile the process for `seconds`; one profile at a time"""
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        # Allocation tracing costs while active, so it only runs during the window
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        try:
+            stacks, samples = sample_stacks(seconds, interval)
+            allocations = None
+            if trace_memory:
+                stats = tracemalloc.take_snapshot().statistics("lineno")[:25]
+                allocations = [{"location": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1),
+                                "count": stat.count} for stat in stats]
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        snapshot = process_snapshot()
+        snapshot["memory"]["allocations"] = allocations
+    finally:
+        _profile_lock.release()
+
+    return {
+        "seconds": seconds,
+        "interval": interval,
+        "samples": samples,
+        # "thread;outer;...;inner count" lines (flamegraph.pl, speedscope, inferno)
+        "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+        "snapshot": snapshot,
+    }
+
+
+class ProfileRequests:
+    """Profile requests of the API process, answered by the download worker processes
+    through the shared task database"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db = SQLiteDatabase(db_path or settings.task_db)
+        self.db.conn().executescript("""
+            CREATE TABLE IF NOT EXISTS profile_requests (
+                request_id TEXT PRIMARY KEY,
+                seconds    REAL NOT NULL,
+                interval   REAL NOT NULL,
+                memory     INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS profile_results (
+                request_id TEXT NOT NULL,
+                worker     TEXT NOT NULL,
+                result     TEXT NOT NULL,
+                PRIMARY KEY (request_id, worker)
+            );
+            CREATE TABLE IF NOT EXISTS profile_responders (
+                worker  TEXT PRIMARY KEY,
+                seen_at REAL NOT NULL
+            );
+        """)
+
+    def submit(self, seconds: float, interval: float, memory: bool) -> tuple:
+        """Ask all live workers for a profile; returns (request ID, workers expected to answer)"""
+        request_id = uuid.uuid4().hex
+        now = time.time()
+        with self.db.transaction() as conn:
+            # Old requests and workers that stopped polling are dropped here
+            expired = [row[0] for row in conn.execute(
+                "SELECT request_id FROM profile_requests WHERE created_at < ?", (now - 600,))]
+            conn.executemany("DELETE FROM profile_results WHERE request_id = ?", [(r,) for r in expired])
+            conn.execute("DELETE FROM profile_requests WHERE created_at < ?", (now - 600,))
+            conn.execute("DELETE FROM profile_responders WHERE seen_at < ?", (now - RESPONDER_TTL,))
+            workers = [row[0] for row in conn.execute("SELECT worker FROM profile_responders")]
+            conn.execute(
+                "INSERT INTO profile_requests (request_id, seconds, interval, memory, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (request_id, seconds, interval, int(memory), now)
+            )
+        return request_id, workers
+
+    def withdraw(self, request_id: str):
+        self.db.conn().execute("DELETE FROM profile_requests WHERE request_id = ?", (request_id,))
+
+    def poll(self, worker: str) -> Optional[Dict]:
+        """Mark the worker as alive and return the oldest open request it has not answered"""
+        now = time.time()
+        conn = self.db.conn()
+        conn.execute("INSERT OR REPLACE INTO profile_responders (worker, seen_at) VALUES (?, ?)", (worker, now))
+        row = conn.execute(
+            "SELECT request_id, seconds, interval, memory FROM profile_requests r"
+            " WHERE created_at + seconds > ? AND NOT EXISTS ("
+            "   SELECT 1 FROM profile_results WHERE request_id = r.request_id AND worker = ?)"
+            " ORDER BY created_at LIMIT 1",
+            (now, worker)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"request_id": row[0], "seconds": row[1], "interval": row[2], "memory": bool(row[3])}
+
+    def answer(self, request_id: str, worker: str, result: Dict):
+        self.db.conn().execute(
+            "INSERT OR REPLACE INTO profile_results (request_id, worker, result) VALUES (?, ?, ?)",
+            (request_id, worker, json.dumps(result))
+        )
+
+    def collect(self, request_id: str, workers: List[str], timeout: float) -> Dict[str, Dict]:
+        """Wait up to `timeout` seconds for the answers of `workers`"""
+        deadline = time.time() + timeout
+        results: Dict[str, Dict] = {}
+        while True:
+            for worker, result in self.db.conn().execute(
+                    "SELECT worker, result FROM profile_results WHERE request_id = ?", (request_id,)):
+                results[worker] = json.loads(result)
+            if set(workers) <= set(results) or time.time() >= deadline:
+                return results
+            time.sleep(0.2)
+
+
+class ProfileResponder(threading.Thread):
+    """Answers profile requests inside a download worker process"""
+
+    def __init__(self, worker: str, requests: Optional[ProfileRequests] = None, poll_interval: float = RESPONDER_POLL):
+        super().__init__(daemon=True, name="profile-responder")
+        self.worker = worker
+        self.requests = requests or ProfileRequests()
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                request = self.requests.poll(self.worker)
+                if request is None:
+                    continue
+                try:
+                    result = profile(request["seconds"], request["interval"], request["memory"])
+                except ProfilerBusy:
+                    result = {"error": "busy"}
+                self.requests.answer(request["request_id"], self.worker, result)
+            except Exception as e:
+                logging.error(f"Error answering a profile request in worker {self.worker}: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def profile_all(seconds: float = 10.0, interval: float = 0.01, trace_memory: bool = False,
+                requests: Optional[ProfileRequests] = None) -> Dict:
+    """Profile this process and every download worker process for the same window;
+    collapsed stacks are prefixed with the process they were sampled in"""
+    requests = requests or ProfileRequests()
+    request_id, workers = requests.submit(seconds, interval, trace_memory)
+    try:
+        result = profile(seconds, interval, trace_memory)
+    except ProfilerBusy:
+        requests.withdraw(request_id)
+        raise
+    # Workers start sampling up to one poll interval later
+    answers = requests.collect(request_id, workers, timeout=2 * RESPONDER_POLL + 2.0) if workers else {}
+
+    lines = [f"api {os.getpid()};{line}" for line in result["collapsed"].splitlines()]
+    for worker, answer in sorted(answers.items()):
+        lines.extend(f"worker {worker};{line}" for line in answer.get("collapsed", "").splitlines())
+    result["collapsed"] = "\n".join(lines)
+    result["workers"] = {worker: {key: value for key, value in answer.items() if key != "collapsed"}
+                         for worker, answer in answers.items()}
+    result["missing_workers"] = sorted(set(workers) - set(answers))
+    return result
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend Settings
+Runtime configuration read from MEDIATHEK_* environment variables
+"""
+
+import os
+from dataclasses import dataclass
+
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class Settings:
+    """Backend configuration (defaults suit the single-process dev setup)"""
+    data_dir: str
+    embedded_workers: int
+    download_workers: int
+    api_workers: int
+    offline: bool
+    update_check_interval: int
+    log_level: str
+    log_file: str
+    log_max_bytes: int
+    log_backups: int
+    log_rotate_when: str
+    task_logs: bool
+    media_store_dir: str
+    media_quota_mb: int
+    scratch_dir: str
+    min_free_mb: int
+    debug_token: str
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        data_dir = os.environ.get("MEDIATHEK_DATA_DIR", os.path.join(backend_dir, "data"))
+        return cls(
+            data_dir=data_dir,
+            # Download threads started inside the API process (0 = separate worker processes)
+            embedded_workers=_env_int("MEDIATHEK_EMBEDDED_WORKERS", 4),
+            download_workers=_env_int("MEDIATHEK_DOWNLOAD_WORKERS", os.cpu_count() or 2),
+            # Each API worker is a full process; request handling is light, so few are enough
+            api_workers=_env_int("MEDIATHEK_API_WORKERS", min(4, os.cpu_count() or 2)),
+            # Skip network checks on startup (package updates, browser detection)
+            offline=_env_bool("MEDIATHEK_OFFLINE", False),
+            # Hours between package update checks
+            update_check_interval=_env_int("MEDIATHEK_UPDATE_INTERVAL", 24),
+            log_level=os.environ.get("MEDIATHEK_LOG_LEVEL", "INFO").upper(),
+            # "{pid}" is replaced per process (several processes must not rotate one file)
+            log_file=os.environ.get("MEDIATHEK_LOG_FILE", "downloader.log"),
+            log_max_bytes=_env_int("MEDIATHEK_LOG_MAX_BYTES", 10 * 1024 * 1024),
+            log_backups=_env_int("MEDIATHEK_LOG_BACKUPS", 5),
+            log_rotate_when=os.environ.get("MEDIATHEK_LOG_ROTATE_WHEN", "midnight"),
+            # Additionally write one log file per task (logging/tasks/<task_id>.log)
+            task_logs=_env_bool("MEDIATHEK_TASK_LOGS", False),
+            # Content-addressed media store; output folders receive hardlinks into it
+            media_store_dir=os.environ.get("MEDIATHEK_MEDIA_STORE_DIR", os.path.join(data_dir, "media")),
+            # LRU eviction above this size (0 = media store disabled)
+            media_quota_mb=_env_int("MEDIATHEK_MEDIA_QUOTA_MB", 20 * 1024),
+            # Partial downloads and merges (finished files are moved out); on disk by default,
+            # a fast local disk or tmpfs only when configured
+            scratch_dir=os.environ.get("MEDIATHEK_SCRATCH_DIR") or data_dir,
+            # Space kept free on every volume when admitting downloads
+            min_free_mb=_env_int("MEDIATHEK_MIN_FREE_MB", 1024),
+            # Enables /api/debug/* for requests with this X-Debug-Token (empty = disabled)
+            debug_token=os.environ.get("MEDIATHEK_DEBUG_TOKEN", ""),
+        )
+
+    @property
+    def task_db(self) -> str:
+        return os.path.join(self.data_dir, "tasks.db")
+
+
+settings = Settings.from_env()
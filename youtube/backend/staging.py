@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scratch Staging
+yt-dlp downloads and merges in a local scratch directory; only finished files
+are moved into the output folder, each in one atomic step
+"""
+
+import os
+import uuid
+import shutil
+import logging
+from typing import Iterable, List, Tuple
+
+from settings import settings
+
+
+def scratch_root() -> str:
+    # Own subdirectory: cleanup must never touch other data in the configured directory
+    return os.path.join(settings.scratch_dir, "mediathek-scratch")
+
+
+def work_dir(task_id: str, idx: int) -> str:
+    """Scratch directory of one URL of a task (kept across attempts so .part files resume)"""
+    path = os.path.join(scratch_root(), task_id, str(idx))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def remove_work_dir(path: str):
+    """Delete a URL's scratch directory and its task directory once empty"""
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass  # other URLs of the task still staged
+
+
+def remove_task_dir(task_id: str):
+    """Delete all scratch data of a task (cancelled tasks)"""
+    shutil.rmtree(os.path.join(scratch_root(), task_id), ignore_errors=True)
+
+
+def move_atomic(src: str, dest: str):
+    """Move src to dest so that dest appears complete or not at all"""
+    try:
+        os.replace(src, dest)
+        return
+    except OSError:
+        pass  # different file system
+    # Copy next to the destination under a hidden name, then rename in place
+    tmp = os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.remove(src)
+
+
+def publish(path: str, output_path: str, extensions: Tuple[str, ...]) -> List[str]:
+    """Move finished files with the given extensions from a scratch directory into output_path"""
+    os.makedirs(output_path, exist_ok=True)
+    published = []
+    for name in sorted(os.listdir(path)):
+        if not name.lower().endswith(extensions):
+            continue  # .part files, fragments, thumbnails, ...
+        dest = os.path.join(output_path, name)
+        move_atomic(os.path.join(path, name), dest)
+        published.append(dest)
+    return published
+
+
+def cleanup_stale(active_task_ids: Iterable[str]) -> int:
+    """Remove scratch data of tasks that are no longer queued, running or paused (after crashes)"""
+    root = scratch_root()
+    if not os.path.isdir(root):
+        return 0
+    active = set(active_task_ids)
+    removed = 0
+    for name in os.listdir(root):
+        if name in active:
+            continue  # requeued or paused task: its .part files are resumed
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        removed += 1
+    if removed:
+        logging.info(f"Removed scratch data of {removed} stale task(s)")
+    return removed
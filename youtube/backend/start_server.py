@@ -6,6 +6,11 @@ Start the MediathekManagement-Tool Backend API Server
 
 import os
 import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
 import logging
 
 # Setup logging
@@ -18,18 +23,42 @@ logging.basicConfig(
 backend_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, backend_dir)
 
-if __name__ == "__main__":
+def parse_args():
+    parser = argparse.ArgumentParser(description="MediathekManagement-Tool backend server")
+    parser.add_argument("--production", action="store_true",
+                        help="multiple API workers without reload, downloads in separate worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--api-workers", type=int, default=None,
+                        help="API worker processes in production mode (default: MEDIATHEK_API_WORKERS or CPU count, at most 4)")
+    parser.add_argument("--download-workers", type=int, default=None,
+                        help="download worker processes in production mode (default: MEDIATHEK_DOWNLOAD_WORKERS or CPU count)")
+    parser.add_argument("--offline", action="store_true",
+                        help="skip network checks on startup (package updates, browser detection)")
+    parser.add_argument("--force-update-check", action="store_true",
+                        help="check for package updates even if the cached result is recent")
+    return parser.parse_args()
+
+
+def wait_for_port(port: int, timeout: float = 60) -> bool:
+    """Wait until the server accepts connections"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def deferred_startup_checks(args):
+    """Browser detection and package updates, run after the server is listening"""
     from package_updater import PackageUpdater
     from browser_manager import BrowserCookieManager
+    from task_store import TaskStore
     
-    # Check for updates on startup
-    logging.info("=== MediathekManagement-Tool Backend Starting ===")
-    
-    updates_installed = PackageUpdater.check_and_update_packages()
-    
-    if updates_installed:
-        logging.info("Updates installed. Restarting...")
-        PackageUpdater.restart_application()
+    wait_for_port(args.port)
     
     # Detect browser
     cookie_mgr = BrowserCookieManager()
@@ -41,7 +70,75 @@ if __name__ == "__main__":
     else:
         logging.info(f"Browser detected: {browser}")
     
-    # Start server
+    # Check for updates (cached; restart only once no download is queued or running)
+    if PackageUpdater.check_and_update_packages(force=args.force_update_check):
+        store = TaskStore()
+        PackageUpdater.restart_when_idle(lambda: store.count_active() == 0)
+
+
+def production_env():
+    """Environment of production mode; must be set before settings.py is first imported"""
+    os.environ["MEDIATHEK_EMBEDDED_WORKERS"] = "0"
+    os.environ.setdefault("MEDIATHEK_LOG_FILE", "downloader.{pid}.log")
+
+
+def run_production(args):
+    """Run N API workers (no reload) plus a dedicated set of download worker processes"""
     import uvicorn
-    logging.info("Starting API server on http://localhost:8000")
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
+    from settings import settings
+    from log_setup import prune_process_logs
+    
+    # Per-process log files of earlier runs are never rotated away by the new processes
+    removed = prune_process_logs()
+    if removed:
+        logging.info(f"Deleted {removed} log file(s) of earlier server processes")
+    
+    api_workers = args.api_workers or settings.api_workers
+    download_workers = args.download_workers or settings.download_workers
+    
+    # API workers only serve requests; downloads run in worker.py processes.
+    # Both share task state through the SQLite task store. The environment was
+    # prepared before settings were loaded (see production_env); with a single API
+    # worker uvicorn serves in this process, so the loaded settings must agree.
+    settings.embedded_workers = 0
+    worker_proc = subprocess.Popen(
+        [sys.executable, os.path.join(backend_dir, "worker.py"), "--processes", str(download_workers)],
+        cwd=backend_dir
+    )
+    logging.info(f"Started {download_workers} download worker process(es) (PID {worker_proc.pid})")
+    
+    try:
+        logging.info(f"Starting API server on http://localhost:{args.port} with {api_workers} worker(s)")
+        uvicorn.run("api:app", host=args.host, port=args.port, workers=api_workers, reload=False)
+    finally:
+        worker_proc.terminate()
+        worker_proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.production:
+        production_env()
+    
+    from package_updater import PackageUpdater
+    from settings import settings
+    
+    logging.info("=== MediathekManagement-Tool Backend Starting ===")
+    
+    # Serve immediately; network checks run in the background
+    settings.offline = settings.offline or args.offline
+    if settings.offline:
+        logging.info("Offline mode: skipping update check and browser detection")
+    else:
+        threading.Thread(target=deferred_startup_checks, args=(args,), daemon=True).start()
+    
+    # Start server
+    if args.production:
+        run_production(args)
+    else:
+        import uvicorn
+        logging.info(f"Starting API server on http://localhost:{args.port}")
+        uvicorn.run("api:app", host=args.host, port=args.port, reload=True)
+    
+    if PackageUpdater.restart_requested:
+        PackageUpdater.restart_application()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Task Store
+Shared SQLite (WAL mode) storage for download tasks and the download queue,
+so any API worker can serve the status of any task
+"""
+
+import json
+import time
+import logging
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+from db import SQLiteDatabase
+from downloader import DownloadStatus
+from settings import settings
+
+
+RUNNING_STATUSES = ("starting", "waiting", "downloading")
+
+# A running task whose worker has not renewed its lease for this long is considered orphaned
+TASK_LEASE = 30.0
+
+
+@dataclass
+class TaskRecord:
+    """Queued download task as stored in the database"""
+    task_id: str
+    kind: str  # video, audio
+    format: str
+    output_path: str
+    urls: List[str]
+    options: Dict
+
+
+class TaskStore:
+    """Download task state and queue backed by SQLite in WAL mode"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db = SQLiteDatabase(db_path or settings.task_db)
+        self._conn = self.db.conn
+        self._init_schema()
+
+    def _init_schema(self):
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id     TEXT PRIMARY KEY,
+                kind        TEXT NOT NULL,
+                format      TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                urls        TEXT NOT NULL,
+                options     TEXT NOT NULL DEFAULT '{}',
+                status      TEXT NOT NULL,
+                state       TEXT NOT NULL,
+                worker      TEXT,
+                control     TEXT,
+                heartbeat_at REAL,
+                not_before  REAL,
+                created_at  REAL NOT NULL,
+                updated_at  REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, created_at);
+        """)
+        columns = [row[1] for row in self._conn().execute("PRAGMA table_info(tasks)")]
+        if "control" not in columns:  # databases created before pause/cancel
+            self._conn().execute("ALTER TABLE tasks ADD COLUMN control TEXT")
+        if "heartbeat_at" not in columns:  # databases created before task leases
+            self._conn().execute("ALTER TABLE tasks ADD COLUMN heartbeat_at REAL")
+        if "not_before" not in columns:  # databases created before waiting tasks were requeued
+            self._conn().execute("ALTER TABLE tasks ADD COLUMN not_before REAL")
+
+    def create_task(self, kind: str, format: str, output_path: str, urls: List[str],
+                    status: DownloadStatus, options: Optional[Dict] = None):
+        """Insert a new task; it is queued until a worker claims it"""
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO tasks (task_id, kind, format, output_path, urls, options, status, state,"
+            " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (status.task_id, kind, format, output_path, json.dumps(urls),
+             json.dumps(options or {}), status.status, json.dumps(asdict(status)), now, now)
+        )
+
+    def claim_next(self, worker_id: str) -> Optional[TaskRecord]:
+        """Atomically take the oldest queued task (or waiting task whose retry delay is over)"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT task_id, kind, format, output_path, urls, options FROM tasks"
+                " WHERE status = 'queued' OR (status = 'waiting' AND worker IS NULL AND not_before <= ?)"
+                " ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'starting', worker = ?, heartbeat_at = ?, updated_at = ? WHERE task_id = ?",
+                (worker_id, now, now, row[0])
+            )
+        return TaskRecord(
+            task_id=row[0], kind=row[1], format=row[2], output_path=row[3],
+            urls=json.loads(row[4]), options=json.loads(row[5])
+        )
+
+    def save_status(self, status: DownloadStatus):
+        """Persist the current status of a task"""
+        self._conn().execute(
+            "UPDATE tasks SET status = ?, state = ?, updated_at = ? WHERE task_id = ?",
+            (status.status, json.dumps(asdict(status)), time.time(), status.task_id)
+        )
+
+    def heartbeat(self, task_id: str):
+        """Renew the lease of a running task (its worker is alive)"""
+        self._conn().execute("UPDATE tasks SET heartbeat_at = ? WHERE task_id = ?", (time.time(), task_id))
+
+    def defer(self, task_id: str, delay: float):
+        """Give a waiting task's worker slot back; the task is claimed again after `delay` seconds"""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE tasks SET worker = NULL, heartbeat_at = NULL, not_before = ?, updated_at = ?"
+            " WHERE task_id = ? AND status = 'waiting'",
+            (now + delay, now, task_id)
+        )
+
+    def load_status(self, task_id: str) -> Optional[DownloadStatus]:
+        row = self._conn().execute(
+            "SELECT status, state FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status = DownloadStatus(**json.loads(row[1]))
+        status.status = row[0]  # queue transitions only update the column
+        return status
+
+    def request_control(self, task_id: str, action: str) -> Optional[str]:
+        """Cancel, pause or resume a task; returns the resulting status (None: unknown task).
+        Queued and paused tasks change at once, running tasks get a control request their
+        worker acts on ("cancelling"/"pausing" is returned then)."""
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT status, worker FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            current = row[0]
+            deferred = current == "waiting" and row[1] is None  # waiting for disk space, no worker
+            if action == "resume":
+                if current != "paused":
+                    return current
+                new_status = "queued"
+            elif current in ("queued", "paused") or deferred:
+                new_status = "cancelled" if action == "cancel" else "paused"
+            elif current in RUNNING_STATUSES:
+                conn.execute(
+                    "UPDATE tasks SET control = ?, updated_at = ? WHERE task_id = ?",
+                    (action, time.time(), task_id)
+                )
+                return "cancelling" if action == "cancel" else "pausing"
+            else:
+                return current
+            conn.execute(
+                "UPDATE tasks SET status = ?, control = NULL, worker = NULL, updated_at = ? WHERE task_id = ?",
+                (new_status, time.time(), task_id)
+            )
+        return new_status
+
+    def get_control(self, task_id: str) -> Optional[str]:
+        """Pending control request of a running task (cancel, pause)"""
+        row = self._conn().execute("SELECT control FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row[0] if row else None
+
+    def clear_control(self, task_id: str):
+        self._conn().execute("UPDATE tasks SET control = NULL WHERE task_id = ?", (task_id,))
+
+    def count_active(self) -> int:
+        """Number of tasks that are queued or running"""
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM tasks WHERE status IN ('queued', 'starting', 'waiting', 'downloading')"
+        ).fetchone()[0]
+
+    def active_task_ids(self) -> List[str]:
+        """IDs of tasks that are queued, running or paused (paused tasks keep their scratch data)"""
+        rows = self._conn().execute(
+            "SELECT task_id FROM tasks WHERE status IN ('queued', 'starting', 'waiting', 'downloading', 'paused')"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def requeue_interrupted(self, lease: float = TASK_LEASE) -> int:
+        """Put tasks whose worker died (lease expired) back into the queue; tasks of live
+        workers, e.g. worker processes running next to a restarted API, and waiting tasks
+        without a worker (see defer) are left alone"""
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE tasks SET status = CASE control WHEN 'cancel' THEN 'cancelled'"
+            " WHEN 'pause' THEN 'paused' ELSE 'queued' END, control = NULL, worker = NULL, updated_at = ?"
+            " WHERE status IN ('starting', 'waiting', 'downloading') AND worker IS NOT NULL"
+            " AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            (now, now - lease)
+        )
+        if cur.rowcount:
+            logging.info(f"Requeued {cur.rowcount} interrupted task(s)")
+        return cur.rowcount
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+Test setup: the backend modules are imported from the parent directory, and their
+module-level singletons (task store, media store, ...) use a throwaway data directory
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Must be set before the first backend import: settings are read once
+os.environ["MEDIATHEK_DATA_DIR"] = tempfile.mkdtemp(prefix="mediathek-tests-")
+os.environ.setdefault("MEDIATHEK_SCRATCH_DIR", os.environ["MEDIATHEK_DATA_DIR"])
+os.environ["MEDIATHEK_EMBEDDED_WORKERS"] = "0"
+os.environ["MEDIATHEK_OFFLINE"] = "1"
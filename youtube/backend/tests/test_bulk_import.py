@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Incremental parsing of uploaded URL lists"""
+
+import pytest
+
+from bulk_import import BulkImport, MultipartFileReader, UrlLineParser, detect_kind
+
+
+def parse(kind, chunks):
+    parser = UrlLineParser(kind)
+    urls = []
+    for chunk in chunks:
+        urls += parser.feed(chunk)
+    return urls + parser.close(), parser
+
+
+def test_text_lines_split_across_chunks():
+    urls, parser = parse("text", [b"\xef\xbb\xbfhttps://youtu.be/a\nhttps://you", b"tu.be/b\r\n# comment\n\nno url\nhttps://youtu.be/c"])
+    assert urls == ["https://youtu.be/a", "https://youtu.be/b", "https://youtu.be/c"]
+    assert (parser.lines, parser.skipped) == (4, 1)
+
+
+def test_multibyte_character_split_across_chunks():
+    data = "https://example.org/ä\n".encode()
+    urls, parser = parse("text", [data[:-3], data[-3:]])
+    assert urls == ["https://example.org/ä"]
+
+
+def test_csv_takes_the_first_url_cell():
+    urls, parser = parse("csv", [b'title,url\n"Song, live",https://youtu.be/a\nhttps://youtu.be/b,x\n'])
+    assert urls == ["https://youtu.be/a", "https://youtu.be/b"]
+    assert parser.skipped == 1  # header
+
+
+def test_ndjson_objects_and_strings():
+    urls, parser = parse("ndjson", [b'{"url": "https://youtu.be/a"}\n"https://youtu.be/b"\n{broken\n{"title": "x"}\n'])
+    assert urls == ["https://youtu.be/a", "https://youtu.be/b"]
+    assert parser.skipped == 2
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        UrlLineParser("xml")
+
+
+def test_detect_kind():
+    assert detect_kind(None, "list.JSONL") == "ndjson"
+    assert detect_kind("text/csv; charset=utf-8") == "csv"
+    assert detect_kind("text/plain", "urls.txt") == "text"
+
+
+def multipart_body(boundary, parts):
+    body = b""
+    for headers, data in parts:
+        body += b"--" + boundary + b"\r\n" + headers + b"\r\n\r\n" + data + b"\r\n"
+    return body + b"--" + boundary + b"--\r\n"
+
+
+def test_multipart_reader_passes_through_the_file_field_only():
+    boundary = b"----xyz"
+    body = multipart_body(boundary, [
+        (b'Content-Disposition: form-data; name="format"', b"mp4"),
+        (b'Content-Disposition: form-data; name="file"; filename="urls.csv"\r\nContent-Type: text/csv',
+         b"https://youtu.be/a\nhttps://youtu.be/b"),
+        (b'Content-Disposition: form-data; name="file"; filename="second.txt"', b"https://youtu.be/c"),
+    ])
+    reader = MultipartFileReader("multipart/form-data; boundary=----xyz")
+    data = []
+    for start in range(0, len(body), 7):  # small pieces split headers and boundaries
+        data += reader.feed(body[start:start + 7])
+    data += reader.close()
+    assert b"".join(data) == b"https://youtu.be/a\nhttps://youtu.be/b"
+    assert reader.found and reader.filename == "urls.csv" and reader.content_type == "text/csv"
+
+
+def test_multipart_reader_without_file_field():
+    reader = MultipartFileReader('multipart/form-data; boundary="b"')
+    data = reader.feed(multipart_body(b"b", [(b'Content-Disposition: form-data; name="other"', b"x")]))
+    assert data + reader.close() == [] and not reader.found
+
+
+def test_multipart_boundary_missing():
+    with pytest.raises(ValueError):
+        MultipartFileReader("multipart/form-data")
+
+
+def test_bulk_import_deduplicates_and_chunks():
+    bulk = BulkImport("i1", "video", "mp4", "/tmp/out", "text", chunk_size=2)
+    chunks = bulk.feed(b"https://youtu.be/dQw4w9WgXcQ\nhttps://www.youtube.com/watch?v=dQw4w9WgXcQ\n"
+                       b"https://youtu.be/aaaaaaaaaaa\nhttps://youtu.be/bbbbbbbbbbb\n")
+    assert len(chunks) == 1 and len(chunks[0]) == 2
+    assert [len(chunk) for chunk in bulk.finish()] == [1]
+    assert bulk.duplicates == 1
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Requirement parsing and PEP 440 version checks"""
+
+import pytest
+from packaging.specifiers import SpecifierSet
+
+from dependency_checker import parse_requirement, version_satisfies
+
+
+@pytest.mark.parametrize("line, name, specifier", [
+    ("fastapi>=0.104.0", "fastapi", ">=0.104.0"),
+    ("yt-dlp >= 2024.12.0  # comment", "yt-dlp", ">=2024.12.0"),
+    ("uvicorn[standard]>=0.24,<1", "uvicorn", "<1,>=0.24"),
+    ("pydantic", "pydantic", ""),
+    ('packaging>=21.0; python_version >= "3.8"', "packaging", ">=21.0"),
+])
+def test_parse_requirement(line, name, specifier):
+    assert parse_requirement(line) == (name, SpecifierSet(specifier))
+
+
+@pytest.mark.parametrize("installed, specifier, expected", [
+    ("2.0.0", ">=2.0.0", True),
+    ("2.0.0rc1", ">=2.0.0", False),  # a pre-release is older than the release
+    ("2.1.0rc1", ">=2.0.0", True),  # installed pre-releases are accepted
+    ("1.10.0", ">=1.9", True),  # numeric, not string comparison
+    ("1.9.0", ">=1.10", False),
+    ("2.0", "==2.0.0", True),
+    ("1!1.0", ">=2.0", True),  # epoch
+    ("2.0.post1", ">=2.0", True),
+    ("2.0.post1", ">2.0", False),  # > excludes post-releases of the given version
+    ("1.4.5", "~=1.4.2", True),
+    ("1.5.0", "~=1.4.2", False),
+    ("1.9", "~=1.4", True),
+    ("2.0", "~=1.4", False),
+    ("1.5.3", "==1.5.*", True),
+    ("1.6.0", "==1.5.*", False),
+    ("1.5.3", "!=1.5.*", False),
+    ("2024.12.13", ">=2024.12.0,<2025", True),
+    ("0.110.0", "", True),
+    ("not-a-version", ">=1.0", False),
+])
+def test_version_satisfies(installed, specifier, expected):
+    assert version_satisfies(installed, SpecifierSet(specifier)) is expected
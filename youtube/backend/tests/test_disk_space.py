@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Disk space reservations shared by all downloads"""
+
+import shutil
+
+import pytest
+
+from disk_space import InsufficientSpace, SpaceReservations
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def reservations(tmp_path):
+    return SpaceReservations(str(tmp_path / "tasks.db"), min_free_mb=0)
+
+
+def free(path):
+    return shutil.disk_usage(path).free
+
+
+def test_reservations_on_one_volume_add_up(reservations, tmp_path):
+    half = free(tmp_path) // 2 + MB
+    assert reservations.try_reserve("t1", {str(tmp_path): half}) is None
+    shortfall = reservations.try_reserve("t2", {str(tmp_path): half})
+    assert shortfall.startswith("Warte auf freien Speicherplatz")
+    reservations.release("t1")
+    assert reservations.try_reserve("t2", {str(tmp_path): half}) is None
+
+
+def test_paths_on_one_volume_are_summed(reservations, tmp_path):
+    half = free(tmp_path) // 2 + MB
+    # The output folder does not exist yet: its nearest existing parent decides the volume
+    assert reservations.try_reserve("t1", {str(tmp_path / "out" / "new"): half, str(tmp_path): half}) is not None
+
+
+def test_written_bytes_no_longer_count_as_reserved(reservations, tmp_path):
+    half = free(tmp_path) // 2 + MB
+    reservations.try_reserve("t1", {str(tmp_path): half})
+    reservations.record_written("t1", str(tmp_path), half)
+    assert reservations.try_reserve("t2", {str(tmp_path): half}) is None
+
+
+def test_more_than_the_volume_fails(reservations, tmp_path):
+    with pytest.raises(InsufficientSpace):
+        reservations.try_reserve("t1", {str(tmp_path): shutil.disk_usage(tmp_path).total + 1})
+
+
+def test_min_free_space_is_kept(tmp_path):
+    reservations = SpaceReservations(str(tmp_path / "tasks.db"), min_free_mb=free(tmp_path) // MB)
+    assert reservations.try_reserve("t1", {str(tmp_path): 2 * MB}) is not None
+
+
+def test_release_stale(reservations, tmp_path):
+    reservations.try_reserve("t1", {str(tmp_path): MB})
+    reservations.try_reserve("t2", {str(tmp_path): MB})
+    assert reservations.release_stale(["t2"]) == 1
+    assert reservations.release_stale(["t2"]) == 0
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Audio targets and the local audio conversion of downloaded media"""
+
+import shutil
+import subprocess
+import time
+
+import pytest
+
+import downloader
+from downloader import (AudioDownloader, AudioTarget, CombinedDownloader, DownloadStatus, audio_target_paths,
+                        parse_audio_targets)
+from failed_ledger import failed_ledger
+from tool_registry import ToolInfo
+
+FFMPEG = shutil.which("ffmpeg")
+
+
+def make(cls, tmp_path, task_id, **kwargs):
+    status = DownloadStatus(task_id=task_id, total_files=1, status="downloading")
+    return cls(["https://youtu.be/dQw4w9WgXcQ"], "mp3", str(tmp_path), status, **kwargs)
+
+
+def test_failed_conversion_is_recorded_under_the_task_kind(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader.tool_registry, "get", lambda name: ToolInfo(name=name))
+    source = tmp_path / "clip.webm"
+    source.write_bytes(b"")
+    targets = parse_audio_targets(["mp3", "flac"])
+    for cls, task_id in ((CombinedDownloader, "combined-1"), (AudioDownloader, "audio-1")):
+        loader = make(cls, tmp_path, task_id)
+        assert not loader._transcode_audio("https://youtu.be/dQw4w9WgXcQ", str(source), str(tmp_path / "clip"), targets)
+        rows = failed_ledger.query(task_id=task_id)
+        assert [(row["download_type"], row["format"]) for row in rows] == [(cls.kind, "mp3, flac")]
+        assert loader.status.failed_urls == ["https://youtu.be/dQw4w9WgXcQ"]
+
+
+def test_parse_audio_targets():
+    targets = parse_audio_targets(["MP3:320k", "mp3:128", " opus:96k ", "flac", "mp3:320k"])
+    assert targets == [AudioTarget("mp3", 320), AudioTarget("mp3", 128), AudioTarget("opus", 96), AudioTarget("flac")]
+    assert [target.spec for target in targets] == ["mp3:320k", "mp3:128k", "opus:96k", "flac"]
+    assert targets[0].encoder_args() == ["-c:a", "libmp3lame", "-b:a", "320k"]
+    assert AudioTarget("mp3").encoder_args() == ["-c:a", "libmp3lame", "-q:a", "0"]
+
+
+@pytest.mark.parametrize("specs", [[], ["ogg"], ["mp3:fast"], ["flac:320k"], ["mp3:500k"], ["opus:16k"]])
+def test_invalid_audio_targets(specs):
+    with pytest.raises(ValueError):
+        parse_audio_targets(specs)
+
+
+def test_audio_target_paths_add_the_bitrate_only_where_needed():
+    paths = audio_target_paths("/out/Song", parse_audio_targets(["mp3:320k", "mp3:128k", "mp3", "opus:96k", "flac"]))
+    assert [path for _, path in paths] == [
+        "/out/Song [320k].mp3", "/out/Song [128k].mp3", "/out/Song.mp3", "/out/Song.opus", "/out/Song.flac"
+    ]
+
+
+def test_conversion_timeout_stops_ffmpeg(tmp_path, monkeypatch):
+    fake = tmp_path / "ffmpeg"
+    fake.write_text("#!/bin/sh\nsleep 60\n")
+    fake.chmod(0o755)
+    monkeypatch.setattr(downloader.tool_registry, "get", lambda name: ToolInfo(name=name, available=True, path=str(fake)))
+    loader = make(AudioDownloader, tmp_path, "timeout-1")
+    loader.transcode_timeout = 0.5
+    started = time.time()
+    assert not loader._transcode_audio("https://youtu.be/dQw4w9WgXcQ", str(fake), str(tmp_path / "clip"),
+                                       parse_audio_targets(["mp3"]))
+    assert time.time() - started < 15
+    rows = failed_ledger.query(task_id="timeout-1")
+    assert len(rows) == 1 and "Zeitlimit" in rows[0]["error"]
+
+
+@pytest.mark.skipif(FFMPEG is None, reason="ffmpeg not installed")
+def test_thumbnail_is_embedded_where_the_format_supports_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader.tool_registry, "get", lambda name: ToolInfo(name=name, available=True, path=FFMPEG))
+    source, thumbnail = str(tmp_path / "Song.source.webm"), str(tmp_path / "Song.source.jpg")
+    subprocess.run([FFMPEG, "-v", "error", "-f", "lavfi", "-i", "sine=d=1", "-c:a", "libopus", source], check=True)
+    subprocess.run([FFMPEG, "-v", "error", "-f", "lavfi", "-i", "color=red:s=32x32", "-frames:v", "1", thumbnail],
+                   check=True)
+    loader = make(AudioDownloader, tmp_path, "cover-1")
+    assert loader._transcode_audio("https://youtu.be/dQw4w9WgXcQ", source, str(tmp_path / "Song"),
+                                   parse_audio_targets(["mp3", "m4a", "flac", "opus", "wav"]), thumbnail)
+    for ext, cover in (("mp3", True), ("m4a", True), ("flac", True), ("opus", False), ("wav", False)):
+        probe = subprocess.run([FFMPEG, "-hide_banner", "-i", str(tmp_path / f"Song.{ext}")],
+                               capture_output=True, text=True).stderr
+        assert ("attached pic" in probe) == cover, ext
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Range requests and ZIP streams of finished downloads"""
+
+import io
+import os
+import zipfile
+from typing import Optional
+
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.testclient import TestClient
+
+from file_delivery import RangeFileResponse, RangeNotSatisfiable, parse_range, zip_stream
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=990-2000", (990, 999)),  # end is clamped to the file
+    ("bytes=-100", (900, 999)),  # suffix: last 100 bytes
+    ("bytes=-5000", (0, 999)),  # suffix longer than the file
+    ("bytes=0-0", (0, 0)),
+    ("bytes=-", None),  # malformed: whole file
+    ("bytes=0-10,20-30", None),  # multi-range: whole file
+    ("items=0-10", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=500-100", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, SIZE)
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(bytes(range(256)) * 4)  # 1024 bytes
+    app = FastAPI()
+
+    @app.get("/file")
+    def get_file(range_header: Optional[str] = Header(None, alias="Range")):
+        return RangeFileResponse(str(path), range_header)
+
+    return TestClient(app), path.read_bytes()
+
+
+def test_whole_file(client):
+    client, data = client
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == data
+
+
+def test_partial_content(client):
+    client, data = client
+    response = client.get("/file", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/1024"
+    assert response.headers["content-length"] == "10"
+    assert response.content == data[10:20]
+
+
+def test_suffix_range(client):
+    client, data = client
+    response = client.get("/file", headers={"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 1000-1023/1024"
+    assert response.content == data[-24:]
+
+
+def test_range_not_satisfiable(client):
+    client, _ = client
+    response = client.get("/file", headers={"Range": "bytes=2048-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+    assert response.content == b""
+
+
+def test_zip_stream_builds_a_valid_archive(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    files = [tmp_path / "a" / "song.mp3", tmp_path / "b" / "song.mp3", tmp_path / "a" / "video.mp4"]
+    contents = [b"first", b"second", os.urandom(3 * 1024 * 1024)]  # several read chunks
+    for path, data in zip(files, contents):
+        path.write_bytes(data)
+    pieces = list(zip_stream(str(path) for path in files))
+    assert len(pieces) > 1  # produced piece by piece
+    with zipfile.ZipFile(io.BytesIO(b"".join(pieces))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["song.mp3", "song (1).mp3", "video.mp4"]
+        assert [archive.read(name) for name in archive.namelist()] == contents
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+
+
+def test_zip_stream_without_files():
+    with zipfile.ZipFile(io.BytesIO(b"".join(zip_stream([])))) as archive:
+        assert archive.namelist() == []
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Stream selection for stream-copy merges and quality/size caps"""
+
+from format_planner import FormatLimits, _pick_capped, container_selector, plan_video_formats
+
+MB = 1024 * 1024
+
+
+def video(format_id, height, vcodec="avc1.640028", fps=30, vbr=None, size=None):
+    return {"format_id": format_id, "vcodec": vcodec, "acodec": "none", "height": height,
+            "fps": fps, "vbr": vbr or height * 5, "filesize": size}
+
+
+def audio(format_id, abr, acodec="mp4a.40.2", size=None):
+    return {"format_id": format_id, "vcodec": "none", "acodec": acodec, "abr": abr, "filesize": size}
+
+
+FORMATS = [
+    video("137", 1080, size=200 * MB),
+    video("136", 720, size=100 * MB),
+    video("135", 480, size=50 * MB),
+    video("248", 1080, vcodec="vp9", size=150 * MB),
+    video("299", 1080, fps=60, size=300 * MB),
+    audio("140", 128, size=10 * MB),
+    audio("251", 160, acodec="opus", size=12 * MB),
+]
+
+PREMERGED = [
+    {"format_id": "18", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "height": 360, "filesize": 20 * MB},
+    {"format_id": "22", "vcodec": "avc1.64001F", "acodec": "mp4a.40.2", "height": 720, "filesize": 60 * MB},
+]
+
+
+def test_plan_picks_best_streams_that_fit_the_container():
+    plan = plan_video_formats(FORMATS, "mp4")
+    assert plan.format_id == "299+140"  # vp9 and opus cannot be stream-copied into MP4
+    assert plan.stream_copy
+    assert plan.transcode == []
+    assert plan.selector.startswith("299+140/")
+
+
+def test_mkv_accepts_every_codec():
+    plan = plan_video_formats(FORMATS, "mkv")
+    assert plan.format_id == "299+251"
+    assert plan.stream_copy
+
+
+def test_plan_reports_the_needed_transcode():
+    plan = plan_video_formats([video("248", 1080, vcodec="vp9"), audio("251", 160, acodec="opus")], "mp4")
+    assert plan.format_id == "248+251"
+    assert not plan.stream_copy
+    assert plan.transcode == ["video vp9 → mp4", "audio opus → mp4"]
+    assert "Transcode" in plan.describe()
+
+
+def test_without_ffmpeg_only_premerged_formats_are_planned():
+    plan = plan_video_formats(FORMATS + PREMERGED, "mp4", ffmpeg_available=False)
+    assert plan.format_id == "22"
+    assert plan.audio is None
+
+
+def test_no_separate_streams_falls_back_to_premerged():
+    assert plan_video_formats(PREMERGED, "mp4").format_id == "22"
+    assert plan_video_formats([audio("140", 128)], "mp4") is None
+
+
+def test_container_selector_never_falls_back_to_audio_only():
+    assert container_selector("mp4").endswith("/bestvideo+bestaudio")
+    assert "vcodec!=none" in container_selector("mp4", ffmpeg_available=False)
+
+
+def test_height_and_fps_caps():
+    plan = plan_video_formats(FORMATS, "mp4", limits=FormatLimits(max_height=720))
+    assert plan.format_id == "136+140"
+    assert plan.limits_met
+    assert plan.saved_bytes == 200 * MB
+
+    plan = plan_video_formats(FORMATS, "mp4", limits=FormatLimits(max_fps=30))
+    assert plan.format_id == "137+140"
+
+
+def test_filesize_cap_counts_video_and_audio():
+    plan = plan_video_formats(FORMATS, "mp4", limits=FormatLimits(max_filesize=105 * MB))
+    assert plan.format_id == "135+140"  # 720p + audio would be 110 MB
+
+
+def test_unreachable_caps_fall_back_to_smallest_streams():
+    plan = plan_video_formats(FORMATS, "mp4", limits=FormatLimits(max_filesize=1 * MB))
+    assert plan.format_id == "135+140"
+    assert not plan.limits_met
+    assert "caps not reachable" in plan.describe()
+
+
+def test_preferred_codec_decides_between_equal_heights():
+    videos = [video("137", 1080), video("248", 1080, vcodec="vp9"), video("136", 720, vcodec="vp9")]
+    chosen, _, met = _pick_capped(videos, None, FormatLimits(prefer_codec="vp9"))
+    assert chosen["format_id"] == "248"
+    assert met
+    # Height still goes first
+    chosen, _, _ = _pick_capped(videos[:1] + videos[2:], None, FormatLimits(prefer_codec="vp9"))
+    assert chosen["format_id"] == "137"
+
+
+def test_bitrate_cap_may_lower_the_audio_stream():
+    videos = [video("136", 720, vbr=1000)]
+    audios = [audio("140", 128), audio("141", 256)]
+    chosen_video, chosen_audio, met = _pick_capped(videos, audios, FormatLimits(max_bitrate=1200))
+    assert (chosen_video["format_id"], chosen_audio["format_id"], met) == ("136", "140", True)
+
+
+def test_unknown_sizes_pass_the_filesize_cap():
+    formats = [video("136", 720), audio("140", 128)]
+    plan = plan_video_formats(formats, "mp4", limits=FormatLimits(max_filesize=1))
+    assert plan.limits_met
+    assert plan.estimated_size is None
+    assert plan.saved_bytes is None
+
+
+def test_premerged_fallback_respects_the_caps():
+    plan = plan_video_formats(FORMATS + PREMERGED, "mp4", ffmpeg_available=False, limits=FormatLimits(max_height=480))
+    assert plan.format_id == "18"
+    assert plan.saved_bytes == 40 * MB
+
+
+def test_limits_round_trip_and_key():
+    limits = FormatLimits(max_height=720, prefer_codec="av1")
+    assert FormatLimits.from_dict(limits.to_dict()) == limits
+    assert limits.key() == "max_height=720,prefer_codec=av1"
+    assert limits.format_sort() == "res:720,fps,br,vcodec:av01"
+    assert not FormatLimits().active
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Single-flight coalescing of identical downloads across tasks"""
+
+import threading
+
+import pytest
+
+from inflight import InflightRegistry
+
+KEY = InflightRegistry.make_key("dQw4w9WgXcQ", "video", "mp4")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return InflightRegistry(str(tmp_path / "tasks.db"), lease=30, linger=120, heartbeat_interval=60)
+
+
+def test_first_claim_wins(registry):
+    assert registry.claim(KEY, "t1", lambda: 0.0) is None
+    assert registry.claim(KEY, "t2", lambda: 0.0) == "t1"
+    # A requeued task takes its own entry back
+    assert registry.claim(KEY, "t1", lambda: 0.0) is None
+
+
+def test_follower_receives_the_files(registry, tmp_path):
+    output = tmp_path / "video.mp4"
+    output.write_bytes(b"data")
+    registry.claim(KEY, "t1", lambda: 0.0)
+    registry.complete(KEY, "t1", [str(output)])
+    assert registry.wait(KEY, "t1", lambda progress: None, poll_interval=0.01) == [str(output)]
+    # Finished entries serve late followers while the files exist
+    assert registry.claim(KEY, "t2", lambda: 0.0) == "t1"
+
+
+def test_finished_entry_with_missing_files_is_taken_over(registry, tmp_path):
+    registry.claim(KEY, "t1", lambda: 0.0)
+    registry.complete(KEY, "t1", [str(tmp_path / "deleted.mp4")])
+    assert registry.claim(KEY, "t2", lambda: 0.0) is None
+
+
+def test_release_lets_the_follower_download_itself(registry):
+    registry.claim(KEY, "t1", lambda: 0.0)
+    registry.release(KEY, "t1")
+    assert registry.wait(KEY, "t1", lambda progress: None, poll_interval=0.01) is None
+    assert registry.claim(KEY, "t2", lambda: 0.0) is None
+
+
+def test_complete_without_files_releases(registry):
+    registry.claim(KEY, "t1", lambda: 0.0)
+    registry.complete(KEY, "t1", [])
+    assert registry.claim(KEY, "t2", lambda: 0.0) is None
+
+
+def test_stalled_owner_is_taken_over(tmp_path):
+    registry = InflightRegistry(str(tmp_path / "tasks.db"), lease=-1, heartbeat_interval=60)
+    registry.claim(KEY, "t1", lambda: 0.0)
+    assert registry.wait(KEY, "t1", lambda progress: None, poll_interval=0.01) is None
+    assert registry.claim(KEY, "t2", lambda: 0.0) is None
+
+
+def test_wait_reports_progress_and_stops(registry):
+    registry.claim(KEY, "t1", lambda: 0.0)
+    stop = threading.Event()
+    seen = []
+
+    def on_progress(progress):
+        seen.append(progress)
+        stop.set()
+
+    assert registry.wait(KEY, "t1", on_progress, poll_interval=0.01, stop_event=stop) is None
+    assert seen == [0.0]
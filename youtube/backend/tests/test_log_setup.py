@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Size/time log rotation and pruning of per-process log files"""
+
+import logging
+import os
+
+import log_setup
+from log_setup import SizeAndTimeRotatingFileHandler, prune_process_logs
+
+
+def records_in(directory):
+    numbers = []
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            numbers.extend(int(line) for line in f if line.strip())
+    return sorted(numbers)
+
+
+def test_size_rollover_keeps_the_newest_records(tmp_path):
+    handler = SizeAndTimeRotatingFileHandler(str(tmp_path / "app.log"), max_bytes=200,
+                                             when="midnight", backup_count=3)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for n in range(200):
+        handler.emit(logging.makeLogRecord({"msg": f"{n:05d}"}))
+    handler.close()
+
+    assert len(os.listdir(tmp_path)) == 4  # live file + 3 backups
+    kept = records_in(tmp_path)
+    # Whatever was deleted, the remaining records are the newest ones without gaps
+    assert kept[-1] == 199
+    assert kept == list(range(kept[0], 200))
+
+
+def test_backup_names_keep_growing_after_deletions(tmp_path):
+    base = str(tmp_path / "app.log")
+    handler = SizeAndTimeRotatingFileHandler(base, max_bytes=1, when="midnight", backup_count=1)
+    first = handler.rotation_filename(base + ".2026-01-01")
+    assert first == base + ".2026-01-01"
+    open(first, "w").close()
+    assert handler.rotation_filename(base + ".2026-01-01") == base + ".2026-01-01.0001"
+    open(base + ".2026-01-01.0001", "w").close()
+    os.remove(first)
+    assert handler.rotation_filename(base + ".2026-01-01") == base + ".2026-01-01.0002"
+
+
+def test_prune_process_logs(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_setup, "log_dir", str(tmp_path))
+    own = f"downloader.{os.getpid()}.log"
+    names = ["downloader.101.log", "downloader.101.log.2026-01-01", "downloader.102.log",
+             "downloader.103.log", own, "other.log"]
+    for age, name in enumerate(names):
+        path = tmp_path / name
+        path.write_text("x")
+        os.utime(path, (1000 + age, 1000 + age))
+
+    assert prune_process_logs("downloader.{pid}.log", keep=2) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted(["downloader.102.log", "downloader.103.log", own, "other.log"])
+    # A fixed log name is rotated by its handler and left alone
+    assert prune_process_logs("downloader.log", keep=0) == 0
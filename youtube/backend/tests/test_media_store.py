@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed media store: ingest, hardlinked delivery, LRU quota"""
+
+import os
+
+import pytest
+
+from media_store import MediaStore, media_key
+
+KB = 1024
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MediaStore(str(tmp_path / "store"), quota_mb=1, db_path=str(tmp_path / "media.db"))
+
+
+def download(directory, name, size):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def test_ingest_and_materialize_as_hardlinks(store, tmp_path):
+    key = media_key("dQw4w9WgXcQ", "video", "mp4")
+    source = download(tmp_path / "out1", "Song.mp4", 10 * KB)
+    stored = store.ingest(key, [source])
+    assert store.lookup(key) == stored
+
+    delivered = store.materialize(key, str(tmp_path / "out2"))
+    assert delivered == [str(tmp_path / "out2" / "Song.mp4")]
+    assert os.path.samefile(delivered[0], stored[0])
+    assert store.stats()["entries"] == 1
+    assert store.total_size() == 10 * KB
+
+
+def test_variants_are_stored_separately(store, tmp_path):
+    best = media_key("dQw4w9WgXcQ", "video", "mp4")
+    chosen = media_key("dQw4w9WgXcQ", "video", "mp4", "137+140")
+    store.ingest(best, [download(tmp_path / "a", "Song.mp4", KB)])
+    assert store.lookup(chosen) is None
+    assert store.materialize(chosen, str(tmp_path / "b")) is None
+
+
+def test_missing_files_invalidate_the_entry(store, tmp_path):
+    key = media_key("dQw4w9WgXcQ", "audio", "mp3")
+    stored = store.ingest(key, [download(tmp_path / "out", "Song.mp3", KB)])
+    os.remove(stored[0])
+    assert store.lookup(key) is None
+    assert store.stats()["entries"] == 0
+
+
+def test_quota_evicts_least_recently_used(store, tmp_path):
+    first = media_key("aaaaaaaaaaa", "video", "mp4")
+    second = media_key("bbbbbbbbbbb", "video", "mp4")
+    third = media_key("ccccccccccc", "video", "mp4")
+    output = download(tmp_path / "out", "First.mp4", 400 * KB)
+    store.ingest(first, [output])
+    store.ingest(second, [download(tmp_path / "out", "Second.mp4", 400 * KB)])
+    store.lookup(first)  # first is now more recently used than second
+    store.ingest(third, [download(tmp_path / "out", "Third.mp4", 400 * KB)])
+
+    assert store.lookup(second) is None
+    assert store.lookup(first) is not None
+    assert store.lookup(third) is not None
+    assert store.total_size() <= 1024 * KB
+    assert os.path.exists(output)  # eviction never touches output folders
+
+
+def test_disabled_store(tmp_path):
+    assert not MediaStore(str(tmp_path / "store"), quota_mb=0, db_path=str(tmp_path / "media.db")).enabled
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Profiles of the API process merged with those of the worker processes"""
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from profiler import ProfileRequests, ProfileResponder, profile_all
+
+
+@pytest.fixture
+def requests(tmp_path):
+    return ProfileRequests(str(tmp_path / "tasks.db"))
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_without_workers_only_the_api_process_is_sampled(requests):
+    stop = threading.Event()
+    threading.Thread(target=busy, args=(stop,), daemon=True, name="busy").start()
+    try:
+        result = profile_all(0.2, 0.01, requests=requests)
+    finally:
+        stop.set()
+    lines = result["collapsed"].splitlines()
+    assert lines and all(line.startswith("api ") for line in lines)
+    assert any(";busy;" in line for line in lines)
+    assert result["workers"] == {} and result["missing_workers"] == []
+
+
+def run_responder(db_path):
+    responder = ProfileResponder("w1", ProfileRequests(db_path), poll_interval=0.05)
+    responder.start()
+    responder.join()
+
+
+def test_worker_answers_are_merged(requests):
+    # A separate process like the production workers (the profile lock is per process)
+    worker = multiprocessing.get_context("fork").Process(target=run_responder, args=(requests.db.path,), daemon=True)
+    worker.start()
+    try:
+        deadline = time.time() + 5
+        while requests.submit(0, 0.01, False)[1] != ["w1"] and time.time() < deadline:
+            time.sleep(0.05)  # wait until the responder has polled once
+        result = profile_all(0.3, 0.01, requests=requests)
+    finally:
+        worker.terminate()
+    assert result["missing_workers"] == []
+    assert "snapshot" in result["workers"]["w1"]
+    assert any(line.startswith("worker w1;") for line in result["collapsed"].splitlines())
+
+
+def test_answered_requests_are_not_repeated(requests):
+    request_id, _ = requests.submit(30, 0.01, False)
+    assert requests.poll("w1")["request_id"] == request_id
+    requests.answer(request_id, "w1", {"collapsed": ""})
+    assert requests.poll("w1") is None
+    assert requests.poll("w2")["request_id"] == request_id
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Scratch directories and atomic publishing into the output folder"""
+
+import os
+
+import pytest
+
+import staging
+from settings import settings
+from staging import cleanup_stale, move_atomic, publish, remove_work_dir, scratch_root, work_dir
+
+
+@pytest.fixture(autouse=True)
+def scratch(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "scratch_dir", str(tmp_path / "scratch"))
+
+
+def test_scratch_defaults_to_the_data_directory(monkeypatch):
+    monkeypatch.delenv("MEDIATHEK_SCRATCH_DIR", raising=False)
+    assert settings.from_env().scratch_dir == settings.data_dir
+
+
+def test_publish_moves_only_finished_media(tmp_path):
+    directory = work_dir("task", 0)
+    assert directory == os.path.join(scratch_root(), "task", "0")
+    for name in ("Song.mp4", "Song.f137.mp4.part", "Song.webp", "Other.MKV"):
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(name)
+
+    published = publish(directory, str(tmp_path / "out"), (".mp4", ".mkv"))
+    assert published == [str(tmp_path / "out" / "Other.MKV"), str(tmp_path / "out" / "Song.mp4")]
+    assert sorted(os.listdir(directory)) == ["Song.f137.mp4.part", "Song.webp"]
+
+    remove_work_dir(directory)
+    assert not os.path.exists(os.path.join(scratch_root(), "task"))
+
+
+def test_move_atomic_across_file_systems(tmp_path, monkeypatch):
+    src = tmp_path / "src.mp4"
+    src.write_bytes(b"media")
+    dest = tmp_path / "out" / "dest.mp4"
+    dest.parent.mkdir()
+    real_replace = os.replace
+    calls = []
+
+    def replace(a, b):
+        calls.append((a, b))
+        if len(calls) == 1:
+            raise OSError(18, "Invalid cross-device link")
+        real_replace(a, b)
+
+    monkeypatch.setattr(staging.os, "replace", replace)
+    move_atomic(str(src), str(dest))
+    assert dest.read_bytes() == b"media"
+    assert not src.exists()
+    # The copy was renamed into place from a hidden temporary name
+    assert os.path.basename(calls[1][0]).startswith(".dest.mp4.")
+    assert os.listdir(dest.parent) == ["dest.mp4"]
+
+
+def test_move_atomic_cleans_up_a_failed_copy(tmp_path, monkeypatch):
+    src = tmp_path / "src.mp4"
+    src.write_bytes(b"media")
+    out = tmp_path / "out"
+    out.mkdir()
+
+    def fail(*args):
+        raise OSError("no space left")
+
+    monkeypatch.setattr(staging.os, "replace", fail)
+    with pytest.raises(OSError):
+        move_atomic(str(src), str(out / "dest.mp4"))
+    assert os.listdir(out) == []
+    assert src.exists()
+
+
+def test_cleanup_stale_keeps_active_tasks():
+    work_dir("active", 0)
+    work_dir("paused", 3)
+    work_dir("crashed", 0)
+    assert cleanup_stale(["active", "paused"]) == 1
+    assert sorted(os.listdir(scratch_root())) == ["active", "paused"]
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Queue, lease and control transitions of download tasks"""
+
+import pytest
+
+from downloader import DownloadStatus
+from task_store import TaskStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TaskStore(str(tmp_path / "tasks.db"))
+
+
+def add_task(store, task_id="t1"):
+    status = DownloadStatus(task_id=task_id, total_files=1, status="queued")
+    store.create_task("video", "mp4", "/tmp/out", ["https://youtu.be/dQw4w9WgXcQ"], status)
+    return task_id
+
+
+def status_of(store, task_id):
+    return store.load_status(task_id).status
+
+
+def run(store, task_id, status="downloading"):
+    record = store.claim_next("worker-1")
+    assert record.task_id == task_id
+    saved = store.load_status(task_id)
+    saved.status = status
+    store.save_status(saved)
+
+
+def test_claim_takes_the_oldest_queued_task_once(store):
+    add_task(store, "t1")
+    add_task(store, "t2")
+    record = store.claim_next("worker-1")
+    assert (record.task_id, record.kind, record.urls) == ("t1", "video", ["https://youtu.be/dQw4w9WgXcQ"])
+    assert status_of(store, "t1") == "starting"
+    assert store.claim_next("worker-2").task_id == "t2"
+    assert store.claim_next("worker-3") is None
+    assert store.count_active() == 2
+
+
+def test_live_task_is_not_requeued(store):
+    task_id = add_task(store)
+    run(store, task_id)
+    store.heartbeat(task_id)
+    assert store.requeue_interrupted() == 0
+    assert status_of(store, task_id) == "downloading"
+
+
+def test_task_with_expired_lease_is_requeued(store):
+    task_id = add_task(store)
+    run(store, task_id)
+    assert store.requeue_interrupted(lease=-1) == 1
+    assert status_of(store, task_id) == "queued"
+    assert store.claim_next("worker-2").task_id == task_id
+
+
+def test_finished_task_is_not_requeued(store):
+    task_id = add_task(store)
+    run(store, task_id, status="complete")
+    assert store.requeue_interrupted(lease=-1) == 0
+    assert store.count_active() == 0
+
+
+def test_deferred_task_is_claimed_after_its_delay(store):
+    task_id = add_task(store)
+    run(store, task_id, status="waiting")
+    store.defer(task_id, 60)
+    assert status_of(store, task_id) == "waiting"
+    assert store.claim_next("worker-2") is None
+    assert store.requeue_interrupted(lease=-1) == 0  # no worker, nothing to recover
+    store.defer(task_id, -1)
+    assert store.claim_next("worker-2").task_id == task_id
+
+
+def test_deferred_task_pauses_and_cancels_at_once(store):
+    task_id = add_task(store)
+    run(store, task_id, status="waiting")
+    store.defer(task_id, 60)
+    assert store.request_control(task_id, "pause") == "paused"
+    assert store.request_control(task_id, "resume") == "queued"
+    run(store, task_id, status="waiting")
+    store.defer(task_id, 60)
+    assert store.request_control(task_id, "cancel") == "cancelled"
+
+
+def test_unknown_task(store):
+    assert store.request_control("missing", "pause") is None
+
+
+def test_queued_task_pauses_resumes_and_cancels_at_once(store):
+    task_id = add_task(store)
+    assert store.request_control(task_id, "pause") == "paused"
+    assert store.claim_next("worker-1") is None  # paused tasks are not claimed
+    assert store.request_control(task_id, "resume") == "queued"
+    assert store.request_control(task_id, "cancel") == "cancelled"
+    assert status_of(store, task_id) == "cancelled"
+    assert store.get_control(task_id) is None
+
+
+def test_resume_only_affects_paused_tasks(store):
+    task_id = add_task(store)
+    assert store.request_control(task_id, "resume") == "queued"
+    run(store, task_id)
+    assert store.request_control(task_id, "resume") == "downloading"
+    assert store.get_control(task_id) is None
+
+
+@pytest.mark.parametrize("action, reported", [("pause", "pausing"), ("cancel", "cancelling")])
+def test_running_task_gets_a_control_request(store, action, reported):
+    task_id = add_task(store)
+    run(store, task_id)
+    assert store.request_control(task_id, action) == reported
+    assert store.get_control(task_id) == action
+    assert status_of(store, task_id) == "downloading"  # the worker decides when it stops
+    store.clear_control(task_id)
+    assert store.get_control(task_id) is None
+
+
+def test_finished_tasks_ignore_control(store):
+    task_id = add_task(store)
+    run(store, task_id, status="complete")
+    for action in ("pause", "resume", "cancel"):
+        assert store.request_control(task_id, action) == "complete"
+
+
+def test_orphaned_task_keeps_its_pending_control(store):
+    task_id = add_task(store)
+    run(store, task_id)
+    store.request_control(task_id, "pause")
+    assert store.requeue_interrupted(lease=-1) == 1
+    assert status_of(store, task_id) == "paused"
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Video IDs, batch deduplication and timestamps of YouTube URLs"""
+
+import pytest
+
+from url_canonicalizer import canonical_url, dedupe_urls, extract_video_id, parse_timestamp, url_time_range
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtube.com/watch?feature=share&v={VIDEO_ID}&t=42",
+    f"https://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}&list=RD123",
+    f"https://youtu.be/{VIDEO_ID}?si=abc",
+    f"youtu.be/{VIDEO_ID}",
+    f"  https://www.youtube.com/shorts/{VIDEO_ID}  ",
+    f"https://www.youtube.com/embed/{VIDEO_ID}",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}",
+    f"https://www.youtube.com/live/{VIDEO_ID}?feature=share",
+    f"HTTPS://WWW.YOUTUBE.COM/watch?v={VIDEO_ID}",
+])
+def test_extract_video_id(url):
+    assert extract_video_id(url) == VIDEO_ID
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch?v=tooshort",
+    f"https://www.youtube.com/watch?v={VIDEO_ID}x",
+    "https://www.youtube.com/playlist?list=PL123",
+    "https://www.youtube.com/@channel",
+    "https://youtu.be/",
+    f"https://vimeo.com/{VIDEO_ID}",
+    f"https://notyoutube.com/watch?v={VIDEO_ID}",
+    "http://[::1",
+    "",
+])
+def test_extract_video_id_rejects_other_urls(url):
+    assert extract_video_id(url) is None
+
+
+def test_dedupe_urls_keeps_order_and_canonicalizes():
+    other = "https://example.com/video.mp4"
+    urls, duplicates = dedupe_urls([
+        f"https://youtu.be/{VIDEO_ID}",
+        other,
+        f"https://www.youtube.com/watch?v={VIDEO_ID}&t=10",
+        other,
+        "https://www.youtube.com/shorts/aaaaaaaaaaa",
+    ])
+    assert urls == [
+        f"https://www.youtube.com/watch?v={VIDEO_ID}",
+        other,
+        "https://www.youtube.com/watch?v=aaaaaaaaaaa",
+    ]
+    assert duplicates == 2
+
+
+def test_dedupe_urls_empty():
+    assert dedupe_urls([]) == ([], 0)
+
+
+def test_canonical_url_leaves_other_urls_alone():
+    assert canonical_url(f"https://youtu.be/{VIDEO_ID}?t=5") == f"https://www.youtube.com/watch?v={VIDEO_ID}"
+    assert canonical_url("https://example.com/a.mp4?x=1") == "https://example.com/a.mp4?x=1"
+
+
+@pytest.mark.parametrize("value, seconds", [
+    (90, 90.0),
+    (12.5, 12.5),
+    ("90", 90.0),
+    ("0", 0.0),
+    ("1:30", 90.0),
+    ("01:02:03.5", 3723.5),
+    ("1h2m3s", 3723.0),
+    ("2m", 120.0),
+    ("1H", 3600.0),
+    ("45s", 45.0),
+    (" 10 ", 10.0),
+])
+def test_parse_timestamp(value, seconds):
+    assert parse_timestamp(value) == seconds
+
+
+@pytest.mark.parametrize("value", [
+    None, "", "abc", "-5", -1, "1:75", "1:2:3:4", "inf", "nan", float("inf"), float("nan"), "1h2x",
+])
+def test_parse_timestamp_rejects_invalid(value):
+    assert parse_timestamp(value) is None
+
+
+def test_url_time_range():
+    assert url_time_range(f"https://youtu.be/{VIDEO_ID}?t=90") == (90.0, None)
+    assert url_time_range(f"https://www.youtube.com/watch?v={VIDEO_ID}&start=60&end=1m30s") == (60.0, 90.0)
+    assert url_time_range(f"https://www.youtube.com/watch?v={VIDEO_ID}#t=1m") == (60.0, None)
+    # The query wins over the fragment
+    assert url_time_range(f"https://www.youtube.com/watch?v={VIDEO_ID}&t=5#t=1m") == (5.0, None)
+    assert url_time_range(f"https://www.youtube.com/watch?v={VIDEO_ID}") == (None, None)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Download worker: running tasks are paused and requeued on shutdown"""
+
+import threading
+import time
+
+import pytest
+
+import worker
+from downloader import DownloadStatus
+from task_store import TaskStore
+
+
+class FakeDownloader:
+    """Runs until stopped, like a downloader waiting for yt-dlp"""
+
+    def __init__(self, status):
+        self.status = status
+        self.stop_event = threading.Event()
+        self.started = threading.Event()
+
+    def request_stop(self, action):
+        self.stop_action = action
+        self.stop_event.set()
+
+    def record_written(self):
+        pass
+
+    def download_all(self):
+        self.started.set()
+        self.stop_event.wait(10)
+        self.status.status = "paused" if self.stop_action == "pause" else "cancelled"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, "_shutting_down", threading.Event())
+    return TaskStore(str(tmp_path / "tasks.db"))
+
+
+def start_task(store, monkeypatch):
+    store.create_task("video", "mp4", "/tmp/out", ["https://youtu.be/dQw4w9WgXcQ"],
+                      DownloadStatus(task_id="t1", total_files=1, status="queued"))
+    downloaders = []
+
+    def build(record, status):
+        downloaders.append(FakeDownloader(status))
+        return downloaders[-1]
+
+    monkeypatch.setattr(worker, "build_downloader", build)
+    thread = threading.Thread(target=worker.run_task, args=(store, store.claim_next("w1")))
+    thread.start()
+    while not downloaders:
+        time.sleep(0.01)
+    downloaders[0].started.wait(5)
+    return thread, downloaders[0]
+
+
+def test_shutdown_pauses_and_requeues_running_downloads(store, monkeypatch):
+    thread, downloader = start_task(store, monkeypatch)
+    worker.stop_running_downloads()
+    thread.join(5)
+    assert downloader.stop_action == "pause"
+    assert store.load_status("t1").status == "queued"
+    assert store.claim_next("w2").task_id == "t1"
+
+
+def test_user_pause_during_shutdown_stays_paused(store, monkeypatch):
+    thread, downloader = start_task(store, monkeypatch)
+    store.request_control("t1", "pause")
+    worker.stop_running_downloads()
+    thread.join(5)
+    assert store.load_status("t1").status == "paused"
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tool Capability Registry
+Probes yt-dlp, ffmpeg and ffprobe once and caches versions and capabilities
+"""
+
+import os
+import re
+import shutil
+import threading
+import subprocess
+import logging
+import importlib.util
+from importlib import metadata
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+
+@dataclass
+class ToolInfo:
+    """Probe result for one external tool"""
+    name: str
+    available: bool = False
+    path: Optional[str] = None
+    version: Optional[str] = None
+    mtime: Optional[float] = None
+    encoders: List[str] = field(default_factory=list)
+    muxers: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _run(cmd: List[str], timeout: int = 10) -> Optional[str]:
+    """Run a probe command and return stdout (None on failure)"""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        return result.stdout if result.returncode == 0 else None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def _parse_codec_list(output: Optional[str]) -> List[str]:
+    """Parse `ffmpeg -encoders` / `ffmpeg -muxers` tables into names"""
+    names = []
+    in_table = False
+    for line in (output or "").splitlines():
+        if line.strip().startswith("--"):
+            # Header ends with a separator line (" ------" / " --")
+            in_table = True
+            continue
+        if in_table:
+            m = re.match(r"^\s*[A-Z.]{1,6}\s+(\S+)", line)
+            if m:
+                names.extend(m.group(1).split(","))
+    return sorted(set(names))
+
+
+class ToolRegistry:
+    """Cached registry of external tool capabilities (singleton)"""
+
+    _instance = None
+    TOOLS = ("yt_dlp", "ffmpeg", "ffprobe")
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._tools = {}
+            cls._instance._fingerprints = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    # --- fingerprints (cheap, never spawn a process) ---
+
+    @staticmethod
+    def _locate(name: str) -> Optional[str]:
+        if name == "yt_dlp":
+            spec = importlib.util.find_spec("yt_dlp")
+            return spec.origin if spec else None
+        return shutil.which(name)
+
+    def _fingerprint(self, name: str) -> tuple:
+        """PATH + binary location + mtime; any change invalidates the cached probe"""
+        path = self._locate(name)
+        try:
+            mtime = os.path.getmtime(path) if path else None
+        except OSError:
+            mtime = None
+        return (os.environ.get("PATH", ""), path, mtime)
+
+    # --- probes ---
+
+    def _probe(self, name: str, path: Optional[str], mtime: Optional[float]) -> ToolInfo:
+        info = ToolInfo(name=name, path=path, mtime=mtime)
+        if not path:
+            return info
+
+        if name == "yt_dlp":
+            # Installed in this interpreter: read the version from package metadata
+            try:
+                info.version = metadata.version("yt-dlp")
+                info.available = True
+            except metadata.PackageNotFoundError:
+                pass
+            return info
+
+        output = _run([path, "-hide_banner", "-version"] if name == "ffmpeg" else [path, "-version"])
+        if output is None:
+            return info
+        info.available = True
+        m = re.search(r"version\s+(\S+)", output)
+        info.version = m.group(1) if m else output.split("\n")[0]
+
+        if name == "ffmpeg":
+            info.encoders = _parse_codec_list(_run([path, "-hide_banner", "-encoders"]))
+            info.muxers = _parse_codec_list(_run([path, "-hide_banner", "-muxers"]))
+        return info
+
+    def get(self, name: str) -> ToolInfo:
+        """Cached tool info; re-probes only if PATH or the binary changed"""
+        fingerprint = self._fingerprint(name)
+        with self._lock:
+            if self._fingerprints.get(name) == fingerprint and name in self._tools:
+                return self._tools[name]
+
+            if name in self._tools:
+                logging.info(f"{name} changed (PATH or binary), probing again")
+            info = self._probe(name, fingerprint[1], fingerprint[2])
+            self._tools[name] = info
+            self._fingerprints[name] = fingerprint
+            if info.available:
+                logging.info(f"✓ {name} {info.version} ({info.path})")
+            else:
+                logging.warning(f"✗ {name} not available")
+            return info
+
+    def probe_all(self) -> Dict[str, ToolInfo]:
+        """Probe every known tool (called once at startup)"""
+        return {name: self.get(name) for name in self.TOOLS}
+
+    def is_available(self, name: str) -> bool:
+        return self.get(name).available
+
+    def has_encoder(self, encoder: str) -> bool:
+        return encoder in self.get("ffmpeg").encoders
+
+    def has_muxer(self, muxer: str) -> bool:
+        return muxer in self.get("ffmpeg").muxers
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """All tool infos as plain dicts (for the API)"""
+        return {name: info.to_dict() for name, info in self.probe_all().items()}
+
+
+# Module-level singleton shared by downloaders, API and dependency checker
+tool_registry = ToolRegistry()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+URL Canonicalizer
+Reduces every supported YouTube URL form to its video ID and a canonical URL,
+deduplicates URL batches and reads the time parameters canonicalization drops
+"""
+
+import re
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+YOUTUBE_HOSTS = {
+    "youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com",
+    "youtube-nocookie.com", "www.youtube-nocookie.com",
+}
+SHORT_HOSTS = {"youtu.be", "www.youtu.be"}
+
+# Path prefixes that are followed directly by the video ID
+ID_PATH_PREFIXES = ("shorts", "embed", "v", "e", "live")
+
+# Timestamps as YouTube writes them (1h2m3s, 90s) and as clock times (1:02:03.5)
+UNIT_TIME_RE = re.compile(r"^(?:(\d+)h)?(?:(\d+)m)?(?:(\d+(?:\.\d+)?)s)?$")
+CLOCK_TIME_RE = re.compile(r"^(?:(\d+):)?(\d{1,2}):([0-5]?\d(?:\.\d+)?)$")
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """Video ID of a YouTube URL (None for non-video or non-YouTube URLs)"""
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None
+    if not parsed.netloc and not parsed.scheme:
+        # Scheme-less input such as "youtu.be/<id>"
+        parsed = urlparse("https://" + url.strip())
+
+    host = (parsed.hostname or "").lower()
+    parts = [p for p in parsed.path.split("/") if p]
+
+    if host in SHORT_HOSTS:
+        candidate = parts[0] if parts else None
+    elif host in YOUTUBE_HOSTS:
+        if parts[:1] == ["watch"] or not parts:
+            candidate = (parse_qs(parsed.query).get("v") or [None])[0]
+        elif len(parts) >= 2 and parts[0] in ID_PATH_PREFIXES:
+            candidate = parts[1]
+        else:
+            candidate = None
+    else:
+        return None
+
+    if candidate and VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def canonical_url(url: str) -> str:
+    """https://www.youtube.com/watch?v=<id> for video URLs; other URLs unchanged"""
+    video_id = extract_video_id(url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"
+    return url
+
+
+def dedupe_urls(urls: List[str]) -> Tuple[List[str], int]:
+    """Canonicalize and deduplicate a batch (order kept); returns (urls, duplicates removed)"""
+    seen = set()
+    unique = []
+    for url in urls:
+        canonical = canonical_url(url)
+        if canonical in seen:
+            continue
+        seen.add(canonical)
+        unique.append(canonical)
+    return unique, len(urls) - len(unique)
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Seconds from 90, "90", "1:30", "01:02:03.5" or "1h2m3s" (None if not a timestamp)"""
+    if isinstance(value, (int, float)):
+        return float(value) if 0 <= value < float("inf") else None
+    text = str(value or "").strip().lower()
+    if not text:
+        return None
+    try:
+        seconds = float(text)
+        return seconds if 0 <= seconds < float("inf") else None
+    except ValueError:
+        pass
+    match = UNIT_TIME_RE.match(text) or CLOCK_TIME_RE.match(text)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds = (float(group) if group else 0.0 for group in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def url_time_range(url: str) -> Tuple[Optional[float], Optional[float]]:
+    """(start, end) in seconds from the t=/start=/end= parameters (or #t=) of a URL"""
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None, None
+    params = parse_qs(parsed.query)
+    params.update({key: value for key, value in parse_qs(parsed.fragment).items() if key not in params})
+    start = (params.get("t") or params.get("start") or [None])[0]
+    end = (params.get("end") or [None])[0]
+    return parse_timestamp(start), parse_timestamp(end)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Download Worker
+Claims queued tasks from the shared task store and runs the downloads.
+Runs as threads inside the API process (dev) or as separate processes (production).
+"""
+
+import os
+import time
+import uuid
+import signal
+import argparse
+import threading
+import logging
+import multiprocessing
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional
+
+from downloader import VideoDownloader, AudioDownloader, CombinedDownloader, DownloadStatus, parse_audio_targets
+from format_planner import FormatLimits
+from task_store import TaskStore, TaskRecord
+from settings import settings
+from staging import cleanup_stale
+from disk_space import space_reservations, SPACE_RETRY_DELAY
+
+
+class StatusFlusher(threading.Thread):
+    """Periodically writes a task's in-memory status to the store (only when changed)
+    and hands cancel/pause requests from the store to the running downloader"""
+
+    def __init__(self, store: TaskStore, status: DownloadStatus, interval: float = 0.5,
+                 on_control: Optional[Callable[[str], None]] = None, heartbeat_interval: float = 5.0,
+                 on_heartbeat: Optional[Callable[[], None]] = None):
+        super().__init__(daemon=True, name=f"flush-{status.task_id[:8]}")
+        self.store = store
+        self.status = status
+        self.interval = interval
+        self.on_control = on_control
+        self.heartbeat_interval = heartbeat_interval  # lease renewal, see TASK_LEASE
+        self.on_heartbeat = on_heartbeat
+        self._stop_event = threading.Event()
+        self._last_saved = None
+        self._last_heartbeat = 0.0
+
+    def flush(self):
+        snapshot = asdict(self.status)
+        if snapshot != self._last_saved:
+            self.store.save_status(self.status)
+            self._last_saved = snapshot
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.flush()
+                if time.time() - self._last_heartbeat >= self.heartbeat_interval:
+                    self.store.heartbeat(self.status.task_id)
+                    self._last_heartbeat = time.time()
+                    if self.on_heartbeat:
+                        self.on_heartbeat()
+                control = self.store.get_control(self.status.task_id) if self.on_control else None
+                if control:
+                    self.on_control(control)
+            except Exception as e:
+                logging.error(f"Error saving status of task {self.status.task_id}: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.flush()
+
+
+# Downloaders running in this process, paused on shutdown so yt-dlp/ffmpeg
+# (started in their own session) do not outlive the worker
+_running: Dict[str, object] = {}
+_running_lock = threading.Lock()
+_shutting_down = threading.Event()
+
+
+def stop_running_downloads():
+    """Pause every download of this process; the tasks are requeued and resume after the restart"""
+    _shutting_down.set()
+    with _running_lock:
+        downloaders = list(_running.values())
+    for downloader in downloaders:
+        downloader.request_stop("pause")
+
+
+def build_downloader(record: TaskRecord, status: DownloadStatus):
+    """Create the downloader for a stored task"""
+    options = record.options
+    # Excerpts instead of whole videos: video ID (or URL) -> [start, end]
+    excerpts = {"sections": options.get("sections"), "precise_cuts": options.get("precise_cuts", False)}
+    if record.kind == "video":
+        return VideoDownloader(record.urls, record.format, record.output_path, status,
+                               options.get("format_ids"), FormatLimits.from_dict(options.get("limits")), **excerpts)
+    if record.kind == "audio":
+        targets = options.get("audio_targets")
+        return AudioDownloader(record.urls, record.format, record.output_path, status,
+                               parse_audio_targets(targets) if targets else None, **excerpts)
+    if record.kind == "combined":
+        # Tasks queued before multi-target support only carry audio_format
+        targets = options.get("audio_targets") or [options.get("audio_format", "mp3")]
+        return CombinedDownloader(record.urls, record.format, record.output_path, status,
+                                  options.get("format_ids"), parse_audio_targets(targets),
+                                  FormatLimits.from_dict(options.get("limits")), **excerpts)
+    raise ValueError(f"Unknown task kind: {record.kind}")
+
+
+def run_task(store: TaskStore, record: TaskRecord):
+    """Run one claimed task, keeping its status in the store up to date"""
+    previous = store.load_status(record.task_id)
+    if previous and previous.resume_index:
+        status = previous  # resumed after a pause: continue with the first unfinished URL
+        status.status = "downloading"
+    else:
+        status = DownloadStatus(task_id=record.task_id, total_files=len(record.urls), status="downloading")
+    flusher = StatusFlusher(store, status)
+    flusher.start()
+    try:
+        downloader = build_downloader(record, status)
+        flusher.on_control = downloader.request_stop
+        flusher.on_heartbeat = downloader.record_written  # shrink the disk space reservation
+        with _running_lock:
+            _running[record.task_id] = downloader
+        if _shutting_down.is_set():
+            downloader.request_stop("pause")
+        downloader.download_all()
+    except Exception as e:
+        logging.error(f"Task {record.task_id} crashed: {e}")
+        status.status = "error"
+        status.message = f"Fehler: {e}"
+    finally:
+        with _running_lock:
+            _running.pop(record.task_id, None)
+        if _shutting_down.is_set() and status.status == "paused" and store.get_control(record.task_id) != "pause":
+            status.status = "queued"  # paused by the shutdown, not by the user
+        flusher.stop()
+        store.clear_control(record.task_id)
+        if status.status == "waiting":
+            store.defer(record.task_id, SPACE_RETRY_DELAY)
+
+
+def worker_loop(store: TaskStore, worker_id: str, stop_event: threading.Event, poll_interval: float = 0.5,
+                sweep_interval: float = 60.0):
+    """Claim and run tasks until stopped; idle workers also requeue tasks of dead workers"""
+    logging.info(f"Download worker {worker_id} started")
+    last_sweep = time.time()
+    while not stop_event.is_set():
+        if time.time() - last_sweep >= sweep_interval:
+            last_sweep = time.time()
+            try:
+                store.requeue_interrupted()
+            except Exception as e:
+                logging.error(f"Worker {worker_id} could not requeue orphaned tasks: {e}")
+        try:
+            record = store.claim_next(worker_id)
+        except Exception as e:
+            logging.error(f"Worker {worker_id} could not claim a task: {e}")
+            record = None
+        if record is None:
+            stop_event.wait(poll_interval)
+            continue
+        logging.info(f"Worker {worker_id} running task {record.task_id} ({record.kind}, {len(record.urls)} URLs)")
+        run_task(store, record)
+    logging.info(f"Download worker {worker_id} stopped")
+
+
+class EmbeddedWorkers:
+    """Download worker threads inside the API process (single-process/dev mode)"""
+
+    def __init__(self, store: TaskStore, count: int):
+        self.store = store
+        self.count = count
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def start(self):
+        self.store.requeue_interrupted()
+        active = self.store.active_task_ids()
+        cleanup_stale(active)
+        space_reservations.release_stale(active)
+        for n in range(self.count):
+            worker_id = f"{os.getpid()}-t{n}"
+            thread = threading.Thread(
+                target=worker_loop, args=(self.store, worker_id, self.stop_event),
+                daemon=True, name=f"download-worker-{n}"
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: float = 15.0):
+        self.stop_event.set()
+        stop_running_downloads()
+        deadline = time.time() + timeout
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.time()))
+
+
+def _process_main(worker_id: str):
+    """Entry point of a dedicated download worker process"""
+    from profiler import ProfileResponder
+
+    ProfileResponder(worker_id).start()  # answers /api/debug/profile for this process
+    stop_event = threading.Event()
+
+    def _shutdown(*_):
+        stop_event.set()
+        # Not in the handler itself: the interrupted main thread may hold the Popen wait lock
+        threading.Thread(target=stop_running_downloads, name="shutdown").start()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    worker_loop(TaskStore(), worker_id, stop_event)
+
+
+def run_worker_processes(count: int):
+    """Start `count` download worker processes and wait for them"""
+    store = TaskStore()
+    store.requeue_interrupted()
+    active = store.active_task_ids()
+    cleanup_stale(active)
+    space_reservations.release_stale(active)
+    processes = []
+    for n in range(count):
+        process = multiprocessing.Process(
+            target=_process_main, args=(f"p{n}-{uuid.uuid4().hex[:6]}",), name=f"download-worker-{n}"
+        )
+        process.start()
+        processes.append(process)
+
+    def _terminate(*_):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        _terminate()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="MediathekManagement download workers")
+    parser.add_argument("--processes", type=int, default=settings.download_workers,
+                        help="number of download worker processes")
+    args = parser.parse_args(argv)
+    run_worker_processes(args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -44,6 +44,17 @@ document.addEventListener('DOMContentLoaded', () => {
     document.getElementById('search-input').addEventListener('keypress', (e) => {
         if (e.key === 'Enter') searchYoutube();
     });
+    
+    // Windowed rendering: only visible rows exist in the DOM
+    for (const kind of ['video', 'audio']) {
+        document.getElementById(`${kind}-url-input`).addEventListener('paste', (e) => handleUrlPaste(kind, e));
+        urlLists[kind].view = new VirtualList(
+            document.getElementById(`${kind}-url-list`), 52,
+            (url, index) => renderUrlRow(kind, url, index), 'Keine URLs hinzugefügt'
+        );
+        updateUrlSummary(kind);
+    }
+    searchView = new VirtualList(document.getElementById('search-results'), 140, renderSearchResult);
 });
 
 // ============================================
@@ -166,125 +177,350 @@ async function checkBackendStatus() {
     }
 }
 
-// Video URL management
-function addVideoUrl() {
-    const input = document.getElementById('video-url-input');
-    const url = input.value.trim();
-    
-    if (!url) {
-        alert('Bitte geben Sie eine URL ein.');
-        return;
+// ============================================
+// VIRTUALIZED LISTS
+// ============================================
+
+// Renders only the rows in (and near) the visible part of a scroll container,
+// so a list with 10,000 entries keeps a few dozen DOM nodes
+class VirtualList {
+    constructor(container, rowHeight, renderRow, emptyText = '') {
+        this.container = container;
+        this.rowHeight = rowHeight;
+        this.renderRow = renderRow;
+        this.emptyText = emptyText;
+        this.items = [];
+        this.overscan = 6;
+        this.padding = 8;
+        this.frame = null;
+        this.rowTag = container.tagName === 'UL' ? 'li' : 'div';
+        this.spacer = document.createElement(this.rowTag);
+        this.spacer.className = 'virtual-spacer';
+        container.classList.add('virtual-list');
+        container.addEventListener('scroll', () => this.refresh(), { passive: true });
+        this.render();
     }
     
-    if (!isValidYoutubeUrl(url)) {
-        alert('Bitte geben Sie eine gültige YouTube-URL ein.');
-        return;
+    setItems(items) {
+        this.items = items;
+        this.refresh();
     }
     
-    if (videoUrls.includes(url)) {
-        alert('Diese URL ist bereits in der Liste.');
-        return;
+    // Re-render on the next frame (several updates per frame render once)
+    refresh() {
+        if (this.frame !== null) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.render();
+        });
     }
     
-    videoUrls.push(url);
-    updateVideoUrlList();
-    input.value = '';
+    render() {
+        const count = this.items.length;
+        if (count === 0) {
+            const empty = document.createElement(this.rowTag);
+            empty.className = 'virtual-empty';
+            empty.textContent = this.emptyText;
+            this.container.replaceChildren(...(this.emptyText ? [empty] : []));
+            return;
+        }
+        
+        const scrollTop = this.container.scrollTop;
+        const viewport = this.container.clientHeight || this.rowHeight * 10;
+        const first = Math.max(0, Math.floor((scrollTop - this.padding) / this.rowHeight) - this.overscan);
+        const last = Math.min(count, Math.ceil((scrollTop + viewport) / this.rowHeight) + this.overscan);
+        
+        this.spacer.style.height = `${count * this.rowHeight + 2 * this.padding}px`;
+        const fragment = document.createDocumentFragment();
+        fragment.appendChild(this.spacer);
+        for (let i = first; i < last; i++) {
+            const row = this.renderRow(this.items[i], i);
+            row.classList.add('virtual-row');
+            row.style.top = `${this.padding + i * this.rowHeight}px`;
+            row.style.height = `${this.rowHeight - 8}px`;
+            fragment.appendChild(row);
+        }
+        this.container.replaceChildren(fragment);
+    }
 }
 
-function removeVideoUrl(index) {
-    videoUrls.splice(index, 1);
-    updateVideoUrlList();
-}
+// ============================================
+// URL LISTS
+// ============================================
 
-function clearVideoUrls() {
-    if (videoUrls.length === 0) return;
-    if (confirm('Möchten Sie alle URLs aus der Liste entfernen?')) {
-        videoUrls = [];
-        updateVideoUrlList();
+const YOUTUBE_HOSTS = ['youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+                       'youtube-nocookie.com', 'www.youtube-nocookie.com'];
+const ID_PATH_PREFIXES = ['shorts', 'embed', 'v', 'e', 'live'];
+
+// Same rules as the backend's url_canonicalizer, so the list matches the task's URLs
+function extractVideoId(url) {
+    let parsed;
+    try {
+        parsed = new URL(url.includes('://') ? url : `https://${url}`);
+    } catch {
+        return null;
+    }
+    const host = parsed.hostname.toLowerCase();
+    const parts = parsed.pathname.split('/').filter(part => part);
+    let candidate = null;
+    
+    if (host === 'youtu.be' || host === 'www.youtu.be') {
+        candidate = parts[0];
+    } else if (YOUTUBE_HOSTS.includes(host)) {
+        if (parts.length === 0 || parts[0] === 'watch') {
+            candidate = parsed.searchParams.get('v');
+        } else if (parts.length >= 2 && ID_PATH_PREFIXES.includes(parts[0])) {
+            candidate = parts[1];
+        }
     }
+    return candidate && /^[A-Za-z0-9_-]{11}$/.test(candidate) ? candidate : null;
 }
 
-function updateVideoUrlList() {
-    const list = document.getElementById('video-url-list');
-    list.innerHTML = '';
-    
-    if (videoUrls.length === 0) {
-        list.innerHTML = '<li style="text-align: center; color: #999;">Keine URLs hinzugefügt</li>';
-        return;
+function canonicalYoutubeUrl(url) {
+    const videoId = extractVideoId(url.trim());
+    return videoId ? `https://www.youtube.com/watch?v=${videoId}` : null;
+}
+
+// Per list: lookup set for deduplication, skipped counts and the state of the last task
+const urlLists = {
+    video: { keys: new Set(), duplicates: 0, invalid: 0, task: null, view: null },
+    audio: { keys: new Set(), duplicates: 0, invalid: 0, task: null, view: null }
+};
+
+function getUrls(kind) {
+    return kind === 'video' ? videoUrls : audioUrls;
+}
+
+function setUrls(kind, urls) {
+    if (kind === 'video') {
+        videoUrls = urls;
+    } else {
+        audioUrls = urls;
     }
-    
-    videoUrls.forEach((url, index) => {
-        const li = document.createElement('li');
-        li.innerHTML = `
-            <span>${url}</span>
-            <button onclick="removeVideoUrl(${index})">Entfernen</button>
-        `;
-        list.appendChild(li);
-    });
+    const list = urlLists[kind];
+    list.keys = new Set(urls);
+    list.duplicates = 0;
+    list.invalid = 0;
+    list.task = null;
+}
+
+// Add any number of URLs (pasted lists: one per line, or separated by spaces/commas)
+function addUrls(kind, text) {
+    const urls = getUrls(kind);
+    const list = urlLists[kind];
+    const result = { added: 0, duplicates: 0, invalid: 0 };
+    
+    for (const token of text.split(/[\s,;]+/)) {
+        if (!token) continue;
+        const url = canonicalYoutubeUrl(token);
+        if (!url) {
+            result.invalid++;
+        } else if (list.keys.has(url)) {
+            result.duplicates++;
+        } else {
+            list.keys.add(url);
+            urls.push(url);
+            result.added++;
+        }
+    }
+    list.duplicates += result.duplicates;
+    list.invalid += result.invalid;
+    updateUrlList(kind);
+    return result;
 }
 
-// Audio URL management
-function addAudioUrl() {
-    const input = document.getElementById('audio-url-input');
-    const url = input.value.trim();
+function addSingleUrl(kind) {
+    const input = document.getElementById(`${kind}-url-input`);
+    const text = input.value.trim();
     
-    if (!url) {
+    if (!text) {
         alert('Bitte geben Sie eine URL ein.');
         return;
     }
     
-    if (!isValidYoutubeUrl(url)) {
+    if (/\s/.test(text)) {
+        notifyAdded(addUrls(kind, text));
+        input.value = '';
+        return;
+    }
+    
+    const url = canonicalYoutubeUrl(text);
+    if (!url) {
         alert('Bitte geben Sie eine gültige YouTube-URL ein.');
         return;
     }
     
-    if (audioUrls.includes(url)) {
+    if (urlLists[kind].keys.has(url)) {
         alert('Diese URL ist bereits in der Liste.');
         return;
     }
     
-    audioUrls.push(url);
-    updateAudioUrlList();
+    addUrls(kind, url);
     input.value = '';
 }
 
-function removeAudioUrl(index) {
-    audioUrls.splice(index, 1);
-    updateAudioUrlList();
+// Pasting several URLs adds them at once (deduplicated) instead of filling the input
+function handleUrlPaste(kind, event) {
+    const text = (event.clipboardData || window.clipboardData).getData('text');
+    if (!/\s/.test(text.trim())) return;  // single URL: normal paste
+    event.preventDefault();
+    notifyAdded(addUrls(kind, text));
 }
 
-function clearAudioUrls() {
-    if (audioUrls.length === 0) return;
+function notifyAdded(result) {
+    const parts = [`${result.added} hinzugefügt`];
+    if (result.duplicates) parts.push(`${result.duplicates} doppelt`);
+    if (result.invalid) parts.push(`${result.invalid} ungültig`);
+    showNotification(parts.join(', '));
+}
+
+function removeUrl(kind, index) {
+    const urls = getUrls(kind);
+    const [url] = urls.splice(index, 1);
+    urlLists[kind].keys.delete(url);
+    updateUrlList(kind);
+}
+
+function clearUrls(kind) {
+    if (getUrls(kind).length === 0) return;
     if (confirm('Möchten Sie alle URLs aus der Liste entfernen?')) {
-        audioUrls = [];
-        updateAudioUrlList();
+        setUrls(kind, []);
+        updateUrlList(kind);
     }
 }
 
-function updateAudioUrlList() {
-    const list = document.getElementById('audio-url-list');
-    list.innerHTML = '';
+// State of a URL in the last started task: queued, running, done, failed (null: not part of it)
+function urlState(kind, url) {
+    const task = urlLists[kind].task;
+    if (!task) return null;
+    const index = task.index.get(url);
+    if (index === undefined) return null;
+    if (index < task.processed) return task.failed.has(url) ? 'failed' : 'done';
+    if (index === task.processed && task.running) return 'running';
+    return 'queued';
+}
+
+const URL_STATE_LABELS = { queued: 'wartend', running: 'läuft', done: 'fertig', failed: 'fehlgeschlagen' };
+
+function renderUrlRow(kind, url, index) {
+    const li = document.createElement('li');
+    const state = urlState(kind, url);
     
-    if (audioUrls.length === 0) {
-        list.innerHTML = '<li style="text-align: center; color: #999;">Keine URLs hinzugefügt</li>';
-        return;
+    const text = document.createElement('span');
+    text.className = 'url-text';
+    text.textContent = url;
+    li.appendChild(text);
+    
+    if (state) {
+        const badge = document.createElement('span');
+        badge.className = `url-state url-state-${state}`;
+        badge.textContent = URL_STATE_LABELS[state];
+        li.appendChild(badge);
     }
     
-    audioUrls.forEach((url, index) => {
-        const li = document.createElement('li');
-        li.innerHTML = `
-            <span>${url}</span>
-            <button onclick="removeAudioUrl(${index})">Entfernen</button>
-        `;
-        list.appendChild(li);
-    });
+    const button = document.createElement('button');
+    button.textContent = 'Entfernen';
+    button.addEventListener('click', () => removeUrl(kind, index));
+    li.appendChild(button);
+    return li;
+}
+
+function updateUrlList(kind) {
+    const list = urlLists[kind];
+    if (!list.view) return;
+    list.view.setItems(getUrls(kind));
+    updateUrlSummary(kind);
+}
+
+// Compact counts below the list, e.g. "10000 URLs · 9980 wartend · 1 läuft · 19 fertig"
+function updateUrlSummary(kind) {
+    const list = urlLists[kind];
+    const urls = getUrls(kind);
+    const parts = [`${urls.length} URLs`];
+    
+    if (list.task) {
+        const task = list.task;
+        const total = task.index.size;
+        const failed = task.failed.size;
+        const running = task.running && task.processed < total ? 1 : 0;
+        const counts = {
+            queued: total - task.processed - running,
+            running: running,
+            done: task.processed - failed,
+            failed: failed
+        };
+        for (const [state, count] of Object.entries(counts)) {
+            if (count) parts.push(`${count} ${URL_STATE_LABELS[state]}`);
+        }
+    }
+    if (list.duplicates) parts.push(`${list.duplicates} Duplikate übersprungen`);
+    if (list.invalid) parts.push(`${list.invalid} ungültig`);
+    
+    document.getElementById(`${kind}-url-summary`).textContent = parts.join(' · ');
+}
+
+// Snapshot of the submitted URLs; task progress is mapped onto it
+function startUrlTracking(kind) {
+    const urls = getUrls(kind);
+    urlLists[kind].task = {
+        index: new Map(urls.map((url, i) => [url, i])),
+        processed: 0,
+        failed: new Set(),
+        running: true
+    };
+    updateUrlList(kind);
+}
+
+function trackTaskStatus(kind, status) {
+    const task = urlLists[kind].task;
+    if (!task) return;
+    const finished = status.status === 'complete' || status.status === 'cancelled';
+    task.processed = status.status === 'complete'
+        ? status.total_files
+        : Math.max(0, status.current_file - 1);
+    task.failed = new Set(status.failed_urls);
+    task.running = !finished && status.status !== 'paused';
+    urlLists[kind].view.refresh();
+    updateUrlSummary(kind);
+}
+
+// Video URL management
+function addVideoUrl() {
+    addSingleUrl('video');
+}
+
+function removeVideoUrl(index) {
+    removeUrl('video', index);
+}
+
+function clearVideoUrls() {
+    clearUrls('video');
+}
+
+function updateVideoUrlList() {
+    updateUrlList('video');
+}
+
+// Audio URL management
+function addAudioUrl() {
+    addSingleUrl('audio');
+}
+
+function removeAudioUrl(index) {
+    removeUrl('audio', index);
+}
+
+function clearAudioUrls() {
+    clearUrls('audio');
+}
+
+function updateAudioUrlList() {
+    updateUrlList('audio');
 }
 
 // URL validation
 function isValidYoutubeUrl(url) {
-    return url.startsWith('https://www.youtube.com/') || 
-           url.startsWith('https://youtu.be/') || 
-           url.startsWith('https://m.youtube.com/');
+    return canonicalYoutubeUrl(url) !== null;
 }
 
 // Video download
@@ -295,17 +531,23 @@ async function startVideoDownload() {
     }
     
     const format = document.querySelector('input[name="video-format"]:checked').value;
+    // Combined task: the MP3 is converted from the downloaded video (no second download)
+    const withAudio = document.getElementById('video-with-audio').checked;
+    // Resolution cap: smaller streams are planned, the saved volume is reported in the status
+    const maxHeight = document.getElementById('video-max-height').value;
     const button = document.getElementById('video-download-btn');
     button.disabled = true;
     button.textContent = 'Download läuft...';
     
     try {
-        const response = await fetch(`${API_URL}/api/download/video`, {
+        const response = await fetch(`${API_URL}/api/download/${withAudio ? 'combined' : 'video'}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 urls: videoUrls,
                 format: format,
+                audio_format: 'mp3',
+                max_height: maxHeight ? Number(maxHeight) : null,
                 output_path: 'Downloads',
                 use_timestamped_folder: true  // Web app uses timestamped folders
             })
@@ -318,6 +560,8 @@ async function startVideoDownload() {
         
         const result = await response.json();
         currentVideoTaskId = result.task_id;
+        startUrlTracking('video');
+        document.getElementById('video-zip-link').hidden = true;
         updateVideoStatus('Download gestartet...');
         pollVideoStatus();
         
@@ -338,8 +582,9 @@ function pollVideoStatus() {
             
             const status = await response.json();
             
-            // Update overall progress bar
+            // Update overall progress bar and the per-URL states
             updateVideoProgress(status.progress);
+            trackTaskStatus('video', status);
             updateVideoStatus(status.message);
             
             // Update current file progress bar
@@ -348,8 +593,8 @@ function pollVideoStatus() {
                 updateVideoCurrentStatus(status.current_file_message || '');
             }
             
-            // Check if download is complete
-            if (status.status === 'complete') {
+            // Check if download is complete (or was cancelled via the API)
+            if (status.status === 'complete' || status.status === 'cancelled') {
                 // Stop polling
                 clearInterval(interval);
                 
@@ -362,9 +607,16 @@ function pollVideoStatus() {
                 updateVideoCurrentStatus('');
                 
                 // Update status message
-                updateVideoStatus(`Download abgeschlossen! Fehlgeschlagen: ${status.failed_urls.length}`);
+                updateVideoStatus(status.status === 'cancelled'
+                    ? 'Download abgebrochen'
+                    : `Download abgeschlossen! Fehlgeschlagen: ${status.failed_urls.length}`);
                 
                 // Reset task ID
+                // Finished files can be fetched from the server as one ZIP
+                if (status.status === 'complete' && status.failed_urls.length < status.total_files) {
+                    showZipLink('video', currentVideoTaskId);
+                }
+                
                 currentVideoTaskId = null;
             }
         } catch (error) {
@@ -424,6 +676,8 @@ async function startAudioDownload() {
         
         const result = await response.json();
         currentAudioTaskId = result.task_id;
+        startUrlTracking('audio');
+        document.getElementById('audio-zip-link').hidden = true;
         updateAudioStatus('Download gestartet...');
         pollAudioStatus();
         
@@ -444,8 +698,9 @@ function pollAudioStatus() {
             
             const status = await response.json();
             
-            // Update overall progress bar
+            // Update overall progress bar and the per-URL states
             updateAudioProgress(status.progress);
+            trackTaskStatus('audio', status);
             updateAudioStatus(status.message);
             
             // Update current file progress bar
@@ -454,8 +709,8 @@ function pollAudioStatus() {
                 updateAudioCurrentStatus(status.current_file_message || '');
             }
             
-            // Check if download is complete
-            if (status.status === 'complete') {
+            // Check if download is complete (or was cancelled via the API)
+            if (status.status === 'complete' || status.status === 'cancelled') {
                 // Stop polling
                 clearInterval(interval);
                 
@@ -468,9 +723,16 @@ function pollAudioStatus() {
                 updateAudioCurrentStatus('');
                 
                 // Update status message
-                updateAudioStatus(`Download abgeschlossen! Fehlgeschlagen: ${status.failed_urls.length}`);
+                updateAudioStatus(status.status === 'cancelled'
+                    ? 'Download abgebrochen'
+                    : `Download abgeschlossen! Fehlgeschlagen: ${status.failed_urls.length}`);
                 
                 // Reset task ID
+                // Finished files can be fetched from the server as one ZIP
+                if (status.status === 'complete' && status.failed_urls.length < status.total_files) {
+                    showZipLink('audio', currentAudioTaskId);
+                }
+                
                 currentAudioTaskId = null;
             }
         } catch (error) {
@@ -502,6 +764,8 @@ function updateAudioCurrentStatus(message) {
 // YouTube Search
 let currentSearchController = null;
 let currentResultCount = 0;
+let searchResults = [];
+let searchView = null;
 
 async function searchYoutube() {
     const input = document.getElementById('search-input');
@@ -522,7 +786,9 @@ async function searchYoutube() {
     const resultsEl = document.getElementById('search-results');
     
     statusEl.innerHTML = '<span class="spinner"></span> Suche läuft...';
-    resultsEl.innerHTML = '';
+    searchResults = [];
+    searchView.setItems(searchResults);
+    resultsEl.scrollTop = 0;
     currentResultCount = 0;
     
     currentSearchController = new AbortController();
@@ -604,44 +870,41 @@ async function searchYoutube() {
 }
 
 function appendSearchResult(video) {
-    const resultsEl = document.getElementById('search-results');
-    
+    searchResults.push(video);
+    searchView.setItems(searchResults);
+}
+
+function renderSearchResult(video) {
     const resultDiv = document.createElement('div');
     resultDiv.className = 'search-result-item';
-    resultDiv.style.opacity = '0';
-    resultDiv.style.transform = 'translateY(10px)';
-    
-    // Escape quotes in title and URL for onclick handlers
-    const escapedUrl = video.url.replace(/'/g, "\\'");
-    const escapedTitle = video.title.replace(/'/g, "\\'").replace(/"/g, '&quot;');
     
     resultDiv.innerHTML = `
-        <img src="${video.thumbnail}" alt="${escapedTitle}" class="result-thumbnail">
+        <img alt="" class="result-thumbnail" loading="lazy">
         <div class="result-info">
-            <h3 class="result-title">${video.title}</h3>
-            <p class="result-duration">Dauer: ${video.duration}</p>
-            <p class="result-url">${video.url}</p>
+            <h3 class="result-title"></h3>
+            <p class="result-duration"></p>
+            <p class="result-url"></p>
         </div>
         <div class="result-actions">
-            <button onclick="addToVideoList('${escapedUrl}')" class="btn-add-video" title="Zur Video-Liste hinzufügen">📹 Video</button>
-            <button onclick="addToAudioList('${escapedUrl}')" class="btn-add-audio" title="Zur Audio-Liste hinzufügen">🎵 Audio</button>
+            <button class="btn-add-video" title="Zur Video-Liste hinzufügen">📹 Video</button>
+            <button class="btn-add-audio" title="Zur Audio-Liste hinzufügen">🎵 Audio</button>
         </div>
     `;
+    // Text is set as text, so titles need no escaping
+    const thumbnail = resultDiv.querySelector('.result-thumbnail');
+    thumbnail.src = video.thumbnail;
+    thumbnail.alt = video.title;
+    resultDiv.querySelector('.result-title').textContent = video.title;
+    resultDiv.querySelector('.result-duration').textContent = `Dauer: ${video.duration}`;
+    resultDiv.querySelector('.result-url').textContent = video.url;
+    resultDiv.querySelector('.btn-add-video').addEventListener('click', () => addToVideoList(video.url));
+    resultDiv.querySelector('.btn-add-audio').addEventListener('click', () => addToAudioList(video.url));
     
-    resultsEl.appendChild(resultDiv);
-    
-    // Animate in
-    setTimeout(() => {
-        resultDiv.style.transition = 'all 0.3s ease';
-        resultDiv.style.opacity = '1';
-        resultDiv.style.transform = 'translateY(0)';
-    }, 10);
+    return resultDiv;
 }
 
 function addToVideoList(url) {
-    if (!videoUrls.includes(url)) {
-        videoUrls.push(url);
-        updateVideoUrlList();
+    if (addUrls('video', url).added) {
         showNotification('Zur Video-Liste hinzugefügt');
     } else {
         showNotification('Bereits in Video-Liste vorhanden');
@@ -650,15 +913,19 @@ function addToVideoList(url) {
 
 
 function addToAudioList(url) {
-    if (!audioUrls.includes(url)) {
-        audioUrls.push(url);
-        updateAudioUrlList();
+    if (addUrls('audio', url).added) {
         showNotification('Zur Audio-Liste hinzugefügt');
     } else {
         showNotification('Bereits in Audio-Liste vorhanden');
     }
 }
 
+function showZipLink(kind, taskId) {
+    const link = document.getElementById(`${kind}-zip-link`);
+    link.href = `${API_URL}/api/tasks/${taskId}/zip`;
+    link.hidden = false;
+}
+
 function showNotification(message) {
     const notification = document.createElement('div');
     notification.className = 'notification';
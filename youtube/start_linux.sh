@@ -133,8 +133,10 @@ if ! venv_has_pip; then
   "$VENV_PYTHON" -m ensurepip --upgrade >/dev/null 2>&1 || true
 fi
 
-"$VENV_PYTHON" -m pip install --upgrade pip --quiet
-if "$VENV_PYTHON" -m pip install -r "$ROOT/requirements.txt"; then
+# Fast path: resolve installed versions in-process, no pip call when satisfied
+if "$VENV_PYTHON" "$ROOT/backend/dependency_checker.py" --check-only >/dev/null 2>&1; then
+  echo "   All dependencies already satisfied."
+elif "$VENV_PYTHON" -m pip install -r "$ROOT/requirements.txt" -r "$ROOT/backend/requirements.txt"; then
   echo "   All dependencies installed."
 else
   echo
@@ -122,8 +122,11 @@ if not exist "%VENV_PYTHON%" (
 echo.
 echo [3/5] Installing Python dependencies...
 
-"%VENV_PYTHON%" -m pip install --upgrade pip --quiet
-"%VENV_PYTHON%" -m pip install -r "%ROOT%requirements.txt"
+:: Fast path: resolve installed versions in-process, no pip call when satisfied
+"%VENV_PYTHON%" "%ROOT%backend\dependency_checker.py" --check-only >nul 2>&1
+if %ERRORLEVEL% NEQ 0 (
+    "%VENV_PYTHON%" -m pip install -r "%ROOT%requirements.txt" -r "%ROOT%backend\requirements.txt"
+)
 
 if %ERRORLEVEL% NEQ 0 (
     echo.